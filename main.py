@@ -47,14 +47,7 @@ if results.pose_landmarks:
         detected_keypoints[landmark_name] = [landmark.x, landmark.y]
 """
 
-from src.keypoint_extractor import KeypointExtractor
-from src.keypoint_templates import TemplateManager
-from src.pose_matching import PoseMatcher
-from src.normalization import normalize_keypoints
-from src.analyzer import analyze_all
 import sys
-from PyQt5.QtWidgets import QApplication
-from src.UI import BoxingApp
 
 VIDEO_PATH = r'data/videos/test1.mp4'
 FRAMES_PATH = r'data/frames_img'
@@ -64,6 +57,10 @@ TEMPLATE_PATH = r'data/templates'
 THRESHOLD = 0.5
 
 '''
+from src.keypoint_extractor import KeypointExtractor
+from src.keypoint_templates import TemplateManager
+from src.pose_matching import PoseMatcher
+
 # Initialize the extractor
 extractor = KeypointExtractor(VIDEO_PATH, FRAME_INTERVAL, MAX_FRAME, FRAMES_PATH)
 
@@ -89,15 +86,26 @@ for frame_idx, keypoints in enumerate(keypoints_per_frame):
         print(f"Frame {frame_idx + 1}: No matching pose found within the threshold.")
 '''
 
+# from src.analyzer import analyze_all
 # results = analyze_all(VIDEO_PATH, TEMPLATE_PATH, FRAME_INTERVAL, MAX_FRAME, THRESHOLD, FRAMES_PATH)
 # print(results)
+# (or headless, without PyQt5: python -m src.batch_cli data/videos/)
+
+def main():
+    # PyQt5 and the app (and through it OpenCV) load only here, so importing main stays cheap
+    from PyQt5.QtWidgets import QApplication
+    from src.UI import BoxingApp
+
+    app = QApplication(sys.argv)
+    mainWin = BoxingApp()
+
+    # mainWin.set_results(results)
+    mainWin.set_realTime_mode(True) # 如果要 upload 其他影片開這個
 
-app = QApplication(sys.argv)
-mainWin = BoxingApp()
+    mainWin.set_interval(FRAME_INTERVAL)
+    mainWin.show()
+    return app.exec_()
 
-# mainWin.set_results(results)
-mainWin.set_realTime_mode(True) # 如果要 upload 其他影片開這個
 
-mainWin.set_interval(FRAME_INTERVAL)
-mainWin.show()
-sys.exit(app.exec_())
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,38 +3,45 @@ from PyQt5.QtWidgets import (
     QMainWindow, QLabel, QPushButton, QFileDialog, QCheckBox, QVBoxLayout, QHBoxLayout, QGridLayout, QWidget,
     QSizePolicy
 )
-from PyQt5.QtGui import QPixmap, QImage
-from PyQt5.QtCore import QTimer, Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
 import gc
 import os
-import mediapipe as mp
-from src.analyzer import analyze_all, analyze_one_frame
-from src.practice_ui import PracticeWindow
+from src.analyzer import analyze_all
+from src.playback import PlaybackWorker
+from src.frame_renderer import FrameRenderer
+from src.motion_gate import MotionGate
+from src.landmark_filter import LandmarkFilter
+from src.punch_events import PunchEventDetector, PunchTimeline
+from src import tracing
 
 class BoxingApp(QMainWindow):
 
     def __init__(self):
         super().__init__()
-        self.timer = QTimer()
+        self.playback = None  # PlaybackWorker, decodes/infers off the GUI thread
         self.video_file_name = "None"  # 初始化 video_file_name
         self.initUI()
 
         # Video and analysis variables
-        self.cap = None
         self.video_path = os.path.abspath(r'data/videos/test1.mp4')
         self.template_path = os.path.abspath(r'data/templates')
+        self.motion_template_path = os.path.abspath(r'data/motion_templates')  # optional, DTW motion templates
         self.frame_count = 0
         self.interval = 10
         self.max_frame = 1000
         self.threshold = 0.3
         self.save_frames_path = os.path.abspath(r'data/frames_img')
-        self.results = {}
+        self.results = PunchTimeline()  # punches as (technique, start, end, best_distance) runs
+        self.punch_detector = PunchEventDetector()  # realtime mode: labels -> punches
+        self.current_punch = None  # technique shown in red
         self.techniques = {'HOOK': 0, 'JAB': 0, 'CROSS': 0, 'UPPERCUT': 0}
         self.tech_color = {'HOOK': 'black', 'JAB': 'black', 'CROSS': 'black', 'UPPERCUT': 'black'}
-        self.changable = True
-        self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose()
         self.realTime_mode = False
+        self.smooth_scaling = True  # False = nearest-neighbour scaling, cheaper for big videos
+        self.motion_gating = True  # skip pose inference while the boxer is still (see MotionGate)
+        self.landmark_filtering = True  # smooth/predict landmarks; realtime mode then matches every frame
+        self.practice_sources = [0]  # practice mode: camera indices or video files, one bag station each
 
     def initUI(self):
         self.setWindowTitle('Boxing Analyzer')
@@ -107,8 +114,11 @@ class BoxingApp(QMainWindow):
         self.play_btn.setFixedHeight(40)  # 強制限制高度
         self.pause_btn = QPushButton('Pause', self)
         self.pause_btn.setFixedHeight(40)  # 強制限制高度
+        self.stats_label = QLabel("FPS: - | Dropped: 0", self)
+        self.stats_label.setFixedHeight(40)
         play_pause_layout.addWidget(self.play_btn)
         play_pause_layout.addWidget(self.pause_btn)
+        play_pause_layout.addWidget(self.stats_label)
         play_pause_layout.setSpacing(10)
 
         # Main grid layout
@@ -140,9 +150,6 @@ class BoxingApp(QMainWindow):
         self.pause_btn.clicked.connect(self.pause_video)
         self.practice_btn.clicked.connect(self.open_practice_page)
 
-        # Timer for video playback
-        self.timer.timeout.connect(self.next_frame)
-
     def upload_video(self):
         video_path, _ = QFileDialog.getOpenFileName(self, 'Upload Video', '', 'Videos (*.mp4 *.avi)')
         if video_path:
@@ -161,107 +168,125 @@ class BoxingApp(QMainWindow):
         # except Exception as e:
         #     print(f"Error analyzing all: {e}")
 
-        self.cap = cv2.VideoCapture(video_path)
+        self.stop_playback()
+        self.playback = PlaybackWorker(video_path, self.template_path, self.threshold, self.interval, self.realTime_mode,
+                                       motion_template_path=self.motion_template_path,
+                                       display_size=self.display_size(), smooth_scaling=self.smooth_scaling,
+                                       motion_gate=MotionGate() if self.motion_gating else None,
+                                       landmark_filter=LandmarkFilter() if self.landmark_filtering else None)
+        self.playback.frame_ready.connect(self.next_frame)
+        self.playback.stats_updated.connect(self.update_stats)
+        self.playback.playback_finished.connect(self.finish_punches)
         self.frame_count = 0
         self.techniques = {'HOOK': 0, 'JAB': 0, 'CROSS': 0, 'UPPERCUT': 0}
+        self.tech_color = {'HOOK': 'black', 'JAB': 'black', 'CROSS': 'black', 'UPPERCUT': 'black'}
+        self.current_punch = None
+        # Matching every frame (landmark filter) sees more flicker than every interval-th: bridge short
+        # gaps, and ignore blips shorter than the stretch one sampled frame would have covered
+        if self.landmark_filtering:
+            self.punch_detector = PunchEventDetector(min_duration=max(1, self.interval // 2), hysteresis=self.interval // 2)
+        else:
+            self.punch_detector = PunchEventDetector()
+        if self.realTime_mode:
+            self.results = PunchTimeline()
         self.file_label.setText(f"File: {self.video_file_name}")
 
     def play_video(self):
-        if self.cap:
-            self.timer.start(30)
+        if self.playback:
+            if self.playback.isRunning():
+                self.playback.resume()
+            else:
+                self.playback.start()
 
     def pause_video(self):
-        self.timer.stop()
+        if self.playback:
+            self.playback.pause()
         print(self.results)
 
-    def next_frame(self):
-        if self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if ret:
-                # Process frame using Mediapipe Pose to get skeleton
-                image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                kps = self.pose.process(image_rgb)
-
-                if self.frame_count % self.interval == 0:
-                    # Analyze frame
-                    keypoints = {}
-                    if kps.pose_landmarks:
-                        for idx, landmark in enumerate(kps.pose_landmarks.landmark):
-                            landmark_name = self.mp_pose.PoseLandmark(idx).name.lower()
-                            keypoints[landmark_name] = [landmark.x, landmark.y]
-                    self.analyze_frame(keypoints)
-
-                self.display_frame(frame)
-                self.display_skeleton_frame(frame, kps)
-                self.frame_count += 1
-            else:
-                self.timer.stop()
-
-    def analyze_frame(self, keypoints):
+    def stop_playback(self):
+        if self.playback:
+            self.playback.stop()
+            self.playback = None
+
+    def next_frame(self, playback_frame):
+        """Show a frame finished by the PlaybackWorker (decode, pose and matching already done)."""
+        self.frame_count = playback_frame.index
+        if playback_frame.analyzed or (self.realTime_mode and playback_frame.matched):
+            with tracing.span("app.analyze_frame"):
+                self.analyze_frame(playback_frame.label, per_frame=self.landmark_filtering)
+
+        with tracing.span("app.display_frame"):
+            self.display_frame(playback_frame.rgb)
+        with tracing.span("app.display_skeleton_frame"):
+            self.display_skeleton_frame(playback_frame.skeleton_rgb)
+        if self.playback:
+            self.playback.frame_consumed()
+
+    def update_stats(self, fps, dropped):
+        text = f"FPS: {fps:.1f} | Dropped: {dropped}"
+        if self.playback is not None and self.playback.motion_gate is not None:
+            text += f" | Pose skipped: {self.playback.motion_gate.skip_ratio:.0%}"
+        self.stats_label.setText(text)
+
+    def analyze_frame(self, label, per_frame=False):
+        """
+        Args:
+            label: analyze_one_frame result for this frame in realtime mode (ignored otherwise)
+            per_frame: realtime mode matches every frame, so punches are numbered in video frames
+        """
         # display
         frameNum = (self.frame_count // self.interval) + 1 # 當前的frame
+        if self.realTime_mode and per_frame:
+            frameNum = self.frame_count + 1
 
-        if self.realTime_mode: # 一張一張 match
-            # analyze_one_frame and add to results
-            self.results[frameNum] = analyze_one_frame(keypoints, self.template_path, self.threshold)
-
-            update_text = self.results[frameNum].upper() if frameNum > 1 and self.results[frameNum] else None
-            last_text = self.results[frameNum - 1].upper() if frameNum>1 and self.results[frameNum - 1] else None
-
-            if update_text: # 有 match
-                self.tech_color[update_text] = 'red'
-                self.techniques[update_text] += 1
-
-                if last_text:
-                    if frameNum > 1:
-                        # 不是第一個也不是最後一個
-                        if last_text == update_text:  # 上一 frame 和此 frame技術一樣。把上一 frame 改小寫
-                            self.techniques[update_text] -= 1
-                        else: # 上一個 是連續的最後 lo
-                            self.tech_color[last_text] = 'black'
-
-                self.update_technique_labels()
-
-            else: # 沒有match
-                if last_text: # 上一個 是連續的最後
-                    self.tech_color[last_text] = 'black'
-                    self.update_technique_labels()
+        if self.realTime_mode: # 一張一張 match, the detector turns labels into punches
+            event = self.punch_detector.update(frameNum, label)
+            if event:
+                self.results.append(event)
+            current = self.punch_detector.current
 
         # 先跑完整部影片的分析存在 results 裡了，這邊只處理顯示
         else:
-            if self.results[frameNum]:
-                update_text = self.results[frameNum].upper()
-                self.tech_color[update_text] = 'red'
-                if self.changable:  # 改數字
-                    self.techniques[update_text] += 1
-                    self.changable = False
-                    self.update_technique_labels()
-                if self.results[frameNum].isupper():  # 最後一次
-                    self.tech_color[update_text] = 'black'
-                    self.changable = True
-
-    def display_frame(self, frame):
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_frame.shape
-        bytes_per_line = ch * w
-        qimg = QImage(rgb_frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
+            event = self.results.event_at(frameNum)
+            current = event[0] if event else None
+
+        self.show_current_punch(current)
 
+    def show_current_punch(self, technique):
+        """Count a punch when it starts and keep its technique red until it ends."""
+        if technique == self.current_punch:
+            return
+        if self.current_punch in self.tech_color:
+            self.tech_color[self.current_punch] = 'black'
+        if technique in self.techniques:
+            self.tech_color[technique] = 'red'
+            self.techniques[technique] += 1
+        self.current_punch = technique
+        self.update_technique_labels()
+
+    def finish_punches(self):
+        """End of playback: close the punch still in progress."""
+        if self.realTime_mode:
+            event = self.punch_detector.finish()
+            if event:
+                self.results.append(event)
+        self.show_current_punch(None)
+
+    def display_frame(self, rgb_frame):
+        # The PlaybackWorker already scaled the frame to fit the label; wrap it without copying
         if self.video_label.styleSheet() == "background-color: black;":
             self.video_label.setStyleSheet("")  # 移除背景樣式
+        self.video_label.setPixmap(QPixmap.fromImage(FrameRenderer.to_qimage(rgb_frame)))
 
-        pixmap = QPixmap.fromImage(qimg)
-        # Scale the pixmap so that it:
-        #   1) Fits within the label's current size
-        #   2) Preserves the aspect ratio
-        #   3) Looks smooth
-        target_size = self.video_label.size()  # current size of the QLabel
-        scaled_pixmap = pixmap.scaled(
-            target_size,
-            Qt.KeepAspectRatio,
-            Qt.SmoothTransformation
-        )
+    def display_size(self):
+        """(w, h) both video labels can show, the size PlaybackWorker scales frames to."""
+        return (min(self.video_label.width(), self.skeleton_video_label.width()),
+                min(self.video_label.height(), self.skeleton_video_label.height()))
 
-        self.video_label.setPixmap(scaled_pixmap)
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.playback:
+            self.playback.set_display_size(*self.display_size())
 
     def update_technique_labels(self):
         self.hook_cb.setText(f'Hook - {self.techniques["HOOK"]} times')
@@ -276,7 +301,8 @@ class BoxingApp(QMainWindow):
 
     def open_practice_page(self):
         """Switch to Practice Mode and open a new window for the camera."""
-        self.timer.stop()  # Stop the main video playback timer if it's running
+        if self.playback:
+            self.playback.pause()  # Pause the main video playback if it's running
 
         # Gather which checkboxes are checked
         selected_techniques = []
@@ -289,12 +315,18 @@ class BoxingApp(QMainWindow):
         if self.uppercut_cb.isChecked():
             selected_techniques.append("UPPERCUT")
 
+        from src.practice_ui import PracticeWindow  # camera/MediaPipe setup only when practice mode opens
+
         # Create and show the PracticeWindow
         # (Here we reuse the same template_path and threshold you used in the main window)
         self.practice_window = PracticeWindow(
             selected_techniques=selected_techniques,
             template_path=self.template_path,
-            threshold=self.threshold
+            threshold=self.threshold,
+            motion_template_path=self.motion_template_path,
+            motion_gate=MotionGate() if self.motion_gating else None,
+            landmark_filter=LandmarkFilter() if self.landmark_filtering else None,
+            sources=self.practice_sources
         )
         self.practice_window.show()
 
@@ -305,51 +337,34 @@ class BoxingApp(QMainWindow):
             self.camera_thread.wait()
 
     def set_results(self, result2show):
+        """
+        Args:
+            result2show: PunchTimeline from analyze_events, or the {frame: label} dict from analyze_all
+        """
+        if isinstance(result2show, dict):
+            result2show = PunchTimeline.from_labels(result2show)
         self.results = result2show
 
     def set_interval(self, interval):
         self.interval = interval
+        if self.playback:
+            self.playback.interval = interval
 
     def closeEvent(self, event):
-        if self.cap:
-            self.cap.release()
-        if self.cap_camera:
-            self.cap_camera.release()
-        self.pose.close()
+        self.stop_playback()
         gc.collect()
         event.accept()
 
-    def display_skeleton_frame(self, frame, kps):
-        # Draw the skeleton on the frame if pose landmarks are detected
-        if kps.pose_landmarks:
-            # Draw landmarks and connections
-            mp.solutions.drawing_utils.draw_landmarks(frame, kps.pose_landmarks, self.mp_pose.POSE_CONNECTIONS)
-
-        # Convert the frame with skeleton to QImage for display
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_frame.shape
-        bytes_per_line = ch * w
-        qimg = QImage(rgb_frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
-
+    def display_skeleton_frame(self, rgb_frame):
+        # The skeleton was already drawn by the PlaybackWorker at display size
         if self.skeleton_video_label.styleSheet() == "background-color: black;":
             self.skeleton_video_label.setStyleSheet("")  # 移除背景樣式
-
-        pixmap = QPixmap.fromImage(qimg)
-        # Scale the pixmap so that it:
-        #   1) Fits within the label's current size
-        #   2) Preserves the aspect ratio
-        #   3) Looks smooth
-        target_size = self.skeleton_video_label.size()  # current size of the QLabel
-        scaled_pixmap = pixmap.scaled(
-            target_size,
-            Qt.KeepAspectRatio,
-            Qt.SmoothTransformation
-        )
-
-        self.skeleton_video_label.setPixmap(scaled_pixmap)
+        self.skeleton_video_label.setPixmap(QPixmap.fromImage(FrameRenderer.to_qimage(rgb_frame)))
 
     def set_realTime_mode(self, realTime):
         self.realTime_mode = realTime
+        if self.playback:
+            self.playback.realtime = realTime
 
     def set_vedio_path(self, path):
         self.video_path = path
@@ -1,9 +1,37 @@
-from src.keypoint_extractor import KeypointExtractor
-from src.keypoint_templates import TemplateManager
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import numpy as np
+from src.frame_store import FRAME_STORE_EXTENSION, FrameStoreWriter, is_frame_store, remove_frame_store
+from src.keypoint_templates import TemplateManager, get_template_manager
 from src.pose_matching import PoseMatcher
+from src.motion_matching import MotionMatcher, load_motion_templates
+from src.pose_frame import stack_pose_frames
+from src.punch_events import PunchEventDetector, PunchTimeline
+from src import tracing
 
 
-def analyze_all(video_path, template_path, frame_interval=1, max_frame=1000, threshold=0.5, frames_path=None):
+def analyze_all(video_path, template_path, frame_interval=1, max_frame=1000, threshold=0.5, frames_path=None,
+                workers=1, chunk_frames=None, pose_options=None, cache=None, motion_template_path=None, motion_band=0.1,
+                min_duration=1, hysteresis=0):
+    """
+    Per-frame labels for a video, built from analyze_events.
+    Args: see analyze_events
+
+    Returns:
+        {1:'HOOK', 2:'jab', 3: None, ...}
+        Frames of one punch carry its technique, lowercase except the punch's last frame.
+    """
+    return analyze_events(video_path, template_path, frame_interval, max_frame, threshold, frames_path,
+                          workers, chunk_frames, pose_options, cache, motion_template_path, motion_band,
+                          min_duration, hysteresis).to_dict()
+
+
+def analyze_events(video_path, template_path, frame_interval=1, max_frame=1000, threshold=0.5, frames_path=None,
+                   workers=1, chunk_frames=None, pose_options=None, cache=None, motion_template_path=None, motion_band=0.1,
+                   min_duration=1, hysteresis=0, session=None):
     """
     Args:
         video_path: str
@@ -11,43 +39,230 @@ def analyze_all(video_path, template_path, frame_interval=1, max_frame=1000, thr
         frame_interval: int
         max_frame: int
         threshold: int
-        frames_path: str, the place to save img
+        frames_path: str, the place to save img (None = don't save); a path ending in .frames
+            saves them into one frame store file (see frame_store)
+        workers: int, number of processes running MediaPipe on separate frame ranges (1 = in this process)
+        chunk_frames: int, frames per range when workers > 1 (default: split evenly across workers)
+        pose_options: dict, keyword arguments for mp.solutions.pose.Pose
+            With workers > 1 every range would start MediaPipe's tracker from scratch, so the
+            default there is {'static_image_mode': True}: each frame is detected on its own and the
+            result doesn't depend on where the ranges split. Pass {} to keep the tracker anyway.
+        cache: KeypointCache, reuse keypoints from an earlier run with the same video and
+            sampling settings instead of running MediaPipe (not used when frames_path is set,
+            since the frames have to be decoded to be saved anyway)
+        motion_template_path: str, directory of motion templates (see motion_matching). Sampled frames
+            covered by a matched motion window take the motion's name instead of the static match.
+        motion_band: float, DTW band width as a fraction of the motion template length
+        min_duration: int, sampled frames a technique must hold to count as a punch
+        hysteresis: int, sampled frames a punch may miss its technique without ending (see PunchEventDetector)
+        session: SessionWriter, also record every sampled frame's landmarks, final label and distance
+            (see session_store); flushed, not closed, at the end
 
     Returns:
-        {1:'HOOK', 2:'jab', 3: None, ...}
+        PunchTimeline of (technique, start, end, best_distance) punches, frames numbered
+        by sample from 1
     """
-    # Initialization
-    extractor = KeypointExtractor(video_path, frame_interval, max_frame, frames_path)
-    # Analyze
-    kps_frames = extractor.extract_keypoints_from_video()
+    if workers > 1 and pose_options is None:
+        pose_options = {'static_image_mode': True}
+
     # Load templates
     template_manager = TemplateManager()
     template_manager.load_templates(template_path)
-
-    # Compare keypoints to templates and match poses
     pose_matcher = PoseMatcher(threshold=threshold)  # Set the matching threshold
 
-    kps = {}
-    for frame_idx, keypoints in enumerate(kps_frames):
-        best_match_name, min_distance = pose_matcher.match_pose(keypoints, template_manager.templates)
-        if best_match_name:
-            kps[frame_idx + 1] = best_match_name.upper()
-            if frame_idx > 0 and kps[frame_idx + 1] == kps[frame_idx]:  # 上一frame和此frame技術一樣。把上一frame改小寫
-                kps[frame_idx] = kps[frame_idx].lower()
+    # Keypoints as (frame_indices, timestamps, data, mask) chunks, from the cache or the extractor(s)
+    use_cache = cache is not None and frames_path is None
+    chunks = None
+    if use_cache:
+        cache_key = cache.make_key(video_path, frame_interval, max_frame, pose_options)
+        cached = cache.load(cache_key)
+        if cached is not None:
+            chunks = [cached]
+    if chunks is None:
+        from src.keypoint_extractor import KeypointExtractor  # cv2/MediaPipe only load once extraction is needed
+        if workers > 1:
+            chunks = _iter_parallel_chunks(video_path, frame_interval, max_frame, frames_path, workers, chunk_frames, pose_options)
         else:
-            kps[frame_idx + 1] = None
-    return kps
+            extractor = KeypointExtractor(video_path, frame_interval, max_frame, frames_path, pose_options=pose_options)
+            chunks = iter_keypoint_chunks(extractor.iter_keypoints(saveImg=frames_path is not None))
+        if use_cache:
+            chunks = cache.record(cache_key, chunks)
 
+    # Compare keypoints to templates and match poses, chunk by chunk
+    motion_matcher = None
+    if motion_template_path:
+        motion_matcher = MotionMatcher(load_motion_templates(motion_template_path), threshold, motion_band)
+    detector = PunchEventDetector(min_duration, hysteresis)
+    timeline = PunchTimeline()
+    # Labels wait here until no motion window can still cover them: [frame_num, label, distance]
+    delay = deque()
+    delay_frames = motion_matcher.max_length if motion_matcher is not None else 0
+    frame_num = 0
+    for frame_indices, timestamps, data, mask in chunks:
+        if session is not None:
+            session.append(frame_indices=frame_indices, timestamps=timestamps, landmarks=data, mask=mask)
+        with tracing.span("analyzer.match_batch"):
+            names, distances = pose_matcher.match_batch(data[..., :2], mask, template_manager)
+        for offset, (name, distance) in enumerate(zip(names, distances.tolist())):
+            frame_num += 1
+            delay.append([frame_num, name, distance])
+            if motion_matcher is not None:
+                with tracing.span("analyzer.motion_match"):
+                    motion = motion_matcher.push_array(data[offset, :, :2], mask[offset], frame_num)
+                if motion:
+                    motion_name, start, _, motion_distance = motion
+                    for item in delay:
+                        if item[0] >= start:
+                            item[1], item[2] = motion_name, motion_distance
+            while len(delay) > delay_frames:
+                _feed_detector(delay.popleft(), detector, timeline, session)
+    for item in delay:
+        _feed_detector(item, detector, timeline, session)
+    event = detector.finish()
+    if event:
+        timeline.append(event)
+    timeline.num_frames = frame_num
+    if session is not None:
+        session.flush()
+    return timeline
 
-def analyze_one_frame(keypoints, template_path, threshold=0.5):
 
-    # Load templates
-    template_manager = TemplateManager()
-    template_manager.load_templates(template_path)
+def _feed_detector(item, detector, timeline, session):
+    frame_num, name, distance = item
+    event = detector.update(frame_num, name, distance)
+    if event:
+        timeline.append(event)
+    if session is not None:
+        session.append_labels([name], [distance])
 
-    # Compare keypoints to templates and match poses
-    pose_matcher = PoseMatcher(threshold=threshold)  # Set the matching threshold
-    best_match_name, min_distance = pose_matcher.match_pose(keypoints, template_manager.templates)
+
+def iter_matches(keypoint_stream, templates, pose_matcher, batch_size=64):
+    """
+    Match a stream of (frame_index, timestamp, keypoints) tuples, e.g. KeypointExtractor.iter_keypoints(),
+    `batch_size` frames at a time through PoseMatcher.match_batch.
+    Memory stays bounded by batch_size and the consumer may stop at any point.
+
+    Yields:
+        (frame_index, timestamp, best_match_name or None, distance) in stream order
+    """
+    yield from _match_chunks(iter_keypoint_chunks(keypoint_stream, batch_size), templates, pose_matcher)
+
+
+def iter_keypoint_chunks(keypoint_stream, batch_size=64):
+    """
+    Group a (frame_index, timestamp, keypoints) stream into array chunks.
+
+    Yields:
+        (frame_indices, timestamps, data (n, K, 4), mask (n, K)) for up to batch_size frames,
+        data holding x, y, z, visibility as in PoseFrame
+    """
+    batch = []
+    for item in keypoint_stream:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield _to_chunk(batch)
+            batch = []
+    if batch:
+        yield _to_chunk(batch)
+
+
+def plan_shards(total_frames, frame_interval, workers, chunk_frames=None, max_frame=None):
+    """
+    Split [0, limit) into frame ranges whose starts are multiples of frame_interval,
+    so every shard samples exactly the frames a serial pass would.
+    The last range is left open (end None) unless max_frame bounds it, since
+    CAP_PROP_FRAME_COUNT is only an estimate for many containers.
+
+    Returns:
+        [(start, end), ...] in order
+    """
+    limit = min(total_frames, max_frame) if max_frame else total_frames
+    if chunk_frames is None:
+        chunk_frames = -(-limit // max(workers, 1))
+    chunk_frames = max(frame_interval, -(-chunk_frames // frame_interval) * frame_interval)
+
+    shards = []
+    start = 0
+    while start + chunk_frames < limit:
+        shards.append((start, start + chunk_frames))
+        start += chunk_frames
+    shards.append((start, max_frame or None))
+    return shards
+
+
+def _iter_parallel_chunks(video_path, frame_interval, max_frame, frames_path, workers, chunk_frames, pose_options):
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Error: Couldn't open video {video_path}")
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    shards = plan_shards(total_frames, frame_interval, workers, chunk_frames, max_frame)
+    # spawn: MediaPipe/OpenCV state must not be inherited through fork
+    # A frame store is a single append-only file: each shard fills its own part, merged here in order
+    store = FrameStoreWriter(frames_path, overwrite=True) if is_frame_store(frames_path) else None
+    shard_paths = [_shard_frames_path(frames_path, i) if store else frames_path for i in range(len(shards))]
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(_extract_shard, video_path, frame_interval, start, end, shard_path, pose_options)
+                       for (start, end), shard_path in zip(shards, shard_paths)]
+            # Results are consumed in shard order, so frame numbering is the same as the serial path
+            for future, shard_path in zip(futures, shard_paths):
+                chunk = future.result()
+                if store is not None and os.path.exists(shard_path):
+                    store.append_store(shard_path)
+                    remove_frame_store(shard_path)
+                yield chunk
+    finally:
+        if store is not None:
+            store.close()
+
+
+def _shard_frames_path(frames_path, shard):
+    """data/x.frames -> data/x.part3.frames"""
+    return f"{frames_path[:-len(FRAME_STORE_EXTENSION)]}.part{shard}{FRAME_STORE_EXTENSION}"
+
+
+def _extract_shard(video_path, frame_interval, start, end, frames_path, pose_options):
+    """Worker process: keypoints for frames [start, end) as one array chunk."""
+    from src.keypoint_extractor import KeypointExtractor
+    extractor = KeypointExtractor(video_path, frame_interval, end, frames_path, pose_options=pose_options)
+    # A shard's part store is always its own, started over even if a crashed run left one behind
+    batch = list(extractor.iter_keypoints(saveImg=frames_path is not None, start_frame=start,
+                                          overwrite_frames=is_frame_store(frames_path)))
+    extractor.pose.close()
+    return _to_chunk(batch)
+
+
+def _to_chunk(batch):
+    data, mask = stack_pose_frames([keypoints for _, _, keypoints in batch])
+    frame_indices = np.array([frame_index for frame_index, _, _ in batch], dtype=np.int64)
+    timestamps = np.array([timestamp for _, timestamp, _ in batch], dtype=np.float64)
+    return frame_indices, timestamps, data, mask
+
+
+def _match_chunks(chunks, templates, pose_matcher):
+    for frame_indices, timestamps, data, mask in chunks:
+        with tracing.span("analyzer.match_batch"):
+            names, distances = pose_matcher.match_batch(data[..., :2], mask, templates)
+        yield from zip(frame_indices.tolist(), timestamps.tolist(), names, distances.tolist())
+
+
+def analyze_one_frame(keypoints, template_path, threshold=0.5):
+    """
+    Match a single frame. Templates come from the shared cache (see keypoint_templates.TemplateCache),
+    so repeated calls only check the template files for edits about once a second.
+    """
+    with tracing.span("analyzer.analyze_one_frame"):
+        template_manager = get_template_manager(template_path)
+        pose_matcher = _get_pose_matcher(threshold)
+        best_match_name, min_distance = pose_matcher.match_pose(keypoints, template_manager)
     if best_match_name:
         return best_match_name.upper()
-    return best_match_name
\ No newline at end of file
+    return best_match_name
+
+
+@lru_cache(maxsize=8)
+def _get_pose_matcher(threshold):
+    return PoseMatcher(threshold=threshold)
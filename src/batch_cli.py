@@ -0,0 +1,281 @@
+"""
+Headless batch analysis of many videos, for servers without a display (no PyQt5 import).
+
+    python -m src.batch_cli data/videos/ --output results.jsonl --workers 8
+    python -m src.batch_cli a.mp4 b.mp4 --format csv --output punches.csv --cache data/keypoint_cache
+    python -m src.batch_cli data/videos/ --sessions data/sessions   # + per-frame columns, see session_store
+
+Videos are analysed concurrently in up to `--workers` processes. A single video gets the
+whole budget as frame-range shards instead, with every frame detected on its own (see
+analyze_events' `workers` and `pose_options`). Results are streamed
+to the output as each video finishes, so a crashed or interrupted run keeps what it has.
+    jsonl: one record per video with its punches, counts, frame count and timing, or its error
+    csv:   one row per punch (video, technique, start, end, distance)
+Progress and a timing summary go to stderr.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v', '.webm')
+CSV_FIELDS = ('video', 'technique', 'start_frame', 'end_frame', 'distance')
+
+
+def find_videos(paths: List[str], recursive: bool = False) -> List[str]:
+    """Expand directories into the video files they contain, keeping the given order."""
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            if recursive:
+                for root, dirs, files in os.walk(path):
+                    dirs.sort()
+                    videos.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(VIDEO_EXTENSIONS))
+            else:
+                videos.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                              if name.lower().endswith(VIDEO_EXTENSIONS))
+        else:
+            videos.append(path)
+    return list(dict.fromkeys(videos))
+
+
+def session_names(videos: List[str], inputs: List[str]) -> Dict[str, str]:
+    """
+    A distinct session directory name per video: its path relative to the input directory it was
+    found in, without the extension (day1/round1.mp4 -> day1/round1). Videos that would still
+    share a name keep their extension (round1.mp4 / round1.mov -> round1_mp4 / round1_mov), then
+    a short hash of their absolute path.
+    """
+    roots = [os.path.abspath(path) for path in inputs if os.path.isdir(path)]
+    names = {}
+    for video in videos:
+        absolute = os.path.abspath(video)
+        root = max((root for root in roots if absolute.startswith(root + os.sep)), key=len, default=None)
+        names[video] = os.path.relpath(absolute, root) if root else os.path.basename(video)
+
+    def duplicates(keys):
+        seen = {}
+        for video, key in keys.items():
+            seen.setdefault(key, []).append(video)
+        return {video for group in seen.values() if len(group) > 1 for video in group}
+
+    stems = {video: os.path.splitext(name)[0] for video, name in names.items()}
+    clashing = duplicates(stems)
+    for video in clashing:
+        stem, ext = os.path.splitext(names[video])
+        stems[video] = f"{stem}_{ext[1:]}" if ext else stem
+    for video in duplicates(stems):
+        stems[video] += '_' + hashlib.sha1(os.path.abspath(video).encode()).hexdigest()[:8]
+    return stems
+
+
+def analyze_video(video_path: str, options: Dict, workers: int = 1, session_name: str = None) -> Dict:
+    """
+    Analyse one video; runs in a worker process. Never raises: failures come back as
+    {'status': 'error', ...} so one broken file doesn't stop the batch.
+    session_name: the video's directory under options['sessions'] (see session_names)
+    """
+    # Imported here so the parent process stays light and each spawned worker loads MediaPipe once
+    from src.analyzer import analyze_events
+    from src.keypoint_cache import KeypointCache
+    from src.session_store import SessionWriter
+
+    start = time.perf_counter()
+    record = {'video': video_path, 'interval': options['interval']}
+    session = None
+    try:
+        cache = KeypointCache(options['cache']) if options['cache'] else None
+        if options['sessions']:
+            session_path = os.path.join(options['sessions'],
+                                        session_name or os.path.splitext(os.path.basename(video_path))[0])
+            shutil.rmtree(session_path, ignore_errors=True)  # a rerun replaces the old session
+            session = SessionWriter(session_path, {'video': os.path.abspath(video_path), 'interval': options['interval'],
+                                                   'threshold': options['threshold'], 'templates': options['templates']})
+            record['session'] = session_path
+        timeline = analyze_events(video_path, options['templates'], options['interval'], options['max_frame'],
+                                  options['threshold'], workers=workers, cache=cache,
+                                  motion_template_path=options['motion_templates'],
+                                  min_duration=options['min_duration'], hysteresis=options['hysteresis'],
+                                  session=session)
+        record.update({
+            'status': 'ok',
+            'frames': timeline.num_frames,
+            'counts': timeline.counts(),
+            'punches': [{'technique': technique, 'start_frame': start_frame, 'end_frame': end_frame, 'distance': distance}
+                        for technique, start_frame, end_frame, distance in timeline],
+        })
+    except Exception as e:
+        record.update({'status': 'error', 'error': f"{type(e).__name__}: {e}", 'traceback': traceback.format_exc()})
+    finally:
+        if session is not None:
+            session.close()
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+
+class ResultWriter:
+    """Streams per-video records to JSONL, or their punches to CSV, flushing after each video."""
+    def __init__(self, path: str, fmt: str):
+        self.fmt = fmt
+        self.file = sys.stdout if path == '-' else open(path, 'w', newline='')
+        self.csv = None
+        if fmt == 'csv':
+            self.csv = csv.DictWriter(self.file, fieldnames=CSV_FIELDS)
+            self.csv.writeheader()
+
+    def write(self, record: Dict):
+        if self.fmt == 'jsonl':
+            record = {key: value for key, value in record.items() if key != 'traceback'}
+            self.file.write(json.dumps(record) + '\n')
+        else:
+            for punch in record.get('punches', []):
+                self.csv.writerow({'video': record['video'], **punch})
+        self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+def run_batch(videos: List[str], options: Dict, writer: ResultWriter, workers: int = 1,
+              names: Dict[str, str] = None) -> List[Dict]:
+    """
+    Analyse `videos` within a budget of `workers` processes, writing each record as soon as
+    its video is done (so output order is completion order). Returns the records.
+    names: session directory name per video (see session_names)
+    """
+    names = names or {}
+    records = []
+    wall_start = time.perf_counter()
+
+    def report(record):
+        records.append(record)
+        writer.write(record)
+        name = os.path.basename(record['video'])
+        if record['status'] == 'ok':
+            fps = record['frames'] / record['seconds'] if record['seconds'] else 0.0
+            print(f"[{len(records)}/{len(videos)}] {name}: {record['frames']} frames in {record['seconds']:.1f}s "
+                  f"({fps:.1f} fps), {len(record['punches'])} punches", file=sys.stderr)
+        else:
+            print(f"[{len(records)}/{len(videos)}] {name}: FAILED {record['error']}", file=sys.stderr)
+
+    if len(videos) == 1 or workers <= 1:
+        # Sequential; a lone video gets the whole budget as frame-range shards
+        for video in videos:
+            report(analyze_video(video, options, workers if len(videos) == 1 else 1, names.get(video)))
+    else:
+        # A worker dying in native code (a segfault in a decoder) breaks the whole pool: the videos
+        # it hadn't finished go to a new pool. If that one breaks too, they run one pool each, so
+        # only the video that crashes is recorded as failed.
+        pending = list(videos)
+        crashes = 0
+        while pending:
+            isolate = crashes >= 2
+            groups = [[video] for video in pending] if isolate else [pending]
+            pending = []
+            for group in groups:
+                unfinished = _run_pool(group, options, names, 1 if isolate else min(workers, len(group)), report)
+                if unfinished and isolate:
+                    for video in unfinished:
+                        report({'video': video, 'interval': options['interval'], 'status': 'error', 'seconds': 0.0,
+                                'error': "BrokenProcessPool: the worker process crashed"})
+                elif unfinished:
+                    print(f"A worker process crashed; retrying {len(unfinished)} unfinished videos", file=sys.stderr)
+                    pending = unfinished
+            crashes += 1
+
+    print_summary(records, time.perf_counter() - wall_start)
+    return records
+
+
+def _run_pool(videos: List[str], options: Dict, names: Dict[str, str], workers: int, report) -> List[str]:
+    """Analyse `videos` in one process pool, reporting each record. Returns the videos left unfinished by a broken pool."""
+    unfinished = []
+    # spawn: MediaPipe/OpenCV state must not be inherited through fork
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(analyze_video, video, options, 1, names.get(video)): video for video in videos}
+        for future in as_completed(futures):
+            video = futures[future]
+            try:
+                report(future.result())
+            except BrokenProcessPool:
+                unfinished.append(video)
+            except Exception as e:
+                report({'video': video, 'interval': options['interval'], 'status': 'error', 'seconds': 0.0,
+                        'error': f"{type(e).__name__}: {e}", 'traceback': traceback.format_exc()})
+    return [video for video in videos if video in unfinished]  # in the given order
+
+
+def print_summary(records: List[Dict], wall_seconds: float):
+    done = [record for record in records if record['status'] == 'ok']
+    frames = sum(record['frames'] for record in done)
+    busy = sum(record['seconds'] for record in records)
+    totals = {}
+    for record in done:
+        for technique, count in record['counts'].items():
+            totals[technique] = totals.get(technique, 0) + count
+    print(f"\n{len(done)}/{len(records)} videos analysed, {len(records) - len(done)} failed", file=sys.stderr)
+    print(f"{frames} frames in {wall_seconds:.1f}s wall ({frames / wall_seconds if wall_seconds else 0:.1f} fps), "
+          f"{busy:.1f}s of worker time", file=sys.stderr)
+    if totals:
+        print("Punches: " + ", ".join(f"{technique} {count}" for technique, count in sorted(totals.items())), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse many boxing videos without a display.")
+    parser.add_argument("inputs", nargs="+", help="Video files and/or directories of videos.")
+    parser.add_argument("--recursive", action="store_true", help="Also search subdirectories.")
+    parser.add_argument("--output", type=str, default="-", help="Output file (default: stdout).")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default=None,
+                        help="jsonl: one record per video; csv: one row per punch (default: from --output, else jsonl).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Process budget (default: CPU count).")
+    parser.add_argument("--templates", type=str, default="data/templates")
+    parser.add_argument("--motion_templates", type=str, default=None, help="Directory of motion templates (optional).")
+    parser.add_argument("--interval", type=int, default=10, help="Analyse every n-th frame.")
+    parser.add_argument("--max_frame", type=int, default=None, help="Stop after this frame of each video.")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--min_duration", type=int, default=1, help="Sampled frames a punch must last.")
+    parser.add_argument("--hysteresis", type=int, default=0, help="Sampled frames a punch may miss its technique.")
+    parser.add_argument("--cache", type=str, default=None, help="Keypoint cache directory, reused across runs.")
+    parser.add_argument("--sessions", type=str, default=None,
+                        help="Also store each video's per-frame landmarks/labels as a columnar session in "
+                             "<dir>/<video path relative to its input directory>.")
+    args = parser.parse_args(argv)
+
+    videos = find_videos(args.inputs, args.recursive)
+    if not videos:
+        print("No videos found.", file=sys.stderr)
+        return 1
+    fmt = args.format or ('csv' if args.output.endswith('.csv') else 'jsonl')
+    options = {
+        'templates': args.templates, 'motion_templates': args.motion_templates, 'interval': args.interval,
+        'max_frame': args.max_frame, 'threshold': args.threshold, 'min_duration': args.min_duration,
+        'hysteresis': args.hysteresis, 'cache': args.cache, 'sessions': args.sessions,
+    }
+
+    names = session_names(videos, args.inputs)
+    if len(set(names.values())) != len(names):
+        # Two workers writing one session directory would corrupt it
+        print("Videos map to the same session directory: " + ", ".join(
+            video for video in videos if list(names.values()).count(names[video]) > 1), file=sys.stderr)
+        return 1
+
+    writer = ResultWriter(args.output, fmt)
+    try:
+        records = run_batch(videos, options, writer, max(1, args.workers), names)
+    finally:
+        writer.close()
+    return 0 if all(record['status'] == 'ok' for record in records) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from typing import Optional, Sequence, Union
+
+from src.frame_store import FrameStore, is_frame_store
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class Camera:
+    """
+    A live camera (cv2.VideoCapture) that remembers when each frame was captured.
+
+    read() grabs the frame first and timestamps it before decoding it, so `capture_time` is as
+    close to the sensor as OpenCV lets us get; the driver's own buffering is not included.
+    """
+    def __init__(self, index: int = 0):
+        self.cap = cv2.VideoCapture(index)
+        self.capture_time = None  # time.perf_counter() of the frame last read
+        self.dropped = 0
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def read(self):
+        if not self.cap.grab():
+            return False, None
+        self.capture_time = time.perf_counter()
+        return self.cap.retrieve()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def release(self):
+        self.cap.release()
+
+
+class ReplayCamera:
+    """
+    Plays recorded frames as if a camera were producing them, in place of cv2.VideoCapture, so
+    practice mode (and its latency) can run without a camera and be tested automatically.
+
+    The source is a video file, a directory of images, a frame store (.frames, played by video
+    frame index whatever order it was written in) or a list of BGR frames. With `realtime`, frame k is "captured" at start + k / fps whether or not anyone
+    reads it: read() waits for the next frame, and a reader that falls behind gets the newest
+    frame and the ones in between are dropped, like a live camera. `capture_time` is then the
+    frame's scheduled time, so queueing behind a slow pipeline shows up as latency.
+    Without `realtime`, every frame is returned at once and timestamped when read.
+    """
+    def __init__(self, source: Union[str, Sequence[np.ndarray]], fps: Optional[float] = None,
+                 loop: bool = False, realtime: bool = True):
+        """
+        Args:
+            source: video path, image directory, .frames store or list of frames
+            fps: frames per second to play at; default the video's own rate, else 30
+            loop: start over at the end instead of stopping
+            realtime: pace frames at `fps` (False = as fast as they are read)
+        """
+        self.loop = loop
+        self.realtime = realtime
+        self.capture_time = None  # time.perf_counter() at which the frame last read was captured
+        self.dropped = 0  # frames skipped because the reader was late
+        self._video = None
+        self._frames = None
+        self._store = None
+        if isinstance(source, str) and is_frame_store(source):
+            self._store = FrameStore(source)
+            self._store_positions = self._store.frame_positions()  # replay in video order, not storage order
+            self.length = len(self._store_positions)
+        elif isinstance(source, str) and os.path.isdir(source):
+            names = sorted(name for name in os.listdir(source) if name.lower().endswith(IMAGE_EXTENSIONS))
+            self._frames = [cv2.imread(os.path.join(source, name)) for name in names]
+            self.length = len(self._frames)
+        elif isinstance(source, str):
+            self._video = cv2.VideoCapture(source)
+            self.length = int(self._video.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = fps or self._video.get(cv2.CAP_PROP_FPS) or None
+        else:
+            self._frames = list(source)
+            self.length = len(self._frames)
+        self.fps = fps or 30.0
+        self._position = 0  # next frame of the video to decode
+        self._next = 0  # next frame to return (counting loops)
+        self._start = None
+
+    def isOpened(self) -> bool:
+        if self._video is not None:
+            return self._video.isOpened()
+        return self.length > 0
+
+    def read(self):
+        if self.realtime:
+            if self._start is None:
+                self._start = time.perf_counter()
+            due = int((time.perf_counter() - self._start) * self.fps)  # newest frame captured by now
+            if due < self._next:
+                time.sleep(max(0.0, self._start + self._next / self.fps - time.perf_counter()))
+                due = self._next
+            self.dropped += due - self._next
+            index = due
+            capture_time = self._start + index / self.fps
+        else:
+            index = self._next
+            capture_time = time.perf_counter()
+
+        if self.loop and self.length:
+            index_in_source = index % self.length
+        elif index < self.length or (self._video is not None and self.length <= 0):
+            index_in_source = index
+        else:
+            return False, None
+        frame = self._frame(index_in_source)
+        if frame is None:
+            return False, None
+        self._next = index + 1
+        self.capture_time = capture_time
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.length
+        return self._video.get(prop) if self._video is not None else 0
+
+    def release(self):
+        if self._video is not None:
+            self._video.release()
+        if self._store is not None:
+            self._store.close()
+        self.length = 0
+
+    def _frame(self, index: int) -> Optional[np.ndarray]:
+        if self._frames is not None:
+            return self._frames[index]
+        if self._store is not None:
+            return self._store.image_at(int(self._store_positions[index]))
+        if index < self._position:
+            self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            self._position = 0
+        while self._position < index:  # frames dropped by a late reader are skipped without decoding
+            if not self._video.grab():
+                return None
+            self._position += 1
+        ret, frame = self._video.read()
+        self._position += 1
+        return frame if ret else None
+
+
+class FrameGrabber:
+    """
+    Reads a camera (Camera, ReplayCamera or cv2.VideoCapture) on its own thread and keeps only
+    the newest frame, so a consumer slower than the camera always gets a fresh frame instead of
+    one that waited in the driver's buffer. Frames replaced before anyone read them are dropped.
+    """
+    def __init__(self, camera, name: str = 'frame-grabber'):
+        self.camera = camera
+        self.dropped = 0
+        self._frame = None  # (frame, capture_time) not read yet
+        self._ended = False
+        self._running = True
+        self._ready = threading.Condition()
+        self._thread = threading.Thread(target=self._grab_loop, name=name, daemon=True)
+        self._thread.start()
+
+    def read(self, timeout: Optional[float] = None):
+        """
+        The newest frame not read yet, waiting for it if needed.
+        Returns: (True, frame, capture_time), or (False, None, None) once the camera ended or
+            on timeout (check `ended` to tell them apart)
+        """
+        with self._ready:
+            self._ready.wait_for(lambda: self._frame is not None or self._ended, timeout)
+            if self._frame is None:
+                return False, None, None
+            (frame, capture_time), self._frame = self._frame, None
+        return True, frame, capture_time
+
+    @property
+    def ended(self) -> bool:
+        with self._ready:
+            return self._ended and self._frame is None
+
+    def stop(self):
+        """Stop grabbing and release the camera."""
+        with self._ready:
+            self._running = False
+        self._thread.join()
+        self.camera.release()
+
+    def _grab_loop(self):
+        while self._running:
+            ret, frame = self.camera.read()
+            if not ret:
+                break
+            capture_time = getattr(self.camera, 'capture_time', None) or time.perf_counter()
+            with self._ready:
+                if self._frame is not None:
+                    self.dropped += 1
+                self._frame = (frame, capture_time)
+                self._ready.notify_all()
+        with self._ready:
+            self._ended = True
+            self._ready.notify_all()
+
+
+def open_source(source: Union[int, str, Sequence[np.ndarray], None] = 0, **replay_options):
+    """
+    Camera for a camera index (or a numeric string such as "1"), ReplayCamera for anything else.
+    Args:
+        replay_options: fps, loop, realtime for ReplayCamera
+    """
+    if source is None:
+        source = 0
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    if isinstance(source, int):
+        return Camera(source)
+    return ReplayCamera(source, **replay_options)
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+
+class _Slot:
+    __slots__ = ('scheduler', 'station', 'start')
+
+    def __init__(self, scheduler, station):
+        self.scheduler = scheduler
+        self.station = station
+
+    def __enter__(self):
+        self.scheduler.acquire(self.station)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.scheduler.release(self.station, time.perf_counter() - self.start)
+        return False
+
+
+class CoreScheduler:
+    """
+    Shares the CPU cores between the pose inference of several practice stations (one camera each).
+
+    At most `slots` inferences run at once. When more stations are waiting than slots are free,
+    the one that has used the least inference time so far goes next, so every station gets an
+    equal share of the cores however slow its frames are, and a newly added station starts level
+    with the others instead of catching up.
+    Each station also paces itself to `target_fps` (pace()). While the cores keep up, that is the
+    rate every station runs at; under overload the rates fall together to each station's fair
+    share. Stations always take the newest camera frame (camera_source.FrameGrabber), so overload
+    costs frame rate, not latency. A station below `min_fps` is reported as degraded.
+    """
+    def __init__(self, slots: Optional[int] = None, target_fps: float = 30.0, min_fps: float = 10.0):
+        """
+        Args:
+            slots: inferences run at once; default half the cores, the rest is left for capture,
+                rendering, the GUI and MediaPipe's own helper threads
+            target_fps: highest frame rate of a station
+            min_fps: frame rate under which a station counts as degraded
+        """
+        self.slots = slots or max(1, (os.cpu_count() or 2) // 2)
+        self.target_fps = target_fps
+        self.min_fps = min_fps
+        self._free = self.slots
+        self._used = {}  # station -> inference seconds so far (its virtual time)
+        self._waiting = set()
+        self._next_due = {}  # station -> time.perf_counter() its next frame may start
+        self._rates = {}  # station -> (frames, window start) for the achieved frame rate
+        self._fps = {}  # station -> frame rate of its last complete window, None before the first
+        self._wait = {}  # station -> seconds spent waiting for a slot
+        self._busy = {}  # station -> inference seconds in the current rate window
+        self._share = {}  # station -> fraction of the slots it used in the last rate window
+        self._cond = threading.Condition()
+
+    def register(self, station):
+        with self._cond:
+            self._used[station] = min(self._used.values(), default=0.0)
+            self._next_due[station] = 0.0
+            self._rates[station] = (0, time.perf_counter())
+            self._fps[station] = None
+            self._wait[station] = 0.0
+            self._busy[station] = 0.0
+            self._share[station] = 0.0
+
+    def unregister(self, station):
+        with self._cond:
+            for table in (self._used, self._next_due, self._rates, self._fps, self._wait, self._busy, self._share):
+                table.pop(station, None)
+            self._waiting.discard(station)
+            self._cond.notify_all()
+
+    def pace(self, station):
+        """Wait until `station` may start its next frame (at most target_fps), and count the frame."""
+        with self._cond:
+            due = self._next_due.get(station, 0.0)
+        now = time.perf_counter()
+        if due > now:
+            time.sleep(due - now)
+            now = due
+        with self._cond:
+            if station not in self._rates:
+                return
+            # Late frames don't earn a burst of catch-up frames afterwards
+            self._next_due[station] = max(due, now - 1.0 / self.target_fps) + 1.0 / self.target_fps
+            frames, start = self._rates[station]
+            frames += 1
+            elapsed = now - start
+            if elapsed >= 1.0:
+                self._fps[station] = frames / elapsed
+                self._share[station] = self._busy[station] / elapsed / self.slots
+                self._busy[station] = 0.0
+                frames, start = 0, now
+            self._rates[station] = (frames, start)
+
+    def slot(self, station) -> _Slot:
+        """Context manager holding an inference slot for `station`, e.g. around pose.process()."""
+        return _Slot(self, station)
+
+    def acquire(self, station):
+        """Block until a slot is free and no waiting station has used less inference time."""
+        start = time.perf_counter()
+        with self._cond:
+            self._waiting.add(station)
+            self._cond.wait_for(lambda: self._free > 0 and self._is_next(station))
+            self._waiting.discard(station)
+            self._free -= 1
+            if station in self._wait:
+                self._wait[station] += time.perf_counter() - start
+
+    def release(self, station, busy: float):
+        """Give the slot back after `busy` seconds of inference."""
+        with self._cond:
+            self._free += 1
+            if station in self._used:
+                self._used[station] += busy
+                self._busy[station] += busy
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        """
+        Per station: achieved fps, share of the slots, seconds waited for a slot, and whether it is
+        degraded (below min_fps over at least one full window, including a station that stalled).
+        """
+        now = time.perf_counter()
+        stations = {}
+        with self._cond:
+            for station in self._used:
+                fps, share = self._fps[station], self._share[station]
+                frames, start = self._rates[station]
+                elapsed = now - start
+                if elapsed >= 1.0:  # pace() hasn't closed this window: the station is slower than that
+                    fps = frames / elapsed
+                    share = self._busy[station] / elapsed / self.slots
+                stations[station] = {'fps': fps or 0.0, 'share': share, 'wait_s': self._wait[station],
+                                     'degraded': fps is not None and fps < self.min_fps}
+        return {'slots': self.slots, 'target_fps': self.target_fps, 'stations': stations,
+                'overloaded': any(s['degraded'] for s in stations.values())}
+
+    def _is_next(self, station):
+        used = self._used.get(station, 0.0)
+        return all(used <= self._used.get(other, 0.0) for other in self._waiting if other != station)
@@ -0,0 +1,91 @@
+import heapq
+import numpy as np
+from typing import Optional, Tuple
+
+
+def pose_distances(points: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """
+    Mean per-landmark euclidean distance between `query` (K, 2) and each of `points` (N, K, 2).
+    This is PoseMatcher's distance for fully detected poses, and a true metric, so it can drive a ball tree.
+    """
+    diff = points - query
+    return np.sqrt(np.einsum('nkc,nkc->nk', diff, diff)).mean(axis=1)
+
+
+class BallTree:
+    """
+    Ball tree over normalized poses for exact k-nearest-neighbour search under pose_distances.
+
+    Poses are split recursively (along the direction between two far-apart poses, at the median)
+    into leaves of about `leaf_size` poses, each with a center and a radius covering its poses.
+    Only the leaves are kept: a query measures its distance to every leaf center in one vectorized
+    call, then scans leaves in order of their triangle-inequality lower bound and stops as soon as
+    no remaining leaf can hold anything closer than the current k-th best. With leaf_size ~ sqrt(N)
+    a query touches O(sqrt(N)) centers plus the few leaves near it.
+    """
+    def __init__(self, points: np.ndarray, leaf_size: Optional[int] = None):
+        """
+        Args:
+            points: (N, K, 2) normalized poses with every landmark present.
+            leaf_size: max poses per leaf (default: about sqrt(N), at least 32).
+        """
+        points = np.ascontiguousarray(points, dtype=np.float32)
+        self.leaf_size = leaf_size or max(32, int(np.sqrt(len(points))))
+        self.order = np.arange(len(points))
+        leaves = []
+        if len(points):
+            self._split(points, 0, len(points), leaves)
+
+        self.points = points[self.order]  # leaf members are contiguous slices
+        self.bounds = np.array([bounds for bounds in leaves], dtype=np.int64).reshape(-1, 2)
+        self.centers = np.zeros((len(leaves),) + points.shape[1:], dtype=np.float32)
+        self.radii = np.zeros(len(leaves))
+        for leaf, (start, end) in enumerate(self.bounds):
+            members = self.points[start:end]
+            self.centers[leaf] = members.mean(axis=0)
+            self.radii[leaf] = pose_distances(members, self.centers[leaf]).max()
+
+    def _split(self, points: np.ndarray, start: int, end: int, leaves: list):
+        if end - start <= self.leaf_size:
+            leaves.append((start, end))
+            return
+        members = self.order[start:end]
+        pts = points[members]
+        far_a = pts[np.argmax(pose_distances(pts, pts.mean(axis=0)))]
+        far_b = pts[np.argmax(pose_distances(pts, far_a))]
+        projection = ((pts - far_a) * (far_b - far_a)).sum(axis=(1, 2))
+        self.order[start:end] = members[np.argsort(projection, kind='stable')]
+        mid = start + (end - start) // 2
+        self._split(points, start, mid, leaves)
+        self._split(points, mid, end, leaves)
+
+    def query(self, query: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns: (indices into the original `points`, distances) of the k nearest poses, closest first.
+        """
+        if len(self.bounds) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        query = np.asarray(query, dtype=np.float32)
+        lower_bounds = np.maximum(pose_distances(self.centers, query) - self.radii, 0.0)
+
+        best = []  # max-heap of (-distance, index)
+        for leaf in np.argsort(lower_bounds):
+            if len(best) == k and lower_bounds[leaf] >= -best[0][0]:
+                break
+            start, end = self.bounds[leaf]
+            distances = pose_distances(self.points[start:end], query)
+            nearest = np.argsort(distances)[:k] if k < len(distances) else np.argsort(distances)
+            for offset in nearest:
+                item = (-float(distances[offset]), int(self.order[start + offset]))
+                if len(best) < k:
+                    heapq.heappush(best, item)
+                elif item[0] > best[0][0]:
+                    heapq.heapreplace(best, item)
+                else:
+                    break
+
+        best.sort(reverse=True)
+        return np.array([i for _, i in best], dtype=np.int64), np.array([-d for d, _ in best])
+
+    def __len__(self):
+        return len(self.order)
@@ -0,0 +1,114 @@
+import cv2
+import numpy as np
+from typing import Optional, Tuple
+
+# MediaPipe's default landmark colour is BGR red; these specs draw the same skeleton on RGB images
+_LANDMARK_COLOR_RGB = (255, 0, 0)
+_CONNECTION_COLOR_RGB = (224, 224, 224)
+
+
+class FrameRenderer:
+    """
+    Display path for video frames: resize once into a preallocated buffer sized to the widget,
+    optionally draw the skeleton there, and wrap the buffer in a QImage without copying.
+
+    Buffers are reused round-robin (`buffers` of them), so a frame handed to the GUI stays
+    valid while the next few are rendered; they are reallocated only when the target size changes.
+    """
+    def __init__(self, smooth: bool = True, buffers: int = 4):
+        """
+        Args:
+            smooth: bilinear scaling like Qt.SmoothTransformation; False = nearest neighbour like
+                Qt.FastTransformation
+            buffers: buffers in the ring, more than the frames the GUI may hold at once
+        """
+        self.smooth = smooth
+        self.buffers = buffers
+        self._ring = []
+        self._next = 0
+        self._landmark_spec = None
+        self._connection_spec = None
+        self._connections = None  # (K, 2) landmark index pairs for draw_keypoints
+
+    @staticmethod
+    def fit_size(frame_w: int, frame_h: int, target_w: int, target_h: int) -> Tuple[int, int]:
+        """Largest (w, h) with the frame's aspect ratio that fits in the target (Qt.KeepAspectRatio)."""
+        if target_w <= 0 or target_h <= 0:
+            return frame_w, frame_h
+        scale = min(target_w / frame_w, target_h / frame_h)
+        return max(1, int(round(frame_w * scale))), max(1, int(round(frame_h * scale)))
+
+    def render(self, frame: np.ndarray, target_size: Optional[Tuple[int, int]] = None, bgr: bool = False,
+               fresh: bool = False) -> np.ndarray:
+        """
+        Scale `frame` to fit `target_size` (w, h) into the next ring buffer.
+        Args:
+            bgr: the frame is BGR (OpenCV); it is converted after scaling, on the smaller image
+            fresh: into a new array instead, when the GUI may still hold every buffer of the ring
+        Returns: (h, w, 3) RGB view of the buffer
+        """
+        h, w = frame.shape[:2]
+        size = self.fit_size(w, h, *target_size) if target_size else (w, h)
+        buffer = self._buffer(size, fresh)
+        if size == (w, h):
+            if bgr:
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buffer)
+            else:
+                np.copyto(buffer, frame)
+            return buffer
+
+        interpolation = cv2.INTER_LINEAR if self.smooth else cv2.INTER_NEAREST
+        cv2.resize(frame, size, dst=buffer, interpolation=interpolation)
+        if bgr:
+            cv2.cvtColor(buffer, cv2.COLOR_BGR2RGB, dst=buffer)
+        return buffer
+
+    def copy(self, image: np.ndarray, fresh: bool = False) -> np.ndarray:
+        """A copy of a rendered image in the next ring buffer (or a new array), e.g. to draw the skeleton on."""
+        buffer = self._buffer((image.shape[1], image.shape[0]), fresh)
+        np.copyto(buffer, image)
+        return buffer
+
+    def draw_pose(self, image_rgb: np.ndarray, pose_landmarks):
+        """Draw MediaPipe's skeleton on an RGB image of any size, in MediaPipe's usual colours."""
+        import mediapipe as mp
+        if self._landmark_spec is None:
+            self._landmark_spec = mp.solutions.drawing_utils.DrawingSpec(color=_LANDMARK_COLOR_RGB, thickness=2, circle_radius=2)
+            self._connection_spec = mp.solutions.drawing_utils.DrawingSpec(color=_CONNECTION_COLOR_RGB, thickness=2)
+        mp.solutions.drawing_utils.draw_landmarks(image_rgb, pose_landmarks, mp.solutions.pose.POSE_CONNECTIONS,
+                                                  self._landmark_spec, self._connection_spec)
+
+    def draw_keypoints(self, image_rgb: np.ndarray, keypoints, min_visibility: float = 0.5):
+        """
+        draw_pose for a PoseFrame, e.g. one filtered or predicted by LandmarkFilter: the same
+        skeleton and colours, drawn from the normalized landmark array.
+        """
+        if self._connections is None:
+            import mediapipe as mp
+            self._connections = np.array(sorted(mp.solutions.pose.POSE_CONNECTIONS), dtype=np.int64).reshape(-1, 2)
+        h, w = image_rgb.shape[:2]
+        visible = keypoints.mask & (keypoints.data[:, 3] >= min_visibility)
+        pixels = np.round(keypoints.data[:, :2] * (w, h)).astype(np.int32)
+        connections = self._connections[visible[self._connections].all(axis=1)]
+        if len(connections):
+            cv2.polylines(image_rgb, list(pixels[connections]), False, _CONNECTION_COLOR_RGB, 2)
+        for x, y in pixels[visible].tolist():
+            cv2.circle(image_rgb, (x, y), 2, _LANDMARK_COLOR_RGB, 2)
+
+    @staticmethod
+    def to_qimage(image_rgb: np.ndarray):
+        """QImage sharing the RGB buffer's memory (no copy); keep the array alive while it is used."""
+        from PyQt5.QtGui import QImage
+        h, w, ch = image_rgb.shape
+        return QImage(image_rgb.data, w, h, image_rgb.strides[0], QImage.Format_RGB888)
+
+    def _buffer(self, size: Tuple[int, int], fresh: bool = False) -> np.ndarray:
+        w, h = size
+        if fresh:
+            return np.empty((h, w, 3), dtype=np.uint8)
+        if not self._ring or self._ring[0].shape[:2] != (h, w):
+            self._ring = [np.empty((h, w, 3), dtype=np.uint8) for _ in range(self.buffers)]
+            self._next = 0
+        buffer = self._ring[self._next]
+        self._next = (self._next + 1) % len(self._ring)
+        return buffer
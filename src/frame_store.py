@@ -0,0 +1,338 @@
+"""
+Single-file, append-only store for saved video frames, instead of one image file per frame.
+
+    <name>.frames      a small header, then one record per frame:
+                       header (frame index, sizes, name length), name, encoded image, encoded thumbnail
+    <name>.frames.idx  int64 rows (frame_index, record offset, image offset, image size,
+                       thumbnail offset, thumbnail size), one per record
+
+Images stay encoded (JPEG/PNG/WebP from AsyncFrameWriter), so the store is as small as the
+old directory. The index is only a cache of the record headers: a store whose index is missing
+or behind the data (a crash between the two writes) is re-indexed from the headers, and a
+half-written last record is cut off when the store is reopened for writing.
+FrameStore memory-maps the data file, so looking up and decoding a frame costs one imdecode
+and opening a store costs the index read. export_directory() writes the old
+frame_XXXX.jpg layout for tools that expect it.
+"""
+import os
+import struct
+import threading
+import numpy as np
+from typing import Iterator, List, Optional, Tuple
+
+FRAME_STORE_EXTENSION = '.frames'
+INDEX_EXTENSION = '.idx'
+
+_FILE_MAGIC = b'BXFS'
+_FILE_VERSION = 1
+_FILE_HEADER = struct.Struct('<4sHH8s16x')  # magic, version, reserved, image format; 32 bytes
+_RECORD_MAGIC = b'FRM1'
+_RECORD_HEADER = struct.Struct('<4sqIIH')  # magic, frame_index, image size, thumbnail size, name length
+_INDEX_COLUMNS = 6  # frame_index, record offset, image offset, image size, thumbnail offset, thumbnail size
+
+
+def is_frame_store(path: Optional[str]) -> bool:
+    """True for paths meant as a frame store (by extension) rather than an image directory."""
+    return bool(path) and path.endswith(FRAME_STORE_EXTENSION)
+
+
+def remove_frame_store(path: str):
+    """Delete a store: two unlinks, however many frames it holds."""
+    for file_path in (path, path + INDEX_EXTENSION):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+class FrameStoreWriter:
+    """
+    Appends encoded frames to a store; thread-safe, so encoder threads can append directly.
+    Opening an existing store continues it, unless `overwrite` starts it over.
+    """
+    def __init__(self, path: str, image_format: str = 'jpg', overwrite: bool = False):
+        """
+        Args:
+            path: the .frames file (its directory is created if needed)
+            image_format: extension of the encoded images, used by export_directory
+            overwrite: discard the frames of an existing store (a new run), instead of appending to them
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        if overwrite:
+            remove_frame_store(path)
+        exists = os.path.exists(path) and os.path.getsize(path) >= _FILE_HEADER.size
+        if exists:
+            self.image_format, _ = _read_header(path)
+            index, end = _load_index(path)
+        else:
+            self.image_format = image_format
+            index, end = np.zeros((0, _INDEX_COLUMNS), dtype=np.int64), _FILE_HEADER.size
+
+        self._data = open(path, 'r+b' if exists else 'w+b')
+        if not exists:
+            self._data.write(_FILE_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, 0, self.image_format.encode()))
+        self._data.truncate(end)  # drop a record interrupted by a crash
+        self._data.seek(end)
+        self._index = open(path + INDEX_EXTENSION, 'w+b')
+        self._index.write(index.tobytes())
+        self.count = len(index)
+
+    def append(self, frame_index: int, image: bytes, name: str = '', thumbnail: bytes = b'') -> int:
+        """
+        Append one encoded frame.
+        Args:
+            frame_index: frame number in the video, the key for FrameStore.get()
+            image: encoded image bytes, e.g. from cv2.imencode
+            name: file name (without extension) for export_directory, e.g. 'frame_0012'
+            thumbnail: encoded downscaled image, or b'' for none
+        Returns: position of the frame in the store
+        """
+        name_bytes = name.encode()
+        header = _RECORD_HEADER.pack(_RECORD_MAGIC, frame_index, len(image), len(thumbnail), len(name_bytes))
+        with self._lock:
+            record_offset = self._data.tell()
+            image_offset = record_offset + len(header) + len(name_bytes)
+            thumbnail_offset = image_offset + len(image)
+            self._data.write(header + name_bytes)
+            self._data.write(image)
+            self._data.write(thumbnail)
+            row = np.array([frame_index, record_offset, image_offset, len(image), thumbnail_offset, len(thumbnail)],
+                           dtype=np.int64)
+            self._index.write(row.tobytes())
+            position = self.count
+            self.count += 1
+        return position
+
+    def append_store(self, path: str):
+        """Copy every frame of another store (e.g. one written by a worker process) without re-encoding."""
+        store = FrameStore(path)
+        try:
+            for position in range(len(store)):
+                self.append(int(store.frame_indices[position]), store.encoded_at(position), store.name_at(position),
+                            store.encoded_at(position, thumbnail=True))
+        finally:
+            store.close()
+
+    def flush(self):
+        """Make everything appended so far durable."""
+        with self._lock:
+            for f in (self._data, self._index):
+                f.flush()
+                os.fsync(f.fileno())
+
+    def close(self):
+        if not self._data.closed:
+            self.flush()
+            self._data.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class FrameStore:
+    """
+    Read access to a store, by video frame index (get) or by position in the store (image_at).
+    Positions, iteration and export_directory follow the order the frames were appended. That is
+    video order for stores written by AsyncFrameWriter and analysis (frames are appended in the
+    order they were read, shards one after another), but not necessarily for a store continued
+    or imported out of order; frame_positions() gives video order for any store.
+    The data file is memory-mapped; reload() picks up frames appended since opening.
+    """
+    def __init__(self, path: str):
+        if not os.path.exists(path):
+            raise ValueError(f"Error: {path} is not a frame store")
+        self.path = path
+        self.image_format, _ = _read_header(path)
+        self._data = None
+        self.reload()
+
+    def reload(self):
+        index, end = _load_index(self.path)
+        self._data = np.memmap(self.path, dtype=np.uint8, mode='r', shape=(end,))
+        self.index = index
+        self.frame_indices = index[:, 0]
+        # Sorted view for lookups; stable, so a frame stored twice resolves to its last copy
+        self._order = np.argsort(self.frame_indices, kind='stable')
+        self._sorted = self.frame_indices[self._order]
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, frame_index: int) -> bool:
+        return self.position(frame_index) is not None
+
+    def position(self, frame_index: int) -> Optional[int]:
+        """Position of a video frame in the store, None if it wasn't saved."""
+        i = int(np.searchsorted(self._sorted, frame_index, side='right')) - 1
+        if i < 0 or self._sorted[i] != frame_index:
+            return None
+        return int(self._order[i])
+
+    def frame_positions(self) -> np.ndarray:
+        """Positions of the saved video frames by increasing frame index, each frame once (its last copy)."""
+        last_copy = np.append(self._sorted[1:] != self._sorted[:-1], True) if len(self) else np.zeros(0, bool)
+        return self._order[last_copy]
+
+    def nearest(self, frame_index: int) -> Optional[int]:
+        """The saved video frame closest to `frame_index`, e.g. for scrubbing between sampled frames."""
+        if not len(self):
+            return None
+        i = int(np.searchsorted(self._sorted, frame_index))
+        candidates = self._sorted[max(0, i - 1):i + 1]
+        return int(candidates[np.argmin(np.abs(candidates - frame_index))])
+
+    def get(self, frame_index: int, thumbnail: bool = False) -> Optional[np.ndarray]:
+        """Decoded BGR image (like cv2.imread) of a video frame, None if it isn't in the store."""
+        position = self.position(frame_index)
+        return None if position is None else self.image_at(position, thumbnail)
+
+    def image_at(self, position: int, thumbnail: bool = False) -> np.ndarray:
+        """
+        Decoded BGR image at a position in the store.
+        Args:
+            thumbnail: decode the downscaled copy instead (the full image if none was stored)
+        """
+        import cv2
+        return cv2.imdecode(self._encoded_view(position, thumbnail), cv2.IMREAD_COLOR)
+
+    def encoded_at(self, position: int, thumbnail: bool = False) -> bytes:
+        """Encoded bytes at a position; b'' for a missing thumbnail."""
+        _, _, image_offset, size, thumbnail_offset, thumbnail_size = self.index[position].tolist()
+        if thumbnail:
+            image_offset, size = thumbnail_offset, thumbnail_size
+        return self._data[image_offset:image_offset + size].tobytes()
+
+    def name_at(self, position: int) -> str:
+        record_offset = int(self.index[position, 1])
+        _, _, _, _, name_length = _RECORD_HEADER.unpack_from(self._data, record_offset)
+        start = record_offset + _RECORD_HEADER.size
+        return self._data[start:start + name_length].tobytes().decode()
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """(frame_index, image) in the order the frames were appended (see the class docstring)."""
+        for position in range(len(self)):
+            yield int(self.frame_indices[position]), self.image_at(position)
+
+    def export_directory(self, directory: str, thumbnails: bool = False) -> List[str]:
+        """
+        Write the frames as individual image files, named as AsyncFrameWriter names them in a directory
+        (frame_XXXX.jpg), by copying the encoded bytes. Returns the paths written.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for position in range(len(self)):
+            name = self.name_at(position) or f"frame_{int(self.frame_indices[position]):04d}"
+            path = os.path.join(directory, f"{name}.{self.image_format}")
+            with open(path, 'wb') as f:
+                f.write(self._encoded_view(position, thumbnails).tobytes())
+            paths.append(path)
+        return paths
+
+    def close(self):
+        self._data = None  # the memmap closes once no image views are left
+
+    def _encoded_view(self, position: int, thumbnail: bool) -> np.ndarray:
+        _, _, image_offset, size, thumbnail_offset, thumbnail_size = self.index[position].tolist()
+        if thumbnail and thumbnail_size:
+            image_offset, size = thumbnail_offset, thumbnail_size
+        return self._data[image_offset:image_offset + size]
+
+
+def _read_header(path: str) -> Tuple[str, int]:
+    with open(path, 'rb') as f:
+        header = f.read(_FILE_HEADER.size)
+    if len(header) < _FILE_HEADER.size:
+        raise ValueError(f"Error: {path} is not a frame store")
+    magic, version, _, image_format = _FILE_HEADER.unpack(header)
+    if magic != _FILE_MAGIC or version != _FILE_VERSION:
+        raise ValueError(f"Error: {path} is not a frame store (version {version})")
+    return image_format.rstrip(b'\0').decode(), version
+
+
+def _load_index(path: str) -> Tuple[np.ndarray, int]:
+    """
+    The index rows and the end of the last complete record. Uses the .idx file when it matches
+    the data, otherwise rebuilds it from the record headers.
+    """
+    data_size = os.path.getsize(path)
+    try:
+        index = np.fromfile(path + INDEX_EXTENSION, dtype=np.int64)
+        index = index[:len(index) // _INDEX_COLUMNS * _INDEX_COLUMNS].reshape(-1, _INDEX_COLUMNS)
+    except (OSError, ValueError):
+        index = np.zeros((0, _INDEX_COLUMNS), dtype=np.int64)
+    end = int(index[-1, 4] + index[-1, 5]) if len(index) else _FILE_HEADER.size
+    if end == data_size:
+        return index, end
+    if end < data_size and _record_at(path, end, data_size) is None:
+        # Index complete; only a partial record follows it
+        return index, end
+    return _scan(path, data_size)
+
+
+def _scan(path: str, data_size: int) -> Tuple[np.ndarray, int]:
+    rows = []
+    offset = _FILE_HEADER.size
+    while True:
+        row = _record_at(path, offset, data_size)
+        if row is None:
+            break
+        rows.append(row)
+        offset = row[4] + row[5]
+    return np.array(rows, dtype=np.int64).reshape(-1, _INDEX_COLUMNS), offset
+
+
+def _record_at(path: str, offset: int, data_size: int) -> Optional[List[int]]:
+    """Index row of a complete record starting at `offset`, else None."""
+    if offset + _RECORD_HEADER.size > data_size:
+        return None
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        magic, frame_index, size, thumbnail_size, name_length = _RECORD_HEADER.unpack(f.read(_RECORD_HEADER.size))
+    image_offset = offset + _RECORD_HEADER.size + name_length
+    if magic != _RECORD_MAGIC or image_offset + size + thumbnail_size > data_size:
+        return None
+    return [frame_index, offset, image_offset, size, image_offset + size, thumbnail_size]
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Export a frame store as a directory of images, or import one.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Write frame_XXXX images from a store into a directory.")
+    export.add_argument("store")
+    export.add_argument("directory")
+    export.add_argument("--thumbnails", action="store_true", help="Export the thumbnails instead.")
+    imp = sub.add_parser("import", help="Pack a directory of frame_XXXX images into a store.")
+    imp.add_argument("directory")
+    imp.add_argument("store")
+    imp.add_argument("--frame_interval", type=int, default=1,
+                     help="Interval the images were extracted with: frame_XXXX is the XXXX-th sampled frame, so it "
+                          "is stored under video frame XXXX * interval, the key extraction would have used.")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        store = FrameStore(args.store)
+        paths = store.export_directory(args.directory, args.thumbnails)
+        print(f"Exported {len(paths)} frames to {args.directory}")
+    else:
+        names = sorted(name for name in os.listdir(args.directory) if name.startswith("frame_"))
+        with FrameStoreWriter(args.store, os.path.splitext(names[0])[1][1:] if names else 'jpg', overwrite=True) as writer:
+            for name in names:
+                stem = os.path.splitext(name)[0]
+                with open(os.path.join(args.directory, name), 'rb') as f:
+                    writer.append(int(stem.split('_')[-1]) * args.frame_interval, f.read(), stem)
+        print(f"Imported {len(names)} frames into {args.store}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
+
+# python -m src.frame_store export data/frames_img.frames data/frames_img
+# python -m src.frame_store import data/frames_img data/frames_img.frames
+# python -m src.frame_store import data/frames_img data/frames_img.frames --frame_interval 10   (extracted every 10th frame)
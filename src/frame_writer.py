@@ -0,0 +1,165 @@
+import os
+import threading
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from src.frame_store import FrameStoreWriter, is_frame_store
+
+# cv2.imwrite parameters per output format; quality is 0-100 for every format
+_ENCODE_PARAMS = {
+    'jpg': lambda quality: [cv2.IMWRITE_JPEG_QUALITY, quality],
+    'png': lambda quality: [cv2.IMWRITE_PNG_COMPRESSION, min(9, max(0, (100 - quality) // 10))],
+    'webp': lambda quality: [cv2.IMWRITE_WEBP_QUALITY, quality],
+}
+
+
+class AsyncFrameWriter:
+    """
+    Encode and write frames on a small thread pool so the caller never waits on the encoder or the disk.
+    At most `max_pending` frames are queued; write() blocks once that many are in flight.
+    A `directory` ending in .frames is a frame store (see frame_store): frames are appended to
+    that one file instead of becoming one image file each, in the order write() was called
+    (encoded frames that finish early wait for the ones queued before them).
+    """
+    def __init__(self, directory: str, workers: int = 2, max_pending: int = 32, image_format: str = 'jpg', quality: int = 95,
+                 thumbnail_width: int = 0, overwrite: bool = False):
+        """
+        Args:
+            directory (str): Where images are written. Created if needed.
+            workers (int): Encoder threads. cv2 releases the GIL while encoding.
+            max_pending (int): Bound on queued frames, caps memory when the disk falls behind.
+            image_format (str): 'jpg', 'png' or 'webp'.
+            quality (int): 0-100, mapped to the format's own quality/compression setting.
+            thumbnail_width (int): Frame stores only: also store a copy downscaled to this width, for scrubbing (0 = none).
+            overwrite (bool): Frame stores only: start the store over instead of appending to it.
+        """
+        if image_format not in _ENCODE_PARAMS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        self.directory = directory
+        self.image_format = image_format
+        self.params = _ENCODE_PARAMS[image_format](quality)
+        self.thumbnail_width = thumbnail_width
+        self.store = None
+        if is_frame_store(directory):
+            self.store = FrameStoreWriter(directory, image_format, overwrite)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='frame-writer')
+        self._futures = []
+        self._failures = []
+        self._lock = threading.Lock()
+        self._order_lock = threading.Lock()
+        self._encoded = {}  # sequence number -> encoded record waiting for earlier frames, None if it failed
+        self._next_append = 0  # sequence number of the next record to append to the store
+        self.written = 0
+        self.queued = 0
+
+    def write(self, frame: np.ndarray, name: str, frame_index: Optional[int] = None) -> str:
+        """
+        Queue `frame` to be saved as `<directory>/<name>.<image_format>`. The frame must not be modified afterwards.
+        Args:
+            frame_index: video frame number, the frame's key in a frame store (default: the number of frames queued so far)
+        Returns: the target path.
+        """
+        path = os.path.join(self.directory, f"{name}.{self.image_format}")
+        if self.store is not None and frame_index is None:
+            frame_index = self.queued
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(self._write, path, frame, name, frame_index, self.queued)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._futures.append(future)
+        self.queued += 1
+        return path
+
+    def flush(self) -> List[Tuple[str, str]]:
+        """
+        Wait for every queued frame.
+        Returns: [(path, reason), ...] for frames that failed since the last flush.
+        """
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+        with self._lock:
+            failures, self._failures = self._failures, []
+        return failures
+
+    def close(self) -> List[Tuple[str, str]]:
+        """Flush, stop the worker threads and return the remaining failures."""
+        failures = self.flush()
+        self._pool.shutdown(wait=True)
+        if self.store is not None:
+            self.store.close()
+        return failures
+
+    def _write(self, path: str, frame: np.ndarray, name: str, frame_index: Optional[int], sequence: int):
+        if self.store is not None:
+            record = None
+            try:
+                record = self._encode(frame, name, frame_index)
+                if record is None:
+                    self._fail(path, "encoding failed")
+            except Exception as e:
+                self._fail(path, str(e))
+            self._append_in_order(sequence, path, record)
+            return
+        try:
+            if cv2.imwrite(path, frame, self.params):
+                with self._lock:
+                    self.written += 1
+            else:
+                self._fail(path, "encoding failed")
+        except Exception as e:
+            self._fail(path, str(e))
+        finally:
+            self._slots.release()
+
+    def _append_in_order(self, sequence: int, path: str, record):
+        # Append this record and any later ones it held up. Their slots are only released once
+        # appended, so records waiting behind a slow frame still count against max_pending.
+        with self._order_lock:
+            self._encoded[sequence] = (path, record)
+            while self._next_append in self._encoded:
+                path, record = self._encoded.pop(self._next_append)
+                self._next_append += 1
+                try:
+                    if record is not None:
+                        self.store.append(*record)
+                        with self._lock:
+                            self.written += 1
+                except Exception as e:
+                    self._fail(path, str(e))
+                finally:
+                    self._slots.release()
+
+    def _encode(self, frame: np.ndarray, name: str, frame_index: int):
+        """Returns: (frame_index, image, name, thumbnail) for FrameStoreWriter.append, None if encoding failed."""
+        ext = '.' + self.image_format
+        ok, image = cv2.imencode(ext, frame, self.params)
+        if not ok:
+            return None
+        thumbnail = b''
+        h, w = frame.shape[:2]
+        if self.thumbnail_width and w > self.thumbnail_width:
+            size = (self.thumbnail_width, max(1, round(h * self.thumbnail_width / w)))
+            ok, encoded = cv2.imencode(ext, cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR), self.params)
+            if ok:
+                thumbnail = encoded.tobytes()
+        return frame_index, image.tobytes(), name, thumbnail
+
+    def _fail(self, path: str, reason: str):
+        with self._lock:
+            self._failures.append((path, reason))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,150 @@
+import math
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class Hit:
+    """A hand entering a target, found by HitTester.update."""
+    __slots__ = ('target_id', 'hand', 'time', 'position', 'velocity')
+
+    def __init__(self, target_id, hand, time, position, velocity):
+        self.target_id = target_id
+        self.hand = hand  # e.g. 'left_wrist'
+        self.time = time  # seconds, interpolated to the moment the path crossed the target's edge
+        self.position = position  # (x, y) where it crossed, in target coordinates
+        self.velocity = velocity  # (vx, vy) per second over the frame interval
+
+    @property
+    def speed(self) -> float:
+        return math.hypot(*self.velocity)
+
+    def __repr__(self):
+        return (f"Hit({self.target_id!r}, {self.hand!r}, t={self.time:.3f}, "
+                f"at=({self.position[0]:.0f}, {self.position[1]:.0f}), speed={self.speed:.0f})")
+
+
+class HitTester:
+    """
+    Hit testing of moving hands against many circular targets.
+
+    Each update() takes the segment a hand swept since its previous position, so a fast punch
+    that passes through a target between two frames still hits it. Targets are bucketed in a
+    uniform grid of `cell_size` cells; a segment is only tested against targets in the cells
+    its bounding box touches, then against all of those at once with numpy.
+    A hit is reported when the path enters a target (or a hand first appears inside one);
+    a hand resting inside a target doesn't hit it again on every frame.
+    """
+    def __init__(self, cell_size: float = 200.0):
+        """
+        Args:
+            cell_size: grid cell size in target coordinates, about the diameter of a typical target
+        """
+        self.cell_size = cell_size
+        self.targets = {}  # id -> (x, y, radius)
+        self._grid = {}  # (cx, cy) -> set of target ids
+        self._hands = {}  # hand -> (x, y, time) of its last position
+        self._next_id = 0
+        self.stats = {'updates': 0, 'candidates': 0, 'hits': 0}
+
+    def add_target(self, x: float, y: float, radius: float, target_id=None):
+        """Add (or replace) a circular target; returns its id."""
+        if target_id is None:
+            target_id = self._next_id
+            self._next_id += 1
+        if target_id in self.targets:
+            self.remove_target(target_id)
+        self.targets[target_id] = (float(x), float(y), float(radius))
+        for cell in self._cells(x - radius, y - radius, x + radius, y + radius):
+            self._grid.setdefault(cell, set()).add(target_id)
+        return target_id
+
+    def move_target(self, target_id, x: float, y: float, radius: Optional[float] = None):
+        radius = self.targets[target_id][2] if radius is None else radius
+        self.add_target(x, y, radius, target_id)
+
+    def remove_target(self, target_id):
+        x, y, radius = self.targets.pop(target_id)
+        for cell in self._cells(x - radius, y - radius, x + radius, y + radius):
+            ids = self._grid.get(cell)
+            if ids is not None:
+                ids.discard(target_id)
+                if not ids:
+                    del self._grid[cell]
+
+    def clear_targets(self):
+        self.targets.clear()
+        self._grid.clear()
+
+    def reset_hands(self):
+        """Forget the hands' last positions, e.g. after tracking was lost; the next update starts a new path."""
+        self._hands.clear()
+
+    def update(self, hand: str, position: Optional[Tuple[float, float]], timestamp: float) -> List[Hit]:
+        """
+        Move `hand` to `position` at `timestamp` (None = not visible, which ends its path).
+        Returns: hits along the path since the hand's previous position, earliest first.
+        """
+        previous = self._hands.pop(hand, None)
+        if position is None:
+            return []
+        x1, y1 = float(position[0]), float(position[1])
+        self._hands[hand] = (x1, y1, timestamp)
+        x0, y0, t0 = previous if previous is not None else (x1, y1, timestamp)
+        self.stats['updates'] += 1
+
+        candidates = set()
+        for cell in self._cells(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)):
+            candidates.update(self._grid.get(cell, ()))
+        if not candidates:
+            return []
+        self.stats['candidates'] += len(candidates)
+
+        ids = list(candidates)
+        circles = np.array([self.targets[target_id] for target_id in ids])
+        fractions = _segment_entries(x0, y0, x1, y1, circles, first=previous is None)
+        dt = timestamp - t0
+        velocity = ((x1 - x0) / dt, (y1 - y0) / dt) if dt > 0 else (0.0, 0.0)
+        hits = []
+        for i in np.flatnonzero(~np.isnan(fractions))[np.argsort(fractions[~np.isnan(fractions)])]:
+            s = float(fractions[i])
+            hits.append(Hit(ids[i], hand, t0 + s * dt, (x0 + s * (x1 - x0), y0 + s * (y1 - y0)), velocity))
+        self.stats['hits'] += len(hits)
+        return hits
+
+    def update_hands(self, positions: Dict[str, Optional[Tuple[float, float]]], timestamp: float) -> List[Hit]:
+        """update() for several hands at once; hits of all hands, earliest first."""
+        hits = [hit for hand, position in positions.items() for hit in self.update(hand, position, timestamp)]
+        return sorted(hits, key=lambda hit: hit.time)
+
+    def _cells(self, x_min, y_min, x_max, y_max) -> Iterable[Tuple[int, int]]:
+        size = self.cell_size
+        for cx in range(math.floor(x_min / size), math.floor(x_max / size) + 1):
+            for cy in range(math.floor(y_min / size), math.floor(y_max / size) + 1):
+                yield cx, cy
+
+
+def _segment_entries(x0, y0, x1, y1, circles: np.ndarray, first: bool = False) -> np.ndarray:
+    """
+    Where the segment (x0, y0)->(x1, y1) enters each circle, as a fraction of its length, NaN if
+    it doesn't. A segment starting inside a circle entered it earlier, so that isn't an entry,
+    unless `first` (the hand has no earlier position): then a start inside counts as entering at 0.
+    Args:
+        circles: (T, 3) rows of x, y, radius
+    Returns: (T,) fractions in [0, 1] or NaN
+    """
+    dx, dy = x1 - x0, y1 - y0
+    fx, fy = x0 - circles[:, 0], y0 - circles[:, 1]
+    a = dx * dx + dy * dy
+    b = 2.0 * (fx * dx + fy * dy)
+    c = fx * fx + fy * fy - circles[:, 2] ** 2
+    inside = c <= 0
+    fractions = np.full(len(circles), np.nan)
+    if first:
+        fractions[inside] = 0.0
+    if a > 0:
+        disc = b * b - 4.0 * a * c
+        crossing = ~inside & (disc >= 0)
+        s = (-b[crossing] - np.sqrt(disc[crossing])) / (2.0 * a)
+        entered = (s >= 0) & (s <= 1)
+        fractions[np.flatnonzero(crossing)[entered]] = s[entered]
+    return fractions
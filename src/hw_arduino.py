@@ -1,56 +1,213 @@
-import serial
+import collections
+import threading
+import time
+
+import numpy as np
 
 
 class SerialManager:
-    def __init__(self, port="COM3", baud_rate=500000, timeout=0.1):
+    """
+    Sends hit commands ('l' / 'r') to the Arduino without blocking the caller, and collects its
+    acknowledgements in the background.
+
+    cmd2send() only queues the command: a writer thread drains the queue, and a command already
+    waiting in it is not queued twice (a burst of hits on one side becomes one buzz instead of a
+    backlog). A reader thread blocks on the port, timestamps every acknowledgement into a ring
+    buffer and matches it to the oldest unacknowledged command of the same kind, which gives the
+    round-trip latency (see latency_stats()). A command may carry a tag, e.g. the capture time of
+    the frame that caused it, which is handed back to `on_ack` with its acknowledgement.
+        ack='line': the Arduino answers each command with a line (Serial.println)
+        ack='echo': it echoes the command byte back
+    Any pyserial URL works as the port, e.g. 'loop://' (every byte written comes back, use
+    ack='echo') to run without a board.
+    """
+    COMMANDS = ('l', 'r')
+
+    def __init__(self, port="COM3", baud_rate=500000, timeout=0.1, ack='line', history=256, ack_timeout=1.0,
+                 on_ack=None):
         """
-        :param port:
+        :param port: serial port or pyserial URL
         :param baud_rate:
-        :param timeout:
+        :param timeout: read timeout of the port, how long the reader blocks before checking for close()
+        :param ack: 'line' or 'echo', how the Arduino acknowledges a command
+        :param history: acknowledgements and round-trip times kept in the ring buffers
+        :param ack_timeout: seconds after which an unacknowledged command counts as lost
+        :param on_ack: called as on_ack(text, rtt, tag) from the reader thread for every acknowledgement
+            (rtt and tag are None if it matched no command); keep it short
         """
+        import serial  # pyserial, only needed when hardware feedback is enabled
+
+        if ack not in ('line', 'echo'):
+            raise ValueError(f"Unknown ack mode: {ack}")
         self.port = port
         self.baud_rate = baud_rate
         self.timeout = timeout
-        self.ser = serial.Serial(port, baud_rate, timeout=timeout)
+        self.ack = ack
+        self.ack_timeout = ack_timeout
+        self.on_ack = on_ack
+        self.ser = serial.serial_for_url(port, baud_rate, timeout=timeout)
 
-    def cmd2send(self, command):
-        if command in ['l', 'r']:
-            self.ser.write(command.encode('ascii'))
-            print(f"Command '{command}' sent.")
+        self._queue = collections.deque()  # commands waiting for the writer
+        self._queued = {}  # command waiting in the queue -> its tag
+        self._wakeup = threading.Condition()
+        self._in_flight = collections.deque()  # (command, time sent, tag) awaiting an acknowledgement
+        self._lock = threading.Lock()
+        self.acks = collections.deque(maxlen=history)  # (time received, text, round-trip seconds or None)
+        self._rtts = collections.deque(maxlen=history)
+        self._unread = collections.deque(maxlen=history)  # acknowledgement texts for read_feedback()
+        self.stats = {'queued': 0, 'coalesced': 0, 'sent': 0, 'acked': 0, 'lost': 0, 'errors': 0}
 
-            # feedbacks = self.read_feedback()
-            # print("Feedbacks:", feedbacks)
-        else:
+        self._running = True
+        self._writer = threading.Thread(target=self._write_loop, name='serial-writer', daemon=True)
+        self._reader = threading.Thread(target=self._read_loop, name='serial-reader', daemon=True)
+        self._writer.start()
+        self._reader.start()
+
+    def cmd2send(self, command, tag=None):
+        """
+        Queue a command; returns at once. A command already waiting in the queue is coalesced
+        (and keeps its first tag).
+        """
+        if command not in self.COMMANDS:
             print("Invalid command. Use 'l' or 'r' only.")
+            return False
+        with self._wakeup:
+            if command in self._queued:
+                self.stats['coalesced'] += 1
+                return True
+            self._queue.append(command)
+            self._queued[command] = tag
+            self.stats['queued'] += 1
+            self._wakeup.notify()
+        return True
 
     def read_feedback(self):
-        feedback = []
-        while self.ser.in_waiting > 0:
-            uno_feedback = self.ser.readline().decode('ascii').strip()
-            feedback.append(uno_feedback)
+        """Acknowledgement texts received since the last call (never blocks)."""
+        with self._lock:
+            feedback = list(self._unread)
+            self._unread.clear()
         return feedback
 
+    def latency_stats(self):
+        """Round-trip times (ms) of the acknowledged commands still in the ring buffer, plus counters."""
+        with self._lock:
+            rtts = np.array(self._rtts) * 1000.0
+            stats = dict(self.stats, in_flight=len(self._in_flight))
+        if len(rtts):
+            stats.update({'count': len(rtts), 'mean_ms': float(rtts.mean()), 'p50_ms': float(np.percentile(rtts, 50)),
+                          'p95_ms': float(np.percentile(rtts, 95)), 'max_ms': float(rtts.max())})
+        else:
+            stats['count'] = 0
+        return stats
+
+    def flush(self, timeout=1.0):
+        """Wait until queued commands are written and acknowledged (or lost); True if all were."""
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            with self._wakeup:
+                idle = not self._queue
+            with self._lock:
+                idle = idle and not self._in_flight
+            if idle:
+                return True
+            time.sleep(0.001)
+        return False
+
     def close(self):
         """
         關閉串口。
         """
+        with self._wakeup:
+            self._running = False
+            self._wakeup.notify()
+        self._writer.join()
+        self._reader.join()
         if self.ser.is_open:
             self.ser.close()
             print("Serial port closed.")
 
+    def _write_loop(self):
+        while True:
+            with self._wakeup:
+                while self._running and not self._queue:
+                    self._wakeup.wait()
+                if not self._running:
+                    return
+                command = self._queue.popleft()
+                tag = self._queued.pop(command)
+            try:
+                with self._lock:
+                    self._in_flight.append((command, time.perf_counter(), tag))
+                    self.stats['sent'] += 1
+                self.ser.write(command.encode('ascii'))
+            except Exception as e:
+                with self._lock:
+                    self.stats['errors'] += 1
+                print(f"Error sending '{command}': {e}")
+
+    def _read_loop(self):
+        buffer = b''
+        while self._running:
+            try:
+                data = self.ser.read(1 if self.ack == 'echo' else max(1, self.ser.in_waiting))
+            except Exception as e:
+                if self._running:
+                    with self._lock:
+                        self.stats['errors'] += 1
+                    print(f"Error reading serial feedback: {e}")
+                    time.sleep(self.timeout)
+                continue
+            received = time.perf_counter()
+            if data:
+                if self.ack == 'echo':
+                    self._acknowledge(data.decode('ascii', 'replace'), received)
+                else:
+                    buffer += data
+                    *lines, buffer = buffer.split(b'\n')
+                    for line in lines:
+                        self._acknowledge(line.decode('ascii', 'replace').strip(), received)
+            self._expire(received)
+
+    def _acknowledge(self, text, received):
+        with self._lock:
+            rtt = tag = None
+            # The oldest command this answers: the same command if the reply names it, else the oldest
+            match = next((i for i, (command, _, _) in enumerate(self._in_flight) if text.startswith(command)), 0)
+            if self._in_flight:
+                _, sent, tag = self._in_flight[match]
+                del self._in_flight[match]
+                rtt = received - sent
+                self._rtts.append(rtt)
+                self.stats['acked'] += 1
+            self.acks.append((received, text, rtt))
+            self._unread.append(text)
+        if self.on_ack is not None:
+            self.on_ack(text, rtt, tag)
+
+    def _expire(self, now):
+        with self._lock:
+            while self._in_flight and now - self._in_flight[0][1] > self.ack_timeout:
+                self._in_flight.popleft()
+                self.stats['lost'] += 1
+
 
 if __name__ == "__main__":
-    serial_manager = SerialManager(port="/dev/cu.usbmodem1101", baud_rate=500000)
+    import sys
+    # python -m src.hw_arduino loop://   runs against pyserial's loopback, no board needed
+    port = sys.argv[1] if len(sys.argv) > 1 else "/dev/cu.usbmodem1101"
+    serial_manager = SerialManager(port=port, baud_rate=500000, ack='echo' if port.startswith('loop://') else 'line')
 
     try:
         while True:
             user_input = input('Enter "l" for left or "r" for right: ').strip().lower()
             serial_manager.cmd2send(user_input)
+            serial_manager.flush(0.2)
 
-            # feedbacks = serial_manager.read_feedback()
-            # for feedback in feedbacks:
+            for feedback in serial_manager.read_feedback():
+                print("Feedback:", feedback)
+            print("Latency:", serial_manager.latency_stats())
 
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, EOFError):
         print("Program interrupted by user.")
     finally:
-        serial_manager.close()
\ No newline at end of file
+        serial_manager.close()
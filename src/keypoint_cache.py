@@ -0,0 +1,243 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from src.pose_frame import NUM_LANDMARKS, NUM_CHANNELS
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Bump when the stored layout or the extraction semantics change; old entries are then never hit.
+CACHE_VERSION = 2
+
+_ARRAYS = ('frame_indices', 'timestamps', 'data', 'mask')
+
+# A store's .tmp directory lives for a few np.save calls; one this old was left by a crashed process
+STALE_TMP_SECONDS = 600
+
+# The only names the cache creates in its root; anything else there belongs to someone else
+_ENTRY_NAME = re.compile(r'[0-9a-f]{40}')
+_TMP_NAME = re.compile(r'\.[0-9a-f]{40}\.\d+\.\d+\.tmp|index\.json\.\d+\.tmp')
+
+
+class KeypointCache:
+    """
+    On-disk cache of extracted keypoints, so re-analysing a video with another threshold or
+    template set skips MediaPipe entirely.
+
+    Entries are keyed by a hash of the video content plus the sampling and Pose settings.
+    Each entry is a directory of .npy files (frame_indices, timestamps, data (F, K, 4), mask (F, K))
+    with data in PoseFrame layout (x, y, z, visibility),
+    read back memory-mapped. index.json records entry sizes and last use; the least recently used
+    entries are evicted once the cache grows past `max_bytes`. Content hashes are remembered per
+    (path, mtime, size) so unchanged videos are not re-read. Entry directories the index doesn't
+    list (from an older CACHE_VERSION, or left by a crashed process) are removed on open and by
+    clear(); other files and directories in `root` are never touched.
+    Several processes may share one cache directory: index.lock serialises their index updates
+    and evictions, and every index write merges in the entries other processes have added since.
+    """
+    def __init__(self, root: str = 'data/keypoint_cache', max_bytes: int = 2 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._index_path = os.path.join(root, 'index.json')
+        self._lock_path = os.path.join(root, 'index.lock')
+        with self._locked():
+            self._index = self._read_index()
+            self._sweep()
+        self._dropped = set()  # keys this process removed, not to be merged back from disk
+
+    def make_key(self, video_path: str, frame_interval: int, max_frames: Optional[int], pose_options: Dict = None) -> str:
+        params = {
+            'version': CACHE_VERSION,
+            'video': self.content_hash(video_path),
+            'frame_interval': frame_interval,
+            'max_frames': max_frames or None,
+            'pose_options': pose_options or {},
+        }
+        return hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def content_hash(self, video_path: str) -> str:
+        path = os.path.abspath(video_path)
+        stat = os.stat(path)
+        with self._lock:
+            known = self._index['hashes'].get(path)
+            if known and known['mtime_ns'] == stat.st_mtime_ns and known['size'] == stat.st_size:
+                return known['sha1']
+
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+
+        with self._lock, self._locked():
+            self._index['hashes'][path] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': digest.hexdigest()}
+            self._write_index()
+        return digest.hexdigest()
+
+    def load(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """Returns: memory-mapped (frame_indices, timestamps, data, mask), or None on a miss."""
+        with self._lock, self._locked():
+            entry = self._index['entries'].get(key)
+            if entry is None:
+                return None
+            try:
+                arrays = tuple(np.load(os.path.join(self.root, key, f'{name}.npy'), mmap_mode='r') for name in _ARRAYS)
+            except (OSError, ValueError):
+                self._drop(key)  # Half-deleted or corrupt entry
+                self._write_index()
+                return None
+            entry['last_access'] = time.time()
+            self._write_index()
+        return arrays
+
+    def store(self, key: str, frame_indices, timestamps, data: np.ndarray, mask: np.ndarray):
+        arrays = (np.asarray(frame_indices, dtype=np.int64), np.asarray(timestamps, dtype=np.float64),
+                  np.asarray(data, dtype=np.float32), np.asarray(mask, dtype=bool))
+        tmp_dir = os.path.join(self.root, f'.{key}.{os.getpid()}.{threading.get_ident()}.tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name, array in zip(_ARRAYS, arrays):
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), array)
+        size = sum(os.path.getsize(os.path.join(tmp_dir, f'{name}.npy')) for name in _ARRAYS)
+
+        with self._lock, self._locked():
+            self._merge_index()  # Evict by what every process has stored, not our stale view
+            self._drop(key)
+            os.replace(tmp_dir, os.path.join(self.root, key))
+            self._index['entries'][key] = {'size': size, 'frames': len(arrays[0]), 'last_access': time.time()}
+            self._evict()
+            self._save_index()
+
+    def record(self, key: str, chunks: Iterable[Tuple]) -> Iterator[Tuple]:
+        """
+        Pass (frame_indices, timestamps, data, mask) chunks through unchanged and store their
+        concatenation once the iterator is exhausted. Nothing is stored if the consumer stops early.
+        """
+        collected = []
+        for chunk in chunks:
+            collected.append(chunk)
+            yield chunk
+        if collected:
+            self.store(key, *(np.concatenate([np.asarray(c[i]) for c in collected]) for i in range(len(_ARRAYS))))
+        else:
+            self.store(key, [], [], np.zeros((0, NUM_LANDMARKS, NUM_CHANNELS), np.float32), np.zeros((0, NUM_LANDMARKS), bool))
+
+    def clear(self):
+        with self._lock, self._locked():
+            self._merge_index()
+            for key in list(self._index['entries']):
+                self._drop(key)
+            self._sweep()
+            self._write_index()
+
+    def total_bytes(self) -> int:
+        return sum(entry['size'] for entry in self._index['entries'].values())
+
+    def _evict(self):
+        entries = self._index['entries']
+        total = sum(entry['size'] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            total -= entries[key]['size']
+            self._drop(key)
+
+    def _drop(self, key: str):
+        self._index['entries'].pop(key, None)
+        self._dropped.add(key)
+        shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+
+    def _sweep(self):
+        # Remove cache entries and temporaries the index doesn't account for. Call with index.lock
+        # held: stores only move their entry into place under it, so an unlisted entry directory is
+        # never one in progress.
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if _TMP_NAME.fullmatch(name):
+                try:
+                    stale = now - os.path.getmtime(path) > STALE_TMP_SECONDS
+                except OSError:
+                    continue
+                if not stale:
+                    continue  # Another process may still be writing it
+            elif not _ENTRY_NAME.fullmatch(name) or not os.path.isdir(path) or name in self._index['entries']:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _read_index(self) -> Dict:
+        try:
+            with open(self._index_path, 'r') as f:
+                index = json.load(f)
+            if index.get('version') == CACHE_VERSION:
+                return index
+        except (OSError, ValueError):
+            pass
+        return {'version': CACHE_VERSION, 'entries': {}, 'hashes': {}}
+
+    @contextmanager
+    def _locked(self):
+        """Hold index.lock, so only one process at a time reads, changes and writes the index."""
+        with open(self._lock_path, 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:  # LK_LOCK gives up after 10 s
+                        pass
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _merge_index(self):
+        # Take in what other processes wrote since we last looked, so their entries aren't lost,
+        # and forget entries they evicted. Call with index.lock held.
+        on_disk = self._read_index()
+        entries = self._index['entries']
+        for key in list(entries):
+            if key in on_disk['entries']:
+                entries[key]['last_access'] = max(entries[key]['last_access'], on_disk['entries'][key]['last_access'])
+            elif not os.path.isdir(os.path.join(self.root, key)):
+                del entries[key]
+        for key, entry in on_disk['entries'].items():
+            if key not in entries and key not in self._dropped and os.path.isdir(os.path.join(self.root, key)):
+                entries[key] = entry
+        for path, known in on_disk['hashes'].items():
+            self._index['hashes'].setdefault(path, known)
+
+    def _save_index(self):
+        tmp_path = f'{self._index_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+        self._dropped.clear()  # The index on disk no longer lists them; a later store by anyone may bring them back
+
+    def _write_index(self):
+        """Merge and write the index. Call with index.lock held."""
+        self._merge_index()
+        self._save_index()
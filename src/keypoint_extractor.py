@@ -1,102 +1,151 @@
 import os
 import cv2
 import shutil
-import mediapipe as mp
 import numpy as np
-from typing import Dict, List
+from src.frame_store import is_frame_store, remove_frame_store
+from src.frame_writer import AsyncFrameWriter
+from src.pose_frame import PoseFrame
+from src import tracing
+from typing import Dict, Iterator, List, Optional, Tuple
 
 
 class KeypointExtractor:
-    def __init__(self, video_path: str, frame_interval: int = 1, max_frames: int = None, frames_dir: str = None):
+    def __init__(self, video_path: str, frame_interval: int = 1, max_frames: int = None, frames_dir: str = None,
+                 seek_threshold: int = 120, image_format: str = 'jpg', image_quality: int = 95, writer_workers: int = 2,
+                 pose_options: Dict = None, thumbnail_width: int = 0):
         """
         Args:
             video_path (str): Path to the input video file.
-            frames_dir (str): Directory where frames will be saved, if saveImg2file is True.
+            frames_dir (str): Directory where frames will be saved, if saveImg2file is True. A path ending
+                in .frames saves them into a single frame store file instead (see frame_store).
             frame_interval (int): Interval to control how often frames are extracted.
             max_frames (int): Maximum number of frames to extract from the video. If None, all frames will be processed.
+            seek_threshold (int): Skip gaps of at least this many frames with a seek instead of grab() calls.
+            image_format (str): 'jpg', 'png' or 'webp' for saved frames.
+            image_quality (int): 0-100 encoding quality for saved frames.
+            writer_workers (int): Background threads encoding and writing saved frames.
+            pose_options (dict): Keyword arguments for mp.solutions.pose.Pose, e.g. {'static_image_mode': True}.
+            thumbnail_width (int): Frame stores only: width of the downscaled copies kept for scrubbing (0 = none).
         """
         self.video_path = video_path
         self.frame_interval = frame_interval
         self.max_frames = max_frames
         self.frames_dir = frames_dir
+        self.seek_threshold = seek_threshold
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.writer_workers = writer_workers
+        self.pose_options = pose_options or {}
+        self.thumbnail_width = thumbnail_width
+        self.failed_frames = []  # [(path, reason), ...] from the last run that saved images
         self.cap = cv2.VideoCapture(self.video_path)
 
         if not self.cap.isOpened():
             raise ValueError(f"Error: Couldn't open video {self.video_path}")
 
         self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
 
         # Initialize Mediapipe Pose model
+        import mediapipe as mp  # imported on first use, so importing this module stays cheap
         self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose()
+        self.pose = self.mp_pose.Pose(**self.pose_options)
 
-    def extract_keypoints(self, frame: np.ndarray) -> Dict[str, List[float]]:
+    def extract_keypoints(self, frame: np.ndarray) -> PoseFrame:
         """
         Extract pose keypoints from a single frame.
         Args: frame (np.ndarray): The input image (OpenCV format).
-        Returns: Dict[str, List[float]]: Keypoints dictionary with {keypoint_name: [x, y]}.
+        Returns: PoseFrame: Keypoints, readable like a {keypoint_name: [x, y]} dictionary. Empty if no pose was found.
         """
 
-        image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.pose.process(image_rgb)
+        with tracing.span("extractor.cvtColor"):
+            image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        with tracing.span("extractor.pose_process"):
+            results = self.pose.process(image_rgb)
+        return PoseFrame.from_results(results)
 
-        keypoints = {}
-        if results.pose_landmarks:
-            for idx, landmark in enumerate(results.pose_landmarks.landmark):
-                landmark_name = self.mp_pose.PoseLandmark(idx).name.lower()
-                keypoints[landmark_name] = [landmark.x, landmark.y]
-
-        return keypoints
-
-    def extract_keypoints_from_video(self, saveImg:bool = True) -> List[Dict[str, List[float]]]:
+    def iter_keypoints(self, saveImg: bool = False, start_frame: int = 0,
+                       overwrite_frames: Optional[bool] = None) -> Iterator[Tuple[int, float, PoseFrame]]:
         """
-        Extract keypoints from the video, optionally saving frames as images.
-        Args: saveImg2file (bool): Whether to save frames as images. Default is True.
-        Returns: List[Dict[str, List[float]]]: A list of keypoints dictionaries for each frame.
+        Lazily extract keypoints from every `frame_interval`-th frame.
+        Skipped frames are only grabbed (or seeked over when the gap reaches `seek_threshold`),
+        never decoded into images. Breaking out of the loop stops decoding and releases the video.
+        Args:
+            saveImg (bool): Whether to save sampled frames as images in `frames_dir`.
+            start_frame (int): First frame to sample; use a multiple of frame_interval so frame
+                indices and saved image names line up with a run from frame 0.
+            overwrite_frames (bool): Start a frame store over rather than appending to it; default
+                when start_frame is 0, i.e. a new run. (Image files are overwritten by name anyway.)
+        Yields: (frame_index, timestamp in seconds, PoseFrame) for each sampled frame.
         """
-        keypoints_per_frame = []
-        frame_count = 0
-        saved_frame_count = 0
+        saveImg = saveImg and self.frames_dir is not None
+        writer = None
+        if saveImg:
+            # Frames are encoded and written in the background, decode/inference never waits on the disk
+            writer = AsyncFrameWriter(self.frames_dir, workers=self.writer_workers,
+                                      image_format=self.image_format, quality=self.image_quality,
+                                      thumbnail_width=self.thumbnail_width,
+                                      overwrite=start_frame == 0 if overwrite_frames is None else overwrite_frames)
+
+        frame_count = start_frame
+        saved_frame_count = start_frame // self.frame_interval
+        if start_frame > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        skip = self.frame_interval - 1
 
         try:
             while self.cap.isOpened():
-                ret, frame = self.cap.read()
-                if not ret:
-                    break
-
                 if self.max_frames and frame_count >= self.max_frames:
                     break
 
-                if saveImg and not os.path.exists(self.frames_dir):
-                    os.makedirs(self.frames_dir)  # Create the directory to save frames if needed
-
-                if frame_count % self.frame_interval == 0:
-
-                    # Extract keypoints for the current frame
-                    keypoints = self.extract_keypoints(frame)
-                    keypoints_per_frame.append(keypoints)
-
-                    # Save the frame as an image if required
-                    if saveImg:
-                        frame_filename = os.path.join(self.frames_dir, f"frame_{saved_frame_count:04d}.jpg")
-                        # cv2.imwrite(frame_filename, frame)
-                        # saved_frame_count += 1
-                        success = cv2.imwrite(frame_filename, frame)
-                        if not success:
-                            print(f"Failed to save image: {frame_filename}")
-                        else:
-                            saved_frame_count += 1
+                with tracing.span("extractor.cap_read"):
+                    ret, frame = self.cap.read()
+                if not ret:
+                    break
 
-                frame_count += 1
+                # Extract keypoints for the current frame
+                keypoints = self.extract_keypoints(frame)
+
+                # Save the frame as an image if required
+                if writer:
+                    with tracing.span("extractor.queue_image"):
+                        writer.write(frame, f"frame_{saved_frame_count:04d}", frame_count)
+                    saved_frame_count += 1
+
+                timestamp = frame_count / self.fps if self.fps > 0 else self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                yield frame_count, timestamp, keypoints
+
+                # Move to the next sampled frame without decoding the ones in between
+                with tracing.span("extractor.skip_frames"):
+                    if skip >= self.seek_threshold:
+                        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_count + self.frame_interval)
+                    else:
+                        for _ in range(skip):
+                            if not self.cap.grab():
+                                return
+                frame_count += self.frame_interval
         finally:
             self.cap.release()
-        return keypoints_per_frame
+            if writer:
+                self.failed_frames = writer.close()
+                for path, reason in self.failed_frames:
+                    print(f"Failed to save image: {path} ({reason})")
+
+    def extract_keypoints_from_video(self, saveImg:bool = True) -> List[PoseFrame]:
+        """
+        Extract keypoints from the video, optionally saving frames as images.
+        Args: saveImg2file (bool): Whether to save frames as images. Default is True.
+        Returns: List[PoseFrame]: Keypoints for each sampled frame.
+        """
+        return [keypoints for _, _, keypoints in self.iter_keypoints(saveImg)]
 
     def get_total_frames(self) -> int:
         return self.total_frames
 
     def clear_existing_frames(self):
-        if self.frames_dir and os.path.exists(self.frames_dir):
+        if is_frame_store(self.frames_dir):
+            remove_frame_store(self.frames_dir)
+        elif self.frames_dir and os.path.exists(self.frames_dir):
             for filename in os.listdir(self.frames_dir):
                 path = os.path.join(self.frames_dir, filename)
                 try:
@@ -1,36 +1,314 @@
 import os
 import json
-from typing import Dict, List
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from src.exemplar_index import BallTree
+from src.normalization import keypoints_to_array, normalize_keypoint_array, NUM_LANDMARKS
+from src.pose_frame import PoseFrame
+
+# Template sets at least this large get a BallTree; below it one brute-force pass is faster.
+TREE_MIN_EXEMPLARS = 8192
 
 class BoxingPoseTemplate:
-    def __init__(self, name: str, keypoints: Dict[str, List[float]]):
+    def __init__(self, name: str, keypoints: Dict[str, List[float]], exemplars: List = None):
         self.name = name
         self.keypoints = keypoints  # keypoints as a dictionary {landmark_name: [x, y]}
+        # Every recorded pose of this technique (dicts or PoseFrames); `keypoints` is the first one
+        self.exemplars = exemplars if exemplars else [keypoints]
 
     @classmethod
     def from_file(cls, file_path: str):
+        """
+        Reads {"name": ..., "keypoints": {...}} or, for several exemplars of one technique,
+        {"name": ..., "exemplars": [{...}, {...}, ...]}.
+        """
         with open(file_path, 'r') as f:
             data = json.load(f)
-        return cls(name=data['name'], keypoints=data['keypoints'])
+        exemplars = data.get('exemplars') or [data['keypoints']]
+        return cls(name=data['name'], keypoints=data.get('keypoints', exemplars[0]), exemplars=exemplars)
 
     def to_file(self, file_path: str):
         data = {
             'name': self.name,
-            'keypoints': self.keypoints
+            'keypoints': dict(self.keypoints.items())
         }
+        if len(self.exemplars) > 1:
+            data['exemplars'] = [dict(exemplar.items()) for exemplar in self.exemplars]
         with open(file_path, 'w') as f:
             json.dump(data, f, indent=4)
 
+    def add_exemplar(self, keypoints: Dict[str, List[float]]):
+        self.exemplars.append(keypoints)
+
+class TemplateIndex:
+    """
+    Template exemplars compiled into arrays so a pose can be scored against all of them at once.
+        names:  List[str], technique name of each row (repeated when a technique has several exemplars)
+        labels: (T,) int, row -> index into label_names
+        label_names: List[str], each technique once
+        points: (T, K, 2) float32, already normalized, landmarks in LANDMARK_NAMES order
+        mask:   (T, K) bool, which landmarks each exemplar actually has
+    Large sets also get a BallTree (built on first use) over the fully detected exemplars,
+    see nearest().
+    """
+    def __init__(self, names: List[str], points: np.ndarray, mask: np.ndarray):
+        self.names = names
+        self.label_names = list(dict.fromkeys(names))
+        label_ids = {name: i for i, name in enumerate(self.label_names)}
+        self.labels = np.array([label_ids[name] for name in names], dtype=np.int64)
+        self.points = points
+        self.mask = mask
+        # x and y planes, contiguous, for the brute-force kernel
+        self._xs = np.ascontiguousarray(points[..., 0])
+        self._ys = np.ascontiguousarray(points[..., 1])
+        self._tree = None
+        self._tree_rows = None  # rows covered by the tree (every landmark present)
+        self._other_rows = None  # rows with missing landmarks, scanned by brute force
+        self._other_index = None
+
+    @classmethod
+    def from_arrays(cls, names: List[str], points: np.ndarray, mask: np.ndarray):
+        """From raw (not yet normalized) (T, K, 2) points and (T, K) masks."""
+        return cls(list(names), normalize_keypoint_array(points, mask), np.asarray(mask, dtype=bool))
+
+    @classmethod
+    def from_templates(cls, templates: Dict[str, BoxingPoseTemplate]):
+        names = [name for name, template in templates.items() for _ in template.exemplars]
+        points = np.zeros((len(names), NUM_LANDMARKS, 2), dtype=np.float32)
+        mask = np.zeros((len(names), NUM_LANDMARKS), dtype=bool)
+        row = 0
+        for template in templates.values():
+            for exemplar in template.exemplars:
+                points[row], mask[row] = keypoints_to_array(exemplar)
+                row += 1
+        return cls.from_arrays(names, points, mask)
+
+    def __len__(self):
+        return len(self.names)
+
+    def batch_distances(self, normalized_points: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        """
+        Mean euclidean distance over common landmarks between C normalized poses and every row.
+        Args:
+            normalized_points: (C, K, 2) output of normalize_keypoint_array
+            mask: (C, K) bool
+        Returns: (C, T) float64, inf where a row shares no landmark with the pose.
+        """
+        common = self.mask[None, :, :] & mask[:, None, :]  # (C, T, K)
+        dx = normalized_points[:, None, :, 0] - self._xs[None, :, :]
+        dy = normalized_points[:, None, :, 1] - self._ys[None, :, :]
+        dx *= dx
+        dy *= dy
+        dx += dy
+        np.sqrt(dx, out=dx)
+        dx *= common
+        counts = common.sum(axis=2)
+        totals = dx.sum(axis=2, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(counts > 0, totals / counts, np.inf)
+
+    def distances(self, normalized_points: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        """(T,) distances from one normalized (K, 2) pose to every row, see batch_distances."""
+        return self.batch_distances(normalized_points[None], mask[None])[0]
+
+    def nearest(self, normalized_points: np.ndarray, mask: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k rows closest to one normalized pose.
+        Fully detected poses are looked up in the BallTree when the set is large enough
+        (the distance is then a true metric, so the search stays exact); anything else is a
+        brute-force pass.
+        Returns: (rows, distances) closest first.
+        """
+        k = min(k, len(self))
+        if len(self) >= TREE_MIN_EXEMPLARS and mask.all():
+            if self._tree is None:
+                self._build_tree()
+            rows, dists = self._tree.query(normalized_points, k)
+            rows = self._tree_rows[rows]
+            if len(self._other_rows):
+                other = self._other_index.distances(normalized_points, mask)
+                rows = np.concatenate([rows, self._other_rows])
+                dists = np.concatenate([dists, other])
+        else:
+            rows = np.arange(len(self))
+            dists = self.distances(normalized_points, mask)
+
+        if k < len(dists):
+            best = np.argpartition(dists, k - 1)[:k]
+            rows, dists = rows[best], dists[best]
+        order = np.argsort(dists, kind='stable')
+        return rows[order], dists[order]
+
+    def _build_tree(self):
+        full = self.mask.all(axis=1)
+        self._tree_rows = np.flatnonzero(full)
+        self._other_rows = np.flatnonzero(~full)
+        self._other_index = TemplateIndex([self.names[r] for r in self._other_rows],
+                                          self.points[self._other_rows], self.mask[self._other_rows])
+        self._tree = BallTree(self.points[self._tree_rows])
+
 class TemplateManager:
     def __init__(self):
         self.templates = {}  # Dict[str, BoxingPoseTemplate]
+        self._index = None  # compiled lazily, see `index`
 
     def load_templates(self, directory: str):
-        for filename in os.listdir(directory):
+        """
+        Load every .json template and .npz library in `directory`.
+        Files that share a technique name are merged into one template with all their exemplars.
+        """
+        loaded = {}
+        for filename in sorted(os.listdir(directory)):
+            file_path = os.path.join(directory, filename)
             if filename.endswith('.json'):
-                file_path = os.path.join(directory, filename)
-                template = BoxingPoseTemplate.from_file(file_path)
-                self.templates[template.name] = template
+                templates = [BoxingPoseTemplate.from_file(file_path)]
+            elif filename.endswith('.npz'):
+                templates = self.read_library(file_path)
+            else:
+                continue
+            for template in templates:
+                if template.name in loaded:
+                    loaded[template.name].exemplars.extend(template.exemplars)
+                else:
+                    loaded[template.name] = template
+        self.templates.update(loaded)
+        self._index = None
+
+    @staticmethod
+    def read_library(file_path: str) -> List[BoxingPoseTemplate]:
+        """
+        Read an exemplar library written by save_library: arrays `names` (E,), `points` (E, K, 4)
+        in PoseFrame layout and `mask` (E, K). Exemplars come back as PoseFrames.
+        """
+        with np.load(file_path) as library:
+            names, points, mask = library['names'], library['points'], library['mask']
+        templates = {}
+        for name, data, present in zip(names.tolist(), points, mask):
+            frame = PoseFrame(np.array(data, dtype=np.float32), np.array(present, dtype=bool))
+            if name in templates:
+                templates[name].add_exemplar(frame)
+            else:
+                templates[name] = BoxingPoseTemplate(name, frame)
+        return list(templates.values())
+
+    def save_library(self, file_path: str):
+        """Write every exemplar of every template into one compressed .npz library."""
+        names, frames = [], []
+        for name, template in self.templates.items():
+            for exemplar in template.exemplars:
+                names.append(name)
+                frames.append(exemplar if isinstance(exemplar, PoseFrame) else PoseFrame.from_dict(exemplar))
+        points = np.stack([frame.data for frame in frames]) if frames else np.zeros((0, NUM_LANDMARKS, 4), np.float32)
+        mask = np.stack([frame.mask for frame in frames]) if frames else np.zeros((0, NUM_LANDMARKS), bool)
+        np.savez_compressed(file_path, names=np.array(names), points=points, mask=mask)
+
+    def add_template(self, template: BoxingPoseTemplate):
+        self.templates[template.name] = template
+        self._index = None
+
+    def add_exemplar(self, name: str, keypoints: Dict[str, List[float]]):
+        """Add one more recorded pose for technique `name`, creating the template if needed."""
+        if name in self.templates:
+            self.templates[name].add_exemplar(keypoints)
+        else:
+            self.templates[name] = BoxingPoseTemplate(name, keypoints)
+        self._index = None
 
     def get_template(self, name: str) -> BoxingPoseTemplate:
         return self.templates.get(name)
+
+    @property
+    def index(self) -> TemplateIndex:
+        """
+        Pre-normalized array form of `templates`, built once and reused until templates change
+        through load_templates/add_template/add_exemplar. Call compile() after editing `templates` by hand.
+        """
+        if self._index is None:
+            self.compile()
+        return self._index
+
+    def compile(self) -> TemplateIndex:
+        self._index = TemplateIndex.from_templates(self.templates)
+        return self._index
+
+
+class TemplateCache:
+    """
+    Process-wide cache of loaded TemplateManagers, keyed by template directory.
+
+    A cached directory is served without touching the filesystem, except that the (name, mtime,
+    size) signature of its .json/.npz files is re-checked (one scandir) on get() once
+    `check_interval` seconds have passed, and on reload(); edited templates are then reloaded.
+    None for `check_interval` re-checks only on reload().
+    At most `max_entries` directories are kept; the least recently used one is dropped.
+    """
+    def __init__(self, max_entries: int = 8, check_interval: Optional[float] = 1.0):
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self._entries = OrderedDict()  # abs dir -> [TemplateManager, signature, last_checked]
+        self._lock = threading.Lock()
+
+    def get(self, directory: str) -> TemplateManager:
+        key = os.path.abspath(directory)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if self.check_interval is None or time.monotonic() - entry[2] < self.check_interval:
+                    return entry[0]
+            return self._refresh(key, entry)
+
+    def reload(self, directory: Optional[str] = None):
+        """Re-check one directory (or every cached one) and reload it if its files changed."""
+        with self._lock:
+            keys = [os.path.abspath(directory)] if directory else list(self._entries)
+            for key in keys:
+                self._refresh(key, self._entries.get(key))
+
+    def invalidate(self, directory: Optional[str] = None):
+        """Drop one directory (or everything); it is loaded again on the next get()."""
+        with self._lock:
+            if directory:
+                self._entries.pop(os.path.abspath(directory), None)
+            else:
+                self._entries.clear()
+
+    def _refresh(self, key: str, entry) -> TemplateManager:
+        signature = self._signature(key)
+        if entry is None or entry[1] != signature:
+            manager = TemplateManager()
+            manager.load_templates(key)
+            manager.compile()
+            entry = [manager, signature, 0.0]
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        entry[2] = time.monotonic()
+        return entry[0]
+
+    @staticmethod
+    def _signature(directory: str) -> Tuple:
+        files = []
+        with os.scandir(directory) as it:
+            for item in it:
+                if item.name.endswith(('.json', '.npz')):
+                    stat = item.stat()
+                    files.append((item.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(files))
+
+
+_template_cache = TemplateCache()
+
+
+def get_template_manager(directory: str) -> TemplateManager:
+    """Shared, compiled TemplateManager for `directory`. See TemplateCache."""
+    return _template_cache.get(directory)
+
+
+def reload_templates(directory: Optional[str] = None):
+    """Pick up edited template files in the shared cache."""
+    _template_cache.reload(directory)
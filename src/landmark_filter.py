@@ -0,0 +1,92 @@
+import numpy as np
+from src.pose_frame import PoseFrame, NUM_LANDMARKS, NUM_CHANNELS
+
+
+def _alpha(cutoff, dt):
+    """Smoothing factor of a first-order low-pass filter with `cutoff` Hz at sampling period `dt`."""
+    tau = 1.0 / (2.0 * np.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class LandmarkFilter:
+    """
+    One-Euro filter over all 33 landmarks at once, with prediction for frames without inference.
+
+    Each landmark is low-pass filtered with a cutoff that rises with its speed: slow landmarks
+    (jitter while holding a guard) are smoothed hard, fast ones (a wrist mid-punch) follow the
+    measurement with little lag.
+        cutoff = min_cutoff + beta * |filtered velocity|
+    The filtered position and velocity also extrapolate the pose to frames where pose inference
+    was skipped (sparse frame_interval, motion gate), for up to `max_prediction` seconds.
+    Timestamps are in seconds and may be irregular; coordinates are MediaPipe's normalized x, y, z.
+    """
+    def __init__(self, min_cutoff: float = 1.0, beta: float = 30.0, d_cutoff: float = 10.0,
+                 max_prediction: float = 0.3, max_gap: float = 1.0, channels: int = 3):
+        """
+        Args:
+            min_cutoff: Hz, smoothing of a landmark at rest (lower = smoother, more lag)
+            beta: how fast the cutoff rises with speed (higher = less lag on fast motion)
+            d_cutoff: Hz, smoothing of the velocity estimate
+            max_prediction: seconds a position may be extrapolated past its last measurement
+            max_gap: seconds after which an unseen landmark is dropped and restarts unfiltered
+            channels: leading channels to filter (3 = x, y, z); the rest (visibility) is passed through
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.max_prediction = max_prediction
+        self.max_gap = max_gap
+        self.channels = channels
+        self.reset()
+
+    def reset(self):
+        self._x = np.zeros((NUM_LANDMARKS, self.channels))  # filtered positions
+        self._dx = np.zeros((NUM_LANDMARKS, self.channels))  # filtered velocities, per second
+        self._time = np.full(NUM_LANDMARKS, -np.inf)  # last measurement of each landmark
+        self._known = np.zeros(NUM_LANDMARKS, dtype=bool)
+        self._rest = np.zeros((NUM_LANDMARKS, NUM_CHANNELS - self.channels), dtype=np.float32)
+
+    def update(self, keypoints: PoseFrame, timestamp: float) -> PoseFrame:
+        """
+        Feed the landmarks inferred at `timestamp`.
+        Returns: the filtered pose, with the same landmarks present as `keypoints`.
+        """
+        points = keypoints.data[:, :self.channels].astype(np.float64)
+        mask = keypoints.mask
+        dt = timestamp - self._time
+        # Landmarks seen for the first time, after a long gap, or with a non-increasing clock start over
+        fresh = mask & (~self._known | (dt > self.max_gap) | (dt <= 0))
+        track = mask & ~fresh
+
+        self._x[fresh] = points[fresh]
+        self._dx[fresh] = 0.0
+        if track.any():
+            dt_track = dt[track, None]
+            x_previous = self._x[track]
+            dx = _alpha(self.d_cutoff, dt_track) * ((points[track] - x_previous) / dt_track - self._dx[track]) + self._dx[track]
+            cutoff = self.min_cutoff + self.beta * np.linalg.norm(dx, axis=1, keepdims=True)
+            a = _alpha(cutoff, dt_track)
+            self._x[track] = x_previous + a * (points[track] - x_previous)
+            self._dx[track] = dx
+
+        self._time[mask] = timestamp
+        self._known |= mask
+        self._rest[mask] = keypoints.data[mask, self.channels:]
+        return self._pose_frame(self._x, mask)
+
+    def predict(self, timestamp: float) -> PoseFrame:
+        """
+        The pose extrapolated to `timestamp` from the filtered positions and velocities, without a
+        measurement. Landmarks unseen for more than max_gap are left out.
+        """
+        elapsed = timestamp - self._time
+        mask = self._known & (elapsed <= self.max_gap)
+        horizon = np.clip(np.where(mask, elapsed, 0.0), 0.0, self.max_prediction)[:, None]
+        return self._pose_frame(self._x + self._dx * horizon, mask)
+
+    def _pose_frame(self, positions: np.ndarray, mask: np.ndarray) -> PoseFrame:
+        data = np.zeros((NUM_LANDMARKS, NUM_CHANNELS), dtype=np.float32)
+        data[:, :self.channels] = positions
+        data[:, self.channels:] = self._rest
+        data[~mask] = 0.0
+        return PoseFrame(data, mask.copy())
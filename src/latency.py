@@ -0,0 +1,132 @@
+"""
+End-to-end latency of practice mode, measured from the moment a frame was captured.
+
+    latency = LatencyMonitor()
+    captured = time.perf_counter()           # or the camera's own capture time
+    ...
+    latency.mark("pose", captured)           # after pose inference on that frame
+    latency.mark("score", captured)          # after the score update it caused
+
+Unlike tracing (how long each stage takes), every sample here is "capture -> end of stage",
+so the last stage of a frame is what the boxer feels. Each stage keeps a rolling window of
+its latest samples, summarised as percentiles and as a histogram over fixed buckets.
+"""
+import json
+import threading
+import time
+import numpy as np
+from typing import Dict, Iterable, Optional
+
+# Stages of a practice frame in pipeline order (others may be marked too, they are listed after these)
+STAGES = ("pose", "match", "hit_test", "score", "feedback", "feedback_ack", "display")
+
+# Histogram bucket upper edges in ms; the last bucket collects everything slower
+BUCKET_EDGES_MS = (5, 10, 15, 20, 25, 33, 40, 50, 66, 80, 100, 133, 166, 200, 300, 500, 1000)
+
+
+class LatencyMonitor:
+    """Rolling capture-to-stage latencies per stage; safe to mark from several threads."""
+    def __init__(self, window: int = 600, bucket_edges_ms: Iterable[float] = BUCKET_EDGES_MS):
+        """
+        Args:
+            window: samples kept per stage (600 = the last ~20 s at 30 FPS)
+            bucket_edges_ms: upper edges of the histogram buckets, ascending
+        """
+        self.window = window
+        self.bucket_edges_ms = np.asarray(bucket_edges_ms, dtype=np.float64)
+        self._samples = {}  # stage -> (window,) ring of ms
+        self._counts = {}  # stage -> samples ever marked
+        self._lock = threading.Lock()
+
+    def mark(self, stage: str, captured: Optional[float], now: Optional[float] = None) -> Optional[float]:
+        """
+        Record that `stage` finished for the frame captured at `captured` (time.perf_counter()).
+        Returns: the latency in ms, None if the frame has no capture time
+        """
+        if captured is None:
+            return None
+        ms = ((time.perf_counter() if now is None else now) - captured) * 1000.0
+        with self._lock:
+            ring = self._samples.get(stage)
+            if ring is None:
+                ring = self._samples[stage] = np.zeros(self.window)
+                self._counts[stage] = 0
+            ring[self._counts[stage] % self.window] = ms
+            self._counts[stage] += 1
+        return ms
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+    def stages(self):
+        """Stages marked so far, pipeline order first."""
+        with self._lock:
+            marked = list(self._samples)
+        return [stage for stage in STAGES if stage in marked] + [stage for stage in marked if stage not in STAGES]
+
+    def samples(self, stage: str) -> np.ndarray:
+        """The stage's samples in the window (ms), oldest first."""
+        with self._lock:
+            ring = self._samples.get(stage)
+            if ring is None:
+                return np.zeros(0)
+            count = self._counts[stage]
+            if count <= self.window:
+                return ring[:count].copy()
+            start = count % self.window
+            return np.concatenate((ring[start:], ring[:start]))
+
+    def histogram(self, stage: str) -> np.ndarray:
+        """Samples per bucket: bucket i holds latencies up to bucket_edges_ms[i], the last one the rest."""
+        return np.bincount(np.searchsorted(self.bucket_edges_ms, self.samples(stage), side='left'),
+                           minlength=len(self.bucket_edges_ms) + 1)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per stage: count, mean and p50/p95/p99/max latency in ms over the window."""
+        result = {}
+        for stage in self.stages():
+            ms = self.samples(stage)
+            if len(ms) == 0:
+                continue
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            result[stage] = {'count': int(len(ms)), 'mean_ms': float(ms.mean()), 'p50_ms': float(p50),
+                             'p95_ms': float(p95), 'p99_ms': float(p99), 'max_ms': float(ms.max())}
+        return result
+
+    def check_budgets(self, budgets: Dict[str, float], percentile: float = 95) -> Dict[str, Dict[str, float]]:
+        """
+        Stages whose `percentile` latency exceeds their budget.
+        Args:
+            budgets: stage -> ms, e.g. {"score": 100}
+        Returns: {stage: {'budget_ms', 'actual_ms'}}, empty if all are within budget. A stage
+            without samples counts as over budget, so a broken pipeline doesn't pass.
+        """
+        violations = {}
+        for stage, budget in budgets.items():
+            ms = self.samples(stage)
+            actual = float(np.percentile(ms, percentile)) if len(ms) else float('inf')
+            if actual > budget:
+                violations[stage] = {'budget_ms': float(budget), 'actual_ms': actual}
+        return violations
+
+    def text(self, stages: Optional[Iterable[str]] = None) -> str:
+        """One line for the screen, e.g. 'Latency p50/p95 ms  pose 38/52  score 41/60'."""
+        summary = self.summary()
+        parts = [f"{stage} {summary[stage]['p50_ms']:.0f}/{summary[stage]['p95_ms']:.0f}"
+                 for stage in (stages or summary) if stage in summary]
+        return "Latency p50/p95 ms  " + "  ".join(parts) if parts else "Latency: no samples yet"
+
+    def to_dict(self) -> Dict:
+        summary = self.summary()
+        return {
+            'window': self.window,
+            'bucket_edges_ms': self.bucket_edges_ms.tolist(),
+            'stages': {stage: dict(stats, histogram=self.histogram(stage).tolist()) for stage, stats in summary.items()},
+        }
+
+    def export_json(self, path: str, **extra):
+        """Write to_dict() (plus any extra top-level entries, e.g. serial round-trip stats) to `path`."""
+        with open(path, 'w') as f:
+            json.dump(dict(self.to_dict(), **extra), f, indent=4)
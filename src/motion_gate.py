@@ -0,0 +1,101 @@
+import cv2
+import numpy as np
+from typing import Dict
+
+
+class MotionGate:
+    """
+    Decides per frame whether pose inference is worth running, from how much of the image changed.
+
+    Each frame is shrunk to a small grayscale thumbnail and differenced against the previous one;
+    the motion energy is the fraction of thumbnail pixels that changed by more than `pixel_threshold`.
+    The gate is open (every frame is processed) while the energy is high, and stays open for
+    `hold_frames` after it falls back below `low_threshold`, so the end of a punch is never cut off.
+    While closed, only every `idle_stride`-th frame is processed, so pose tracking and a still pose
+    keep updating; callers reuse the last keypoints for the frames in between.
+        open:   energy >= high_threshold
+        closed: energy < low_threshold for hold_frames frames in a row
+    """
+    def __init__(self, low_threshold: float = 0.01, high_threshold: float = 0.03, idle_stride: int = 6,
+                 hold_frames: int = 15, pixel_threshold: int = 20, width: int = 160):
+        """
+        Args:
+            low_threshold: energy (0-1) below which the gate starts closing
+            high_threshold: energy (0-1) that opens the gate at once
+            idle_stride: process every n-th frame while closed (1 = never skip, 0 = skip all)
+            hold_frames: quiet frames before the gate closes
+            pixel_threshold: gray-level change (0-255) that counts a thumbnail pixel as moving
+            width: thumbnail width; the difference is taken at this resolution only
+        """
+        self.low_threshold = low_threshold
+        self.high_threshold = high_threshold
+        self.idle_stride = idle_stride
+        self.hold_frames = hold_frames
+        self.pixel_threshold = pixel_threshold
+        self.width = width
+        self.reset()
+
+    def reset(self):
+        """Forget the previous frame; the next frame is processed and the gate starts open."""
+        self._previous = None
+        self._quiet = 0  # consecutive frames below low_threshold
+        self._idle = 0  # frames since the last processed one while closed
+        self.is_open = True
+        self.energy = 0.0
+        self.stats = {'frames': 0, 'processed': 0, 'skipped': 0, 'opened': 0}
+
+    def motion_energy(self, frame: np.ndarray) -> float:
+        """Fraction of the downscaled image that changed since the previous call (0 for the first frame)."""
+        h, w = frame.shape[:2]
+        size = (self.width, max(1, round(h * self.width / w)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        # Blur out sensor noise and the aliasing of the cheap resize before differencing
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+        previous, self._previous = self._previous, small
+        if previous is None or previous.shape != small.shape:
+            return 0.0
+        moving = cv2.absdiff(small, previous) > self.pixel_threshold
+        return float(np.count_nonzero(moving)) / moving.size
+
+    def should_process(self, frame: np.ndarray) -> bool:
+        """
+        Feed the next frame (BGR or RGB, any size); True if pose inference should run on it.
+        The first frame after reset() is always processed.
+        """
+        first = self._previous is None
+        self.energy = self.motion_energy(frame)
+        self.stats['frames'] += 1
+
+        if self.energy >= self.high_threshold:
+            if not self.is_open:
+                self.stats['opened'] += 1
+            self.is_open = True
+            self._quiet = 0
+        elif self.energy < self.low_threshold:
+            self._quiet += 1
+            if self._quiet >= self.hold_frames:
+                self.is_open = False
+        else:
+            self._quiet = 0  # in between: keep the current state
+
+        if self.is_open or first:
+            process = True
+            self._idle = 0
+        else:
+            self._idle += 1
+            process = self.idle_stride > 0 and self._idle >= self.idle_stride
+            if process:
+                self._idle = 0
+
+        self.stats['processed' if process else 'skipped'] += 1
+        return process
+
+    @property
+    def skip_ratio(self) -> float:
+        """Share of frames whose pose inference was skipped."""
+        return self.stats['skipped'] / self.stats['frames'] if self.stats['frames'] else 0.0
+
+    def summary(self) -> Dict:
+        return {**self.stats, 'skip_ratio': self.skip_ratio}
@@ -0,0 +1,264 @@
+"""
+Motion templates: short keypoint sequences matched against a sliding window of the pose stream
+with dynamic time warping (DTW).
+
+Each frame is reduced to the normalized upper-body landmarks in MOTION_LANDMARKS, and the cost
+of aligning two frames is the usual pose distance (mean euclidean distance over landmarks).
+A window and a template of the same length are aligned inside a Sakoe-Chiba band, and the DTW
+cost divided by the template length is compared with the threshold, so it reads like a
+per-frame PoseMatcher distance.
+
+To stay real time with many templates every window goes through a cascade:
+    LB_Kim    first/last frame costs (both cells lie on every warping path)
+    LB_Keogh  distance to the template's band envelope, computed for all templates at once
+    DTW       in LB_Keogh order, abandoned as soon as a row's minimum exceeds the best so far
+"""
+import os
+import json
+import numpy as np
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from src.normalization import keypoints_to_array, normalize_keypoint_array, LANDMARK_INDEX
+
+MOTION_LANDMARKS = (
+    'left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
+    'left_wrist', 'right_wrist', 'left_hip', 'right_hip'
+)
+
+
+class MotionTemplate:
+    def __init__(self, name: str, frames: List[Dict[str, List[float]]]):
+        self.name = name
+        self.frames = frames  # keypoints per frame, dicts {landmark_name: [x, y]} or PoseFrames
+
+    @classmethod
+    def from_file(cls, file_path: str):
+        """Reads {"name": ..., "frames": [{landmark_name: [x, y], ...}, ...]}."""
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+        return cls(name=data['name'], frames=data['frames'])
+
+    def to_file(self, file_path: str):
+        data = {
+            'name': self.name,
+            'frames': [dict(frame.items()) for frame in self.frames]
+        }
+        with open(file_path, 'w') as f:
+            json.dump(data, f, indent=4)
+
+    def __len__(self):
+        return len(self.frames)
+
+
+def load_motion_templates(directory: str) -> List[MotionTemplate]:
+    """Every .json motion template in `directory`; an empty list if the directory doesn't exist."""
+    if not directory or not os.path.isdir(directory):
+        return []
+    return [MotionTemplate.from_file(os.path.join(directory, filename))
+            for filename in sorted(os.listdir(directory)) if filename.endswith('.json')]
+
+
+def motion_features(points: np.ndarray, mask: np.ndarray, landmarks=MOTION_LANDMARKS,
+                    previous: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-frame motion features: normalized poses restricted to `landmarks`.
+    A landmark missing in a frame keeps its value from the previous frame (or from `previous`,
+    the last feature row of an earlier call), so consecutive frames stay comparable.
+    Args:
+        points: (F, K, 2) raw keypoints, mask: (F, K) bool
+    Returns:
+        features (F, S, 2) float32, complete (F,) bool: whether every landmark has been seen
+    """
+    columns = [LANDMARK_INDEX[name] for name in landmarks]
+    normalized = normalize_keypoint_array(points, mask)[:, columns]
+    present = np.asarray(mask, dtype=bool)[:, columns]
+
+    features = np.empty_like(normalized)
+    complete = np.empty(len(normalized), dtype=bool)
+    last = np.full((len(columns), 2), np.nan, dtype=np.float32) if previous is None else previous
+    for frame in range(len(normalized)):
+        last = np.where(present[frame][:, None], normalized[frame], last)
+        features[frame] = last
+        complete[frame] = not np.isnan(last).any()
+    return features, complete
+
+
+def frame_costs(window: np.ndarray, template: np.ndarray) -> np.ndarray:
+    """(L, S, 2) x (M, S, 2) -> (L, M) pose distance between every pair of frames."""
+    diff = window[:, None] - template[None]
+    return np.sqrt((diff * diff).sum(axis=3)).mean(axis=2)
+
+
+def dtw_distance(costs: np.ndarray, band: int, cutoff: float = np.inf) -> float:
+    """
+    DTW over a precomputed (L, M) cost matrix within a Sakoe-Chiba band of half-width `band`.
+    Returns the total path cost, or inf once every cell of a row exceeds `cutoff` (early abandoning).
+    """
+    rows, cols = costs.shape
+    band = max(band, abs(rows - cols))
+    costs = costs.tolist()
+    previous = [np.inf] * (cols + 1)
+    previous[0] = 0.0
+    for i in range(rows):
+        current = [np.inf] * (cols + 1)
+        row_costs = costs[i]
+        lo, hi = max(0, i - band), min(cols, i + band + 1)
+        row_min = np.inf
+        for j in range(lo, hi):
+            best = min(previous[j], previous[j + 1], current[j])
+            value = row_costs[j] + best
+            current[j + 1] = value
+            if value < row_min:
+                row_min = value
+        if row_min > cutoff:
+            return np.inf
+        previous = current
+        previous[0] = np.inf
+    return previous[cols]
+
+
+class MotionMatcher:
+    """
+    Matches the most recent frames of a pose stream against motion templates.
+    Feed frames in order with push(); it reports a match whenever the window ending at the
+    current frame is within the threshold of a template.
+    Templates should be recorded at the same sampling interval as the stream they are matched
+    against; DTW absorbs moderate speed differences within the band.
+    """
+    def __init__(self, templates: List[MotionTemplate], threshold: float = 0.5, band: float = 0.1,
+                 landmarks=MOTION_LANDMARKS):
+        """
+        Args:
+            templates: MotionTemplates, each at least 2 frames long and with every landmark in
+                `landmarks` present (after filling gaps from the previous frame)
+            threshold: max DTW cost per template frame for a match
+            band: Sakoe-Chiba band half-width as a fraction of the template length
+        """
+        self.threshold = threshold
+        self.landmarks = landmarks
+        self.names = []
+        self.templates = []  # (M, S, 2) features per template
+        self.bands = []
+        self.upper = []  # (M, S, 2) envelopes for LB_Keogh
+        self.lower = []
+        for template in templates:
+            points, mask = self._to_arrays(template.frames)
+            features, complete = motion_features(points, mask, landmarks)
+            if len(features) < 2 or not complete.all():
+                print(f"Warning: skipping motion template {template.name}, too short or missing landmarks")
+                continue
+            radius = max(1, int(np.ceil(band * len(features))))
+            upper, lower = self._envelope(features, radius)
+            self.names.append(template.name)
+            self.templates.append(features)
+            self.bands.append(radius)
+            self.upper.append(upper)
+            self.lower.append(lower)
+        self.max_length = max((len(t) for t in self.templates), default=0)
+        # Templates grouped by length, so LB_Keogh runs once per length over stacked envelopes
+        self._by_length = {}
+        for i, features in enumerate(self.templates):
+            self._by_length.setdefault(len(features), []).append(i)
+        self._stacked = {length: (np.stack([self.upper[i] for i in ids]), np.stack([self.lower[i] for i in ids]))
+                         for length, ids in self._by_length.items()}
+
+        self.stats = {'windows': 0, 'pruned_kim': 0, 'pruned_keogh': 0, 'abandoned': 0, 'dtw': 0}
+        self.reset()
+
+    def __len__(self):
+        return len(self.templates)
+
+    def reset(self):
+        """Forget the stream history, e.g. when playback restarts or the camera changes."""
+        self._window = deque(maxlen=self.max_length)  # (frame_index, (S, 2) features)
+        self._last = None
+
+    def push(self, keypoints, frame_index: int) -> Optional[Tuple[str, int, int, float]]:
+        """
+        Add one frame (dict or PoseFrame; empty when no pose was detected).
+        Returns: (name, start_frame, end_frame, distance) for the best template matching the window
+            that ends at this frame, or None.
+        """
+        points, mask = keypoints_to_array(keypoints)
+        return self.push_array(points, mask, frame_index)
+
+    def push_array(self, points: np.ndarray, mask: np.ndarray, frame_index: int) -> Optional[Tuple[str, int, int, float]]:
+        """push() for a (K, 2) keypoint array and (K,) mask, as in analyzer chunks."""
+        if not self.templates:
+            return None
+        features, complete = motion_features(points[None], mask[None], self.landmarks, self._last)
+        self._last = features[0]
+        if not complete[0]:
+            self._window.clear()
+            return None
+        self._window.append((frame_index, features[0]))
+
+        window = np.stack([f for _, f in self._window])
+        best_name, best_distance, best_length = self.match_window(window)
+        if best_name is None:
+            return None
+        start = self._window[len(self._window) - best_length][0]
+        return best_name, start, frame_index, best_distance
+
+    def match_window(self, window: np.ndarray) -> Tuple[Optional[str], float, int]:
+        """
+        Best template for the recent frames in `window` (W, S, 2), oldest first. A template of
+        length M is aligned with the last M frames.
+        Returns: (name, distance per template frame, M), or (None, inf, 0) when nothing is within the threshold.
+        """
+        self.stats['windows'] += 1
+        candidates = []  # (lower bound per frame, template id)
+        for length, ids in self._by_length.items():
+            if length > len(window):
+                continue
+            recent = window[-length:]
+            upper, lower = self._stacked[length]
+            # LB_Kim: the first and last cells are on every path
+            kim = np.array([frame_costs(recent[[0, -1]], self.templates[i][[0, -1]]).diagonal().sum() for i in ids]) / length
+            # LB_Keogh: distance from each window frame to the template's envelope around it
+            over = np.maximum(recent[None] - upper, 0.0) + np.maximum(lower - recent[None], 0.0)
+            keogh = np.sqrt((over * over).sum(axis=3)).mean(axis=2).sum(axis=1) / length
+            for i, kim_bound, keogh_bound in zip(ids, kim, keogh):
+                if kim_bound > self.threshold:
+                    self.stats['pruned_kim'] += 1
+                elif keogh_bound > self.threshold:
+                    self.stats['pruned_keogh'] += 1
+                else:
+                    candidates.append((max(kim_bound, keogh_bound), i))
+
+        best_name, best_distance, best_length = None, np.inf, 0
+        cutoff = self.threshold
+        for bound, i in sorted(candidates):
+            if bound > cutoff:
+                self.stats['pruned_keogh'] += 1
+                continue
+            template = self.templates[i]
+            length = len(template)
+            total = dtw_distance(frame_costs(window[-length:], template), self.bands[i], cutoff * length)
+            if not np.isfinite(total):
+                self.stats['abandoned'] += 1
+                continue
+            self.stats['dtw'] += 1
+            distance = total / length
+            if distance <= cutoff:
+                best_name, best_distance, best_length = self.names[i], float(distance), length
+                cutoff = distance
+        return best_name, best_distance, best_length
+
+    @staticmethod
+    def _to_arrays(frames):
+        arrays = [keypoints_to_array(frame) for frame in frames]
+        if not arrays:
+            return np.zeros((0, len(LANDMARK_INDEX), 2), np.float32), np.zeros((0, len(LANDMARK_INDEX)), bool)
+        return np.stack([points for points, _ in arrays]), np.stack([mask for _, mask in arrays])
+
+    @staticmethod
+    def _envelope(features: np.ndarray, radius: int) -> Tuple[np.ndarray, np.ndarray]:
+        length = len(features)
+        upper = np.empty_like(features)
+        lower = np.empty_like(features)
+        for i in range(length):
+            lo, hi = max(0, i - radius), min(length, i + radius + 1)
+            upper[i] = features[lo:hi].max(axis=0)
+            lower[i] = features[lo:hi].min(axis=0)
+        return upper, lower
@@ -1,10 +1,16 @@
 import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Tuple
+from src.pose_frame import PoseFrame, LANDMARK_NAMES, LANDMARK_INDEX, NUM_LANDMARKS
+
 
 def normalize_keypoints(keypoints: Dict[str, List[float]]) -> Dict[str, List[float]]:
     """
     Normalize keypoints to have zero mean and unit variance.
     """
+    if isinstance(keypoints, PoseFrame):
+        normalized = normalize_keypoint_array(keypoints.points, keypoints.mask)
+        return {name: normalized[idx].tolist() for idx, name in enumerate(LANDMARK_NAMES) if keypoints.mask[idx]}
+
     points = np.array(list(keypoints.values()))
     mean = np.mean(points, axis=0)
     std = np.std(points, axis=0) + 1e-8  # Avoid division by zero
@@ -16,6 +22,56 @@ def normalize_keypoints(keypoints: Dict[str, List[float]]) -> Dict[str, List[flo
 
     return normalized_keypoints
 
+
+def keypoints_to_array(keypoints: Dict[str, List[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convert a {landmark_name: [x, y]} dict into fixed-order arrays.
+    Landmarks that are not in LANDMARK_NAMES are ignored.
+    Returns: (points (K, 2) float32, mask (K,) bool) where mask marks the landmarks present in the dict.
+    """
+    if isinstance(keypoints, PoseFrame):
+        return keypoints.points, keypoints.mask
+
+    points = np.zeros((NUM_LANDMARKS, 2), dtype=np.float32)
+    mask = np.zeros(NUM_LANDMARKS, dtype=bool)
+    for name, point in keypoints.items():
+        idx = LANDMARK_INDEX.get(name)
+        if idx is not None:
+            points[idx] = point[:2]
+            mask[idx] = True
+    return points, mask
+
+
+def keypoints_list_to_array(keypoints_list: List[Dict[str, List[float]]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stack per-frame keypoint dicts (or PoseFrames) into (F, K, 2) float32 points and an (F, K) bool mask.
+    """
+    points = np.zeros((len(keypoints_list), NUM_LANDMARKS, 2), dtype=np.float32)
+    mask = np.zeros((len(keypoints_list), NUM_LANDMARKS), dtype=bool)
+    for row, keypoints in enumerate(keypoints_list):
+        points[row], mask[row] = keypoints_to_array(keypoints)
+    return points, mask
+
+
+def normalize_keypoint_array(points: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """
+    Array version of normalize_keypoints.
+    Args:
+        points: (..., K, 2) keypoints, any number of leading batch dimensions.
+        mask: (..., K) bool, which landmarks are present.
+    Returns:
+        (..., K, 2) float32, each pose normalized over its present landmarks only.
+        Missing landmarks are set to 0 so they never contribute to a distance.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    present = np.asarray(mask, dtype=bool)[..., None]
+    count = np.maximum(present.sum(axis=-2, keepdims=True), 1)
+
+    mean = np.where(present, points, 0.0).sum(axis=-2, keepdims=True) / count
+    centered = np.where(present, points - mean, 0.0)
+    std = np.sqrt((centered ** 2).sum(axis=-2, keepdims=True) / count) + 1e-8  # Avoid division by zero
+    return (centered / std).astype(np.float32)
+
 # 會上下顛倒，導致判斷結果錯誤
 # def normalize_keypoints(keypoints: Dict[str, List[float]]) -> Dict[str, List[float]]:
 #     """
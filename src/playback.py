@@ -0,0 +1,247 @@
+import time
+import queue
+import threading
+import cv2
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from src.analyzer import analyze_one_frame
+from src.frame_renderer import FrameRenderer
+from src.motion_matching import MotionMatcher, load_motion_templates
+from src.pose_frame import PoseFrame
+from src import tracing
+
+
+class PlaybackFrame:
+    """One decoded and processed frame handed from PlaybackWorker to the GUI thread."""
+    __slots__ = ('index', 'rgb', 'skeleton_rgb', 'keypoints', 'analyzed', 'label', 'matched', 'predicted')
+
+    def __init__(self, index, rgb, skeleton_rgb, keypoints, analyzed, label, matched=None, predicted=False):
+        self.index = index  # frame number in the video, from 0
+        self.rgb = rgb  # original frame, RGB, scaled to the display size
+        self.skeleton_rgb = skeleton_rgb  # the same with the skeleton drawn
+        self.keypoints = keypoints  # PoseFrame
+        self.analyzed = analyzed  # True on every `interval`-th frame
+        self.label = label  # analyze_one_frame (or motion match) result on matched frames, else None
+        self.matched = analyzed if matched is None else matched  # realtime mode matched this frame (every frame with a filter)
+        self.predicted = predicted  # keypoints were predicted by the LandmarkFilter, pose inference was skipped
+
+
+class PlaybackWorker(QThread):
+    """
+    Video playback pipeline off the GUI thread: a decoder thread fills a bounded queue,
+    and this thread runs pose inference, template matching and skeleton drawing, then
+    hands finished frames to the GUI through `frame_ready`.
+    Frames are converted to RGB once (for MediaPipe), then scaled to `display_size` in reused
+    buffers and the skeleton is drawn at that size, so the GUI only wraps them for display.
+
+    Playback is paced to the video's FPS. When processing falls behind real time, or the GUI
+    still has `max_in_flight` frames it hasn't shown, display-only frames are dropped.
+    Frames due for analysis (every `interval`-th) are never dropped, so counting stays the same;
+    while the GUI is that far behind they are rendered into new arrays rather than the reused buffers.
+    With a `motion_gate`, pose inference only runs at full rate while the image is moving; frames
+    it skips reuse the last pose (see motion_gate.MotionGate). With a `landmark_filter` the
+    landmarks are smoothed, skipped frames get a predicted pose instead, and realtime mode
+    matches every displayed frame rather than every `interval`-th (see landmark_filter).
+    """
+    frame_ready = pyqtSignal(object)  # PlaybackFrame
+    stats_updated = pyqtSignal(float, int)  # achieved fps, frames dropped so far
+    playback_finished = pyqtSignal()
+
+    def __init__(self, video_path, template_path, threshold=0.5, interval=10, realtime=False,
+                 queue_size=8, max_in_flight=2, drop_late=True, motion_template_path=None, display_size=None,
+                 smooth_scaling=True, motion_gate=None, landmark_filter=None, parent=None):
+        super().__init__(parent)
+        self.video_path = video_path
+        self.template_path = template_path
+        self.motion_template_path = motion_template_path  # motion templates checked on analyzed frames, optional
+        self.threshold = threshold
+        self.interval = interval
+        self.realtime = realtime
+        self.max_in_flight = max_in_flight
+        self.drop_late = drop_late
+        self.display_size = display_size  # (w, h) the frames are shown at, see set_display_size
+        # Two buffers per frame (plain and skeleton); enough for frames the GUI hasn't shown yet
+        self.renderer = FrameRenderer(smooth_scaling, buffers=2 * (max_in_flight + 4))
+        # MotionGate: skip pose inference on frames with little motion and reuse the last pose (None = every frame)
+        self.motion_gate = motion_gate
+        self.landmark_filter = landmark_filter  # LandmarkFilter, or None for raw landmarks
+
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.fps = 0.0
+        self._running = threading.Event()
+        self._resumed = threading.Event()
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
+    def run(self):
+        cap = cv2.VideoCapture(self.video_path)
+        if not cap.isOpened():
+            print(f"Error: Couldn't open video {self.video_path}")
+            self.playback_finished.emit()
+            return
+        video_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        frame_period = 1.0 / video_fps
+
+        import mediapipe as mp  # imported here, off the GUI thread and only once playback starts
+        mp_pose = mp.solutions.pose
+        pose = mp_pose.Pose()
+        motion_matcher = MotionMatcher(load_motion_templates(self.motion_template_path), self.threshold)
+        self._running.set()
+        self._resumed.set()
+        decoder = threading.Thread(target=self._decode, args=(cap,), name='playback-decoder', daemon=True)
+        decoder.start()
+
+        clock_start = time.perf_counter()
+        first_index = None
+        pose_landmarks, keypoints = None, PoseFrame()  # last pose, reused on frames the motion gate skips
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        if self.landmark_filter is not None:
+            self.landmark_filter.reset()
+        stats_start, stats_frames = time.perf_counter(), 0
+        try:
+            while self._running.is_set():
+                try:
+                    item = self.frames.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    break
+                index, frame = item
+                analyzed = index % self.interval == 0
+
+                if not self._resumed.is_set():
+                    paused_at = time.perf_counter()
+                    self._resumed.wait()
+                    clock_start += time.perf_counter() - paused_at
+                if first_index is None:
+                    first_index = index
+
+                # Pace to the video clock; drop display-only frames we are already late for, and any
+                # the GUI has no room for yet (on time or not)
+                lag = (time.perf_counter() - clock_start) - (index - first_index) * frame_period
+                if lag < 0:
+                    time.sleep(-lag)
+                if not analyzed and (self.drop_late and lag > frame_period or self._gui_busy()):
+                    self.dropped += 1
+                    continue
+
+                with tracing.span("playback.motion_gate"):
+                    process = self.motion_gate is None or self.motion_gate.should_process(frame)
+                if process:
+                    with tracing.span("playback.cvtColor"):
+                        image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    with tracing.span("playback.pose_process"):
+                        results = pose.process(image_rgb)
+                    pose_landmarks = results.pose_landmarks
+                    keypoints = PoseFrame.from_results(results)
+                filtering = self.landmark_filter is not None
+                if filtering:
+                    timestamp = index * frame_period
+                    with tracing.span("playback.landmark_filter"):
+                        if process:
+                            keypoints = self.landmark_filter.update(keypoints, timestamp)
+                        else:
+                            keypoints = self.landmark_filter.predict(timestamp)
+
+                label = None
+                matched = self.realtime and (analyzed or filtering)
+                if matched:
+                    label = analyze_one_frame(keypoints, self.template_path, self.threshold)
+                    if analyzed and len(motion_matcher):  # motion templates are sampled every `interval` frames
+                        with tracing.span("playback.motion_match"):
+                            motion = motion_matcher.push(keypoints, index)
+                        if motion:
+                            label = motion[0].upper()  # a whole motion outranks a single pose
+
+                # Analyzed frames are always shown; once the GUI holds as many frames as the ring has room
+                # for, they get new buffers so the ones it hasn't shown yet are never overwritten
+                with self._in_flight_lock:
+                    fresh = self._in_flight >= self.renderer.buffers // 2
+                with tracing.span("playback.render"):
+                    if process:
+                        display_rgb = self.renderer.render(image_rgb, self.display_size, fresh=fresh)
+                    else:
+                        # No RGB copy was needed for MediaPipe; convert after scaling, on the small image
+                        display_rgb = self.renderer.render(frame, self.display_size, bgr=True, fresh=fresh)
+                    skeleton_rgb = self.renderer.copy(display_rgb, fresh=fresh)
+                with tracing.span("playback.draw_skeleton"):
+                    if filtering:
+                        self.renderer.draw_keypoints(skeleton_rgb, keypoints)
+                    elif pose_landmarks:
+                        self.renderer.draw_pose(skeleton_rgb, pose_landmarks)
+
+                with self._in_flight_lock:
+                    self._in_flight += 1
+                self.frame_ready.emit(PlaybackFrame(index, display_rgb, skeleton_rgb, keypoints, analyzed, label,
+                                                    matched, filtering and not process))
+
+                stats_frames += 1
+                elapsed = time.perf_counter() - stats_start
+                if elapsed >= 1.0:
+                    self.fps = stats_frames / elapsed
+                    self.stats_updated.emit(self.fps, self.dropped)
+                    stats_start, stats_frames = time.perf_counter(), 0
+        finally:
+            self._running.clear()
+            self._drain()
+            decoder.join()
+            cap.release()
+            pose.close()
+            self.stats_updated.emit(self.fps, self.dropped)
+            self.playback_finished.emit()
+
+    def set_display_size(self, width, height):
+        """Size of the widgets showing the frames; later frames are scaled to fit it."""
+        self.display_size = (width, height)
+
+    def frame_consumed(self):
+        """Called by the GUI once it has shown a frame from `frame_ready`."""
+        with self._in_flight_lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def stop(self):
+        self._running.clear()
+        self._resumed.set()
+        self._drain()
+        self.wait()
+
+    def _gui_busy(self):
+        with self._in_flight_lock:
+            return self._in_flight >= self.max_in_flight
+
+    def _decode(self, cap):
+        index = 0
+        while self._running.is_set():
+            with tracing.span("playback.cap_read"):
+                ret, frame = cap.read()
+            if not ret:
+                break
+            if not self._put((index, frame)):
+                return
+            index += 1
+        self._put(None)
+
+    def _put(self, item):
+        # Blocking put that gives up once playback is stopped
+        while self._running.is_set():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _drain(self):
+        try:
+            while True:
+                self.frames.get_nowait()
+        except queue.Empty:
+            pass
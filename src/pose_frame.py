@@ -0,0 +1,134 @@
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# MediaPipe Pose landmark order (mp.solutions.pose.PoseLandmark), lower-cased.
+# Compiled arrays always use this order so row k means the same joint everywhere.
+LANDMARK_NAMES = (
+    "nose",
+    "left_eye_inner", "left_eye", "left_eye_outer",
+    "right_eye_inner", "right_eye", "right_eye_outer",
+    "left_ear", "right_ear",
+    "mouth_left", "mouth_right",
+    "left_shoulder", "right_shoulder",
+    "left_elbow", "right_elbow",
+    "left_wrist", "right_wrist",
+    "left_pinky", "right_pinky",
+    "left_index", "right_index",
+    "left_thumb", "right_thumb",
+    "left_hip", "right_hip",
+    "left_knee", "right_knee",
+    "left_ankle", "right_ankle",
+    "left_heel", "right_heel",
+    "left_foot_index", "right_foot_index",
+)
+LANDMARK_INDEX = {name: idx for idx, name in enumerate(LANDMARK_NAMES)}
+NUM_LANDMARKS = len(LANDMARK_NAMES)
+NUM_CHANNELS = 4  # x, y, z, visibility
+
+
+class PoseFrame:
+    """
+    One detected pose stored as a fixed (33, 4) float32 array of [x, y, z, visibility]
+    in LANDMARK_NAMES order, plus a (33,) bool mask of the landmarks that were detected.
+
+    Reads like the {landmark_name: [x, y]} dicts used across the project (pose[name], `in`,
+    keys/items/get, len, truthiness), so existing callers keep working, while normalization
+    and matching use `points`/`mask` directly without any per-landmark Python work.
+    """
+    __slots__ = ('data', 'mask')
+
+    def __init__(self, data: Optional[np.ndarray] = None, mask: Optional[np.ndarray] = None):
+        self.data = np.zeros((NUM_LANDMARKS, NUM_CHANNELS), dtype=np.float32) if data is None else data
+        self.mask = np.zeros(NUM_LANDMARKS, dtype=bool) if mask is None else mask
+
+    @classmethod
+    def from_landmarks(cls, landmarks) -> 'PoseFrame':
+        """From a MediaPipe NormalizedLandmarkList (results.pose_landmarks)."""
+        data = np.array([(lm.x, lm.y, lm.z, lm.visibility) for lm in landmarks.landmark], dtype=np.float32)
+        mask = np.zeros(NUM_LANDMARKS, dtype=bool)
+        mask[:len(data)] = True
+        if len(data) != NUM_LANDMARKS:
+            data = np.resize(data, (NUM_LANDMARKS, NUM_CHANNELS))
+            data[~mask] = 0.0
+        return cls(data, mask)
+
+    @classmethod
+    def from_results(cls, results) -> 'PoseFrame':
+        """From the output of mp.solutions.pose.Pose.process(); empty when no pose was found."""
+        if results.pose_landmarks:
+            return cls.from_landmarks(results.pose_landmarks)
+        return cls()
+
+    @classmethod
+    def from_dict(cls, keypoints: Dict[str, List[float]]) -> 'PoseFrame':
+        """From a {landmark_name: [x, y, (z, visibility)]} dict. Unknown names are ignored."""
+        frame = cls()
+        for name, point in keypoints.items():
+            idx = LANDMARK_INDEX.get(name)
+            if idx is not None:
+                values = point[:NUM_CHANNELS]
+                frame.data[idx, :len(values)] = values
+                frame.mask[idx] = True
+        return frame
+
+    @property
+    def points(self) -> np.ndarray:
+        """(33, 2) x, y view."""
+        return self.data[:, :2]
+
+    @property
+    def visibility(self) -> np.ndarray:
+        """(33,) view of MediaPipe's visibility scores."""
+        return self.data[:, 3]
+
+    def to_dict(self) -> Dict[str, List[float]]:
+        return {name: self.data[idx, :2].tolist() for idx, name in enumerate(LANDMARK_NAMES) if self.mask[idx]}
+
+    # --- dict-compatible accessors ---
+    def __getitem__(self, name: str) -> List[float]:
+        idx = LANDMARK_INDEX.get(name)
+        if idx is None or not self.mask[idx]:
+            raise KeyError(name)
+        return self.data[idx, :2].tolist()
+
+    def get(self, name: str, default=None):
+        idx = LANDMARK_INDEX.get(name)
+        if idx is None or not self.mask[idx]:
+            return default
+        return self.data[idx, :2].tolist()
+
+    def __contains__(self, name) -> bool:
+        idx = LANDMARK_INDEX.get(name)
+        return idx is not None and bool(self.mask[idx])
+
+    def __iter__(self) -> Iterator[str]:
+        return self.keys()
+
+    def __len__(self) -> int:
+        return int(self.mask.sum())
+
+    def keys(self) -> Iterator[str]:
+        return (LANDMARK_NAMES[idx] for idx in np.flatnonzero(self.mask))
+
+    def values(self) -> Iterator[List[float]]:
+        return (self.data[idx, :2].tolist() for idx in np.flatnonzero(self.mask))
+
+    def items(self) -> Iterator[Tuple[str, List[float]]]:
+        return ((LANDMARK_NAMES[idx], self.data[idx, :2].tolist()) for idx in np.flatnonzero(self.mask))
+
+    def __repr__(self):
+        return f"PoseFrame({len(self)} landmarks)"
+
+
+def stack_pose_frames(frames: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stack PoseFrames (or keypoint dicts) into (F, 33, 4) float32 data and an (F, 33) bool mask.
+    """
+    data = np.zeros((len(frames), NUM_LANDMARKS, NUM_CHANNELS), dtype=np.float32)
+    mask = np.zeros((len(frames), NUM_LANDMARKS), dtype=bool)
+    for row, frame in enumerate(frames):
+        if not isinstance(frame, PoseFrame):
+            frame = PoseFrame.from_dict(frame)
+        data[row] = frame.data
+        mask[row] = frame.mask
+    return data, mask
@@ -1,12 +1,25 @@
 import numpy as np
-from typing import Dict, Tuple, List
-from src.normalization import normalize_keypoints
-from src.template_visualizer import KeypointVisualizer
+from typing import Dict, Tuple, List, Union, Optional
+from src.normalization import keypoints_to_array, normalize_keypoint_array
+from src.keypoint_templates import TemplateIndex, TemplateManager, TREE_MIN_EXEMPLARS
+
+# Rough cap on elements in the (chunk, T, K) temporaries built by match_batch.
+MATCH_BATCH_BUDGET = 1 << 21
+
 
 class PoseMatcher:
-    def __init__(self, threshold: float = 0.5):
+    def __init__(self, threshold: float = 0.5, k_neighbors: int = 1):
         self.threshold = threshold  # Threshold for considering a pose as matched
-        self.keypoint_visualizer = KeypointVisualizer()
+        self.k_neighbors = k_neighbors  # Nearest exemplars that vote on the technique, 1 = plain nearest neighbour
+        self._keypoint_visualizer = None
+
+    @property
+    def keypoint_visualizer(self):
+        """KeypointVisualizer, created on first use so matching never imports matplotlib."""
+        if self._keypoint_visualizer is None:
+            from src.template_visualizer import KeypointVisualizer
+            self._keypoint_visualizer = KeypointVisualizer()
+        return self._keypoint_visualizer
 
     def compute_distance(self, keypoints_a: Dict[str, List[float]], keypoints_b: Dict[str, List[float]], method: str = 'euclidean') -> float:
         """
@@ -30,25 +43,139 @@ class PoseMatcher:
 
         return np.mean(distances)
 
-    def match_pose(self, detected_keypoints: Dict[str, List[float]], templates: Dict[str, 'BoxingPoseTemplate']) -> Tuple[str, float]:
+    def match_pose(self, detected_keypoints: Dict[str, List[float]], templates: Union[Dict[str, 'BoxingPoseTemplate'], TemplateManager, TemplateIndex]) -> Tuple[str, float]:
         """
-        Compare the detected keypoints against all templates and return the best match.
+        Compare the detected keypoints against every exemplar of every template and return the best match.
+        `templates` may be a TemplateManager or TemplateIndex (compiled once and reused),
+        or a plain {name: BoxingPoseTemplate} dict, which is compiled on every call.
+        With k_neighbors > 1 the k nearest exemplars within the threshold vote, weighted by 1/distance;
+        the returned distance is then the winner's nearest exemplar.
         """
-        normalized_detected = normalize_keypoints(detected_keypoints)
-        min_distance = float('inf')
-        best_match_name = None
+        index = self._resolve_index(templates)
+        if len(index) == 0 or not detected_keypoints:
+            return None, float('inf')
 
-        for name, template in templates.items():
-            normalized_template = normalize_keypoints(template.keypoints)
-            distance = self.compute_distance(normalized_detected, normalized_template)
-            if distance < min_distance:
-                min_distance = distance
-                best_match_name = name
+        points, mask = keypoints_to_array(detected_keypoints)
+        rows, distances = index.nearest(normalize_keypoint_array(points, mask), mask, self.k_neighbors)
 
         # print(f"Best match: {best_match_name} with distance: {min_distance}")
         # self.keypoint_visualizer.plot_keypoints(normalized_detected)
 
-        if min_distance <= self.threshold:
-            return best_match_name, min_distance
-        else:
-            return None, min_distance  # No pose matches within the threshold
\ No newline at end of file
+        return self._vote(index, rows, distances)
+
+    def nearest_exemplars(self, detected_keypoints: Dict[str, List[float]], templates, k: int = 5) -> List[Tuple[str, float]]:
+        """
+        The k exemplars closest to the detected keypoints as (technique name, distance), closest first,
+        ignoring the threshold. A technique shows up once per matching exemplar.
+        """
+        index = self._resolve_index(templates)
+        if len(index) == 0 or not detected_keypoints:
+            return []
+        points, mask = keypoints_to_array(detected_keypoints)
+        rows, distances = index.nearest(normalize_keypoint_array(points, mask), mask, k)
+        return [(index.names[row], float(distance)) for row, distance in zip(rows, distances)]
+
+    def rank_templates(self, detected_keypoints: Dict[str, List[float]], templates, top_k: int = 3) -> List[Tuple[str, float]]:
+        """
+        Score the detected keypoints against every template in one vectorized pass.
+        A template's distance is that of its nearest exemplar.
+        Returns: the top_k (name, distance) pairs sorted by distance, ignoring the threshold.
+        """
+        index = self._resolve_index(templates)
+        if len(index) == 0 or not detected_keypoints:
+            return []
+
+        points, mask = keypoints_to_array(detected_keypoints)
+        distances = index.distances(normalize_keypoint_array(points, mask), mask)
+        per_label = np.full(len(index.label_names), np.inf)
+        np.minimum.at(per_label, index.labels, distances)  # nearest exemplar per technique
+
+        top_k = min(top_k, len(per_label))
+        best = np.argpartition(per_label, top_k - 1)[:top_k]
+        best = best[np.argsort(per_label[best], kind='stable')]
+        return [(index.label_names[i], float(per_label[i])) for i in best]
+
+    def match_batch(self, keypoints: np.ndarray, mask: np.ndarray, templates, chunk_size: Optional[int] = None) -> Tuple[List[Optional[str]], np.ndarray]:
+        """
+        Match many frames at once, e.g. a whole video.
+        Args:
+            keypoints: (F, K, 2) raw keypoints in LANDMARK_NAMES order (see keypoints_list_to_array)
+            mask: (F, K) bool, which landmarks were detected in each frame
+            templates: TemplateManager, TemplateIndex or {name: BoxingPoseTemplate}
+            chunk_size: frames scored per vectorized step. None sizes chunks so the
+                (chunk, T, K) temporaries stay around MATCH_BATCH_BUDGET elements.
+        Returns:
+            (labels, distances): per frame the best template name, or None when over the
+            threshold or nothing was detected, and the (F,) best distance (inf if none).
+        """
+        index = self._resolve_index(templates)
+        num_frames = len(keypoints)
+        best_names = [None] * num_frames
+        best_distances = np.full(num_frames, np.inf)
+        if num_frames == 0 or len(index) == 0:
+            return best_names, best_distances
+
+        mask = np.asarray(mask, dtype=bool)
+        if self.k_neighbors > 1 or len(index) >= TREE_MIN_EXEMPLARS:
+            # Large exemplar libraries or voting: per frame nearest-neighbour queries
+            points = normalize_keypoint_array(keypoints, mask)
+            for frame in range(num_frames):
+                if mask[frame].any():
+                    rows, distances = index.nearest(points[frame], mask[frame], self.k_neighbors)
+                    best_names[frame], best_distances[frame] = self._vote(index, rows, distances)
+            return best_names, best_distances
+
+        if chunk_size is None:
+            chunk_size = max(1, MATCH_BATCH_BUDGET // (len(index) * index.mask.shape[1]))
+
+        for start in range(0, num_frames, chunk_size):
+            end = min(start + chunk_size, num_frames)
+            points = normalize_keypoint_array(keypoints[start:end], mask[start:end])  # (C, K, 2)
+            distances = index.batch_distances(points, mask[start:end])  # (C, T)
+
+            best = np.argmin(distances, axis=1)
+            best_distances[start:end] = distances[np.arange(end - start), best]
+            for offset, (row, distance) in enumerate(zip(best, best_distances[start:end])):
+                if distance <= self.threshold:
+                    best_names[start + offset] = index.names[row]
+
+        return best_names, best_distances
+
+    def _vote(self, index: TemplateIndex, rows: np.ndarray, distances: np.ndarray) -> Tuple[Optional[str], float]:
+        """Pick a technique from the nearest exemplars (closest first), see match_pose."""
+        if len(rows) == 0 or not np.isfinite(distances[0]):
+            return None, float('inf')
+        if distances[0] > self.threshold:
+            return None, float(distances[0])  # No pose matches within the threshold
+        if self.k_neighbors == 1:
+            return index.names[rows[0]], float(distances[0])
+
+        votes = {}
+        for row, distance in zip(rows, distances):
+            if distance > self.threshold:
+                break
+            name = index.names[row]
+            votes[name] = votes.get(name, 0.0) + 1.0 / (distance + 1e-6)
+        winner = max(votes, key=votes.get)
+        nearest = next(distance for row, distance in zip(rows, distances) if index.names[row] == winner)
+        return winner, float(nearest)
+
+    @staticmethod
+    def template_distances(normalized_points: np.ndarray, mask: np.ndarray, index: TemplateIndex) -> np.ndarray:
+        """
+        Mean euclidean distance over common landmarks between one normalized pose and every exemplar.
+        Args:
+            normalized_points: (K, 2) output of normalize_keypoint_array
+            mask: (K,) bool
+            index: TemplateIndex
+        Returns: (T,) float64, inf where an exemplar shares no landmark with the pose.
+        """
+        return index.distances(normalized_points, mask)
+
+    @staticmethod
+    def _resolve_index(templates) -> TemplateIndex:
+        if isinstance(templates, TemplateIndex):
+            return templates
+        if isinstance(templates, TemplateManager):
+            return templates.index
+        return TemplateIndex.from_templates(templates)
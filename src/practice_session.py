@@ -0,0 +1,321 @@
+import functools
+import random
+import threading
+import time
+import cv2
+
+from src.analyzer import analyze_one_frame
+from src.motion_matching import MotionMatcher, load_motion_templates
+from src.pose_frame import PoseFrame
+from src.motion_gate import MotionGate
+from src.landmark_filter import LandmarkFilter
+from src.hit_testing import HitTester
+from src.camera_source import FrameGrabber, open_source
+from src.latency import LatencyMonitor
+from src import tracing
+
+
+class PracticeFrame:
+    """What PracticeSession.process made of one camera frame, for display."""
+    __slots__ = ('frame', 'image_rgb', 'keypoints', 'pose_landmarks', 'hits', 'processed', 'capture_time')
+
+    def __init__(self, frame, image_rgb, keypoints, pose_landmarks, hits, processed, capture_time):
+        self.frame = frame  # the camera frame, BGR
+        self.image_rgb = image_rgb  # the same in RGB if pose detection ran on it, else None
+        self.keypoints = keypoints  # PoseFrame (filtered or predicted with a landmark filter) or None
+        self.pose_landmarks = pose_landmarks  # MediaPipe landmarks of the last frame pose detection ran on
+        self.hits = hits  # [Hit, ...] that scored on this frame
+        self.processed = processed  # pose detection ran on this frame (the motion gate didn't skip it)
+        self.capture_time = capture_time  # time.perf_counter() when the frame was captured
+
+
+class PracticeSession:
+    """
+    The practice game without the window: pose detection, technique recognition, hit testing
+    against the targets, scoring and hardware feedback for a stream of camera frames.
+
+    A PracticeStation feeds it camera frames and PracticeWindow draws the result; it runs
+    headless just as well, e.g. on a ReplayCamera to check latency budgets (test/latency_budget.py).
+    With a LatencyMonitor, every stage a frame goes through is marked against its capture time.
+    """
+    technique_hand_map = {
+        "CROSS": "right_wrist",
+        "UPPERCUT": "right_wrist",
+        "JAB": "left_wrist",
+        "HOOK": "left_wrist"
+    }
+
+    def __init__(self, selected_techniques=None, template_path=None, threshold=0.5, motion_template_path=None,
+                 motion_gate=True, landmark_filter=True, num_targets=1, feedback=None, latency=None, pose=None,
+                 move_interval=3.0, inference_slot=None):
+        """
+        Args:
+            selected_techniques: techniques that score, e.g. ["HOOK", "JAB"]
+            motion_gate: MotionGate, True for the default one, None to run pose detection on every frame
+            landmark_filter: LandmarkFilter, True for the default one, None for raw landmarks
+            num_targets: targets on screen at once
+            feedback: SerialManager (or anything with cmd2send(command, tag)) told about every hit
+            latency: LatencyMonitor for capture-to-stage latencies, or None
+            pose: MediaPipe Pose to use; default a new one (closed by close())
+            move_interval: seconds after which the targets move to new random positions (None = only when hit)
+            inference_slot: context manager factory held around pose inference, e.g.
+                functools.partial(CoreScheduler.slot, scheduler, station) to share the cores between stations
+        """
+        # Pose model init
+        if pose is None:
+            import mediapipe as mp
+            pose = mp.solutions.pose.Pose()
+        self.pose = pose
+        self.pose_landmarks = None  # from the last frame pose detection ran on
+        self.inference_slot = inference_slot
+        # Skips pose detection between combinations; pass motion_gate=None to run it on every frame
+        self.motion_gate = MotionGate() if motion_gate is True else motion_gate or None
+        # Smooths landmarks and predicts them on skipped frames; pass landmark_filter=None for raw landmarks
+        self.landmark_filter = LandmarkFilter() if landmark_filter is True else landmark_filter or None
+
+        # Keep references to user preferences
+        self.selected_techniques = selected_techniques or []  # e.g. ["HOOK", "JAB"]
+        self.template_path = template_path
+        self.threshold = threshold
+        # Motion templates (optional) are matched on the live stream alongside the static poses
+        self.motion_matcher = MotionMatcher(load_motion_templates(motion_template_path), threshold)
+        self.frame_index = 0
+
+        # Score initialization
+        self.score = 0
+        self.last_hit = None
+
+        # Targets (centre x, y and radius in camera pixels), hit by the wrists' paths between frames
+        self.target_radius = 150
+        self.hit_tester = HitTester(cell_size=2 * self.target_radius)
+        self.hit_tester.add_target(1100, 372, self.target_radius)
+        for _ in range(num_targets - 1):
+            self.randomize_target_position(self.hit_tester.add_target(0, 0, self.target_radius))
+        # A hit counts if its hand's technique was recognized within this many seconds
+        self.technique_window = 0.3
+        self.recent_techniques = {}  # hand -> (technique, time recognized)
+        self.pending_hits = []  # hits still waiting (up to technique_window) for their hand's technique
+        # Targets also move to new random positions periodically, e.g. every 3 seconds
+        self.move_interval = move_interval
+        self.targets_moved = None  # frame time the targets last moved at
+
+        self.feedback = feedback
+        self.latency = latency
+        if feedback is not None and latency is not None and getattr(feedback, 'on_ack', False) is None:
+            # The command's tag is its frame's capture time: capture -> the Arduino acknowledging the buzz
+            feedback.on_ack = lambda text, rtt, captured: latency.mark("feedback_ack", captured)
+
+    def randomize_target_position(self, target_id=None):
+        """Randomly relocate a target (default: all of them) within the camera frame."""
+        frame_w, frame_h = 1500, 1000 # default values
+        max_x = frame_w - 2 * self.target_radius
+        max_y = frame_h - 2 * self.target_radius - 200
+        if max_x < 0 or max_y < 0:
+            return
+
+        for target in ([target_id] if target_id is not None else list(self.hit_tester.targets)):
+            self.hit_tester.move_target(target, random.randint(max_x-200, max_x+100),
+                                        random.randint(self.target_radius+100, max_y))
+
+    def process(self, frame, capture_time=None) -> PracticeFrame:
+        """
+        Run one camera frame (BGR) through the game.
+        Args:
+            capture_time: time.perf_counter() when the camera captured it; default now. It is the
+                frame's timestamp for filtering and hit timing, and the start of its latencies.
+        """
+        self.frame_index += 1
+        now = time.perf_counter() if capture_time is None else capture_time
+        latency = self.latency
+
+        # While the boxer stands still, the motion gate skips pose detection and the last pose is shown
+        with tracing.span("practice.motion_gate"):
+            process = self.motion_gate is None or self.motion_gate.should_process(frame)
+        image_rgb = None
+        if process:
+            # Convert to RGB for Mediapipe
+            with tracing.span("practice.cvtColor"):
+                image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            # Run pose detection
+            with tracing.span("practice.pose_process"):
+                if self.inference_slot is None:
+                    keypoints_result = self.pose.process(image_rgb)
+                else:
+                    with self.inference_slot():
+                        keypoints_result = self.pose.process(image_rgb)
+            self.pose_landmarks = keypoints_result.pose_landmarks
+            if latency is not None:
+                latency.mark("pose", capture_time)
+
+        # Mediapipe landmarks as a PoseFrame, read like {landmark_name: [x, y]} in normalized coords [0,1].
+        # With the landmark filter they are smoothed, and predicted on frames the gate skipped, so
+        # every frame is matched and hit-tested; without it only a new pose can hit.
+        keypoints = None
+        if self.landmark_filter is not None:
+            with tracing.span("practice.landmark_filter"):
+                if process:
+                    keypoints = self.landmark_filter.update(PoseFrame.from_results(keypoints_result), now)
+                else:
+                    keypoints = self.landmark_filter.predict(now)
+        elif process and self.pose_landmarks:
+            keypoints = PoseFrame.from_landmarks(self.pose_landmarks)
+
+        # Check if user hits a target with the correct technique
+        if keypoints:
+
+            # ----- Check for technique correctness -----
+            recognized_tech = analyze_one_frame(keypoints, self.template_path, self.threshold)
+            if len(self.motion_matcher):
+                with tracing.span("practice.motion_match"):
+                    motion = self.motion_matcher.push(keypoints, self.frame_index)
+                if motion:
+                    recognized_tech = motion[0]
+            recognized_tech = recognized_tech.upper() if recognized_tech else None
+            if latency is not None:
+                latency.mark("match", capture_time)
+
+            # Remember user-selected techniques per hand, a hit may come a frame before or after
+            if recognized_tech in self.selected_techniques and recognized_tech in self.technique_hand_map:
+                self.recent_techniques[self.technique_hand_map[recognized_tech]] = (recognized_tech, now)
+
+        # The wrists' paths since the last frame against every target, on every frame
+        with tracing.span("practice.hit_test"):
+            hits = self.find_hits(keypoints, frame, now)
+        if latency is not None:
+            latency.mark("hit_test", capture_time)
+        for hit in hits:
+            self.score += 1
+            self.last_hit = hit
+            if latency is not None:
+                latency.mark("score", capture_time)
+
+            # Hardware feedback: queued, so it never stalls the camera loop
+            if self.feedback is not None:
+                self.feedback.cmd2send('l' if hit.hand == 'left_wrist' else 'r', capture_time)
+                if latency is not None:
+                    latency.mark("feedback", capture_time)
+
+            self.randomize_target_position(hit.target_id)
+
+        if self.targets_moved is None:
+            self.targets_moved = now
+        elif self.move_interval is not None and now - self.targets_moved >= self.move_interval:
+            self.randomize_target_position()
+            self.targets_moved = now
+
+        return PracticeFrame(frame, image_rgb, keypoints, self.pose_landmarks, hits, process, capture_time)
+
+    def find_hits(self, keypoints, frame, timestamp):
+        """
+        Hits of either wrist on any target, with the correct hand for a recently recognized technique.
+        Returns: [Hit, ...] earliest first (see hit_testing.HitTester)
+        """
+        # Convert normalized [0..1] coordinates to the frame size
+        frame_h, frame_w = frame.shape[:2]
+        positions = {}
+        for hand in ('left_wrist', 'right_wrist'):
+            point = keypoints.get(hand) if keypoints else None
+            positions[hand] = (point[0] * frame_w, point[1] * frame_h) if point is not None else None
+
+        self.pending_hits.extend(self.hit_tester.update_hands(positions, timestamp))
+
+        hits, pending, scored = [], [], set()
+        for hit in self.pending_hits:
+            if hit.target_id in scored:
+                continue  # one score per target; it moves away once hit
+            _, recognized_at = self.recent_techniques.get(hit.hand, (None, float("-inf")))
+            if abs(hit.time - recognized_at) <= self.technique_window:
+                hits.append(hit)
+                scored.add(hit.target_id)
+            elif timestamp - hit.time <= self.technique_window:
+                pending.append(hit)
+        self.pending_hits = [hit for hit in pending if hit.target_id not in scored]
+        return hits
+
+    def close(self):
+        self.pose.close()
+
+
+class PracticeStation:
+    """
+    One bag station of practice mode: a capture source read on its own thread, and its own
+    PracticeSession (pose model, targets, score) and LatencyMonitor, so each athlete is scored
+    separately. run() processes the newest frame each time the shared CoreScheduler lets it,
+    and blocks until the source ends or stop() is called. PracticeWindow runs each station on a
+    PracticeWorker QThread; test/latency_budget.py runs them headless on plain threads.
+    """
+    def __init__(self, source=0, name=None, scheduler=None, latency=True, replay_options=None, **session_options):
+        """
+        Args:
+            source: camera index, or a video file / image directory / .frames store replayed as a camera
+            name: shown with the station's score and used as its key in reports; default the source
+            scheduler: CoreScheduler shared by all stations, or None to run at the camera's rate
+            latency: LatencyMonitor, True for a new one, None to not measure latency
+            replay_options: fps, loop, realtime for a replayed source (see camera_source.ReplayCamera)
+            session_options: passed to PracticeSession (selected_techniques, template_path, feedback, ...)
+        """
+        self.source = source
+        self.name = name or str(source)
+        self.scheduler = scheduler
+        self.latency = LatencyMonitor() if latency is True else latency
+        self.replay_options = replay_options or {}
+        self.session_options = session_options
+        self.session = None  # created by run(), on the thread that uses it
+        self.frames = 0
+        self.dropped = 0  # camera frames replaced by a newer one before they were processed
+        self._grabber = None
+        self._stop = threading.Event()
+
+    @property
+    def score(self):
+        return self.session.score if self.session is not None else 0
+
+    def run(self, on_frame=None, max_frames=None):
+        """
+        Process frames until the source ends, stop() is called or `max_frames` were processed.
+        Args:
+            on_frame: called with every PracticeFrame, on this thread
+        """
+        camera = open_source(self.source, **self.replay_options)
+        if not camera.isOpened():
+            print(f"Warning: Unable to open {self.name} ({self.source}). Check if another application is using it.")
+            return
+        self._grabber = FrameGrabber(camera, name=f"grabber-{self.name}")
+        inference_slot = None
+        if self.scheduler is not None:
+            self.scheduler.register(self.name)
+            inference_slot = functools.partial(self.scheduler.slot, self.name)
+        try:
+            self.session = PracticeSession(latency=self.latency, inference_slot=inference_slot, **self.session_options)
+            while not self._stop.is_set() and (max_frames is None or self.frames < max_frames):
+                if self.scheduler is not None:
+                    self.scheduler.pace(self.name)
+                ret, frame, capture_time = self._grabber.read(timeout=0.1)
+                if not ret:
+                    if self._grabber.ended:
+                        break
+                    continue
+                result = self.session.process(frame, capture_time)
+                self.frames += 1
+                if on_frame is not None:
+                    on_frame(result)
+        finally:
+            self._grabber.stop()
+            self.dropped = self._grabber.dropped
+            if self.scheduler is not None:
+                self.scheduler.unregister(self.name)
+            if self.session is not None:
+                self.session.close()
+
+    def stop(self):
+        self._stop.set()
+
+    def report(self):
+        """Score, frame counts, motion gate stats and latency histograms of the station, for a JSON export."""
+        report = {'source': str(self.source), 'score': self.score, 'frames': self.frames,
+                  'dropped': self._grabber.dropped if self._grabber is not None else self.dropped}
+        if self.session is not None and self.session.motion_gate is not None:
+            report['motion_gate'] = self.session.motion_gate.summary()
+        if self.latency is not None:
+            report.update(self.latency.to_dict())
+        return report
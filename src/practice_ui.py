@@ -1,65 +1,115 @@
-import random
-import cv2
-import mediapipe as mp
-from PyQt5.QtCore import QTimer, Qt, pyqtSignal, QThread
-from PyQt5.QtGui import QPixmap, QImage, QPainter, QColor, QPen
-from PyQt5.QtWidgets import QMainWindow, QLabel, QVBoxLayout, QWidget, QSizePolicy
-
-from src.analyzer import analyze_one_frame
-from src.hw_arduino import SerialManager
-
-class PracticeWindow(QMainWindow):
+import copy
+import json
+import math
+import threading
+from PyQt5.QtCore import QTimer, Qt, pyqtSignal, QThread, QPointF
+from PyQt5.QtGui import QPixmap, QPainter, QColor, QPen
+from PyQt5.QtWidgets import QMainWindow, QLabel, QVBoxLayout, QGridLayout, QWidget, QSizePolicy
+
+from src.frame_renderer import FrameRenderer
+from src.practice_session import PracticeStation
+from src.core_scheduler import CoreScheduler
+from src import tracing
+
+
+class StationFrame:
+    """One processed and rendered frame handed from a PracticeWorker to the GUI thread."""
+    __slots__ = ('rgb', 'frame_size', 'targets', 'score', 'hit', 'capture_time')
+
+    def __init__(self, rgb, frame_size, targets, score, hit, capture_time):
+        self.rgb = rgb  # camera frame with the skeleton, RGB, scaled to the station's view
+        self.frame_size = frame_size  # (w, h) of the camera frame, the targets' coordinates
+        self.targets = targets  # [(x, y, radius), ...] in camera pixels
+        self.score = score
+        self.hit = hit  # the last Hit that scored on this frame, or None
+        self.capture_time = capture_time  # time.perf_counter() when the camera captured the frame
+
+
+class PracticeWorker(QThread):
     """
-    A window that shows live camera feed, a randomly placed target,
-    and a score for hitting the target with the correct technique.
+    Runs one PracticeStation (capture, pose inference, scoring) off the GUI thread, renders
+    its frames at the size they are shown at and hands them over through `frame_ready`.
+    While the GUI still has `max_in_flight` frames it hasn't shown, frames are scored but not
+    rendered, so a busy GUI never holds back the game.
     """
-    def __init__(self, selected_techniques=None, template_path=None, threshold=0.5, parent=None):
+    frame_ready = pyqtSignal(object)  # StationFrame
+
+    def __init__(self, station, max_in_flight=2, parent=None):
         super().__init__(parent)
-        # For hardware arduino feedback, uncomment this line
-        # self.arduino = SerialManager(
-        #     port="/dev/cu.usbmodem1101", # Put your port here
-        #     baud_rate=500000, 
-        #     timeout=0.1
-        # )
-        self.technique_hand_map = {
-            "CROSS": "right_wrist",
-            "UPPERCUT": "right_wrist",
-            "JAB": "left_wrist",
-            "HOOK": "left_wrist"
-        }
+        self.station = station
+        self.max_in_flight = max_in_flight
+        self.display_size = None  # (w, h) of the view, see set_display_size
+        self.renderer = FrameRenderer(buffers=max_in_flight + 4)
+        self.not_shown = 0
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
+    def run(self):
+        self.station.run(self._frame_done)
+
+    def _frame_done(self, result):
+        with self._in_flight_lock:
+            if self._in_flight >= self.max_in_flight:
+                self.not_shown += 1
+                return
+            self._in_flight += 1
+        session = self.station.session
+        frame = result.frame
+
+        # Scale the RGB frame to the view once and draw the skeleton on the small copy
+        with tracing.span("practice.render"):
+            if result.image_rgb is not None:
+                display = self.renderer.render(result.image_rgb, self.display_size)
+            else:
+                display = self.renderer.render(frame, self.display_size, bgr=True)
 
-        self.setWindowTitle("Practice Mode")
-        self.setGeometry(200, 100, 600, 400)
-        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        # Draw the skeleton on the frame if pose landmarks are detected
+        if session.landmark_filter is not None:
+            if result.keypoints:
+                with tracing.span("practice.draw_landmarks"):
+                    self.renderer.draw_keypoints(display, result.keypoints)
+        elif result.pose_landmarks:
+            # Draw landmarks and connections
+            with tracing.span("practice.draw_landmarks"):
+                self.renderer.draw_pose(display, result.pose_landmarks)
 
-        # Pose model init
-        self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose()
+        self.frame_ready.emit(StationFrame(display, (frame.shape[1], frame.shape[0]),
+                                           list(session.hit_tester.targets.values()), session.score,
+                                           result.hits[-1] if result.hits else None, result.capture_time))
 
-        # Keep references to user preferences
-        self.selected_techniques = selected_techniques or []  # e.g. ["HOOK", "JAB"]
-        self.template_path = template_path
-        self.threshold = threshold
+    def set_display_size(self, width, height):
+        """Size of the view showing the frames; later frames are scaled to fit it."""
+        self.display_size = (width, height)
 
-        # Score initialization
-        self.score = 0
+    def frame_consumed(self):
+        """Called by the GUI once it has shown a frame from `frame_ready`."""
+        with self._in_flight_lock:
+            self._in_flight = max(0, self._in_flight - 1)
 
-        # Random target parameters (x, y, radius)
-        self.target_x = 1100
-        self.target_y = 372
-        self.target_radius = 150
+    def stop(self):
+        self.station.stop()
+        self.wait()
 
-        # Create central widget and layout
-        central_widget = QWidget(self)
-        self.setCentralWidget(central_widget)
-        layout = QVBoxLayout(central_widget)
+
+class StationView(QWidget):
+    """Score, latency and camera view of one station."""
+    def __init__(self, title, parent=None):
+        super().__init__(parent)
+        self.title = title
+        layout = QVBoxLayout(self)
 
         # Score label
-        self.score_label = QLabel("Score: 0", self)
+        self.score_label = QLabel(f"{title}  Score: 0" if title else "Score: 0", self)
         self.score_label.setStyleSheet("font-size: 24px; color: green;")
         layout.addWidget(self.score_label, alignment=Qt.AlignTop | Qt.AlignLeft)
         self.score_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
 
+        # Latency and frame rate label, refreshed once a second
+        self.latency_label = QLabel("", self)
+        self.latency_label.setStyleSheet("font-size: 12px; color: gray;")
+        layout.addWidget(self.latency_label, alignment=Qt.AlignTop | Qt.AlignLeft)
+        self.latency_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+
         # Video/camera feed label
         self.camera_label = QLabel(self)
         self.camera_label.setAlignment(Qt.AlignCenter)
@@ -69,147 +119,173 @@ class PracticeWindow(QMainWindow):
         self.camera_label.setScaledContents(True)
         self.camera_label.setMaximumSize(1920, 1080)
 
-        # Initialize camera
-        self.cap = cv2.VideoCapture(0)
-        if not self.cap.isOpened():
-            print("Warning: Unable to access camera. Check if another application is using it.")
-
-        # Timer for retrieving camera frames and updating UI
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.next_frame)
-        self.timer.start(30)  # about 30 FPS
-
-        # Another timer (optional) for moving the target to a new random position periodically
-        # e.g., every 3 seconds
-        self.move_target_timer = QTimer(self)
-        self.move_target_timer.timeout.connect(self.randomize_target_position)
-        self.move_target_timer.start(3000)
-
-    def randomize_target_position(self):
-        """Randomly relocate the target within the camera frame."""
-        frame_w, frame_h = 1500, 1000 # default values
-        max_x = frame_w - 2 * self.target_radius
-        max_y = frame_h - 2 * self.target_radius - 200
-        if max_x < 0 or max_y < 0:
-            return
-        
-        self.target_x = random.randint(max_x-200, max_x+100)
-        self.target_y = random.randint(self.target_radius+100, max_y)
-
-    def next_frame(self):
-        """Captures a camera frame, processes it, draws the target, and checks for hits."""
-        if not self.cap.isOpened():
-            return
-
-        ret, frame = self.cap.read()
-        if not ret:
-            return
-
-        # Mirror the frame
-        # frame = cv2.flip(frame, 1)
-
-        # Convert to RGB for Mediapipe
-        image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        # Run pose detection
-        keypoints_result = self.pose.process(image_rgb)
-
-        # 1) Draw the target on the frame
-
-        # 2) Check if user hits target with the correct technique
-        if keypoints_result.pose_landmarks:
-            # Convert mediapipe landmarks into a dictionary {landmark_name: [x, y]}
-            keypoints = {}
-            for idx, landmark in enumerate(keypoints_result.pose_landmarks.landmark):
-                name = self.mp_pose.PoseLandmark(idx).name.lower()
-                keypoints[name] = [landmark.x, landmark.y]  # normalized coords [0,1]
-
-            # ----- Check for technique correctness -----
-            recognized_tech = analyze_one_frame(keypoints, self.template_path, self.threshold)
-            recognized_tech = recognized_tech.upper() if recognized_tech else None 
-
-            # If recognized technique is one of the user-selected techniques, proceed to check "hit"
-            if recognized_tech in self.selected_techniques:
-                # Pass recognized_tech to is_hit
-                is_hit, hand = self.is_hit(recognized_tech, keypoints, frame)
-                hand = 'l' if hand == 'left_wrist' else 'r'
-
-                if is_hit:
-                    self.score += 1
-
-                    # For hardware arduino feedback, uncomment this line
-                    # self.arduino.cmd2send(hand)
-
-                    self.score_label.setText(f"Score: {self.score}")
-                    self.randomize_target_position()
-
-        # 3) Convert the frame to QPixmap and draw the target with QPainter
-        #    Because the frame is BGR from OpenCV, convert to RGB
-
-        # Draw the skeleton on the frame if pose landmarks are detected
-        if keypoints_result.pose_landmarks:
-            # Draw landmarks and connections
-            mp.solutions.drawing_utils.draw_landmarks(frame, keypoints_result.pose_landmarks, self.mp_pose.POSE_CONNECTIONS)
-
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = frame_rgb.shape
-        bytes_per_line = ch * w
-        qimg = QImage(frame_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
+    def show_frame(self, station_frame):
+        if station_frame.hit is not None:
+            score = f"Score: {station_frame.score}  (last hit: {station_frame.hit.speed:.0f} px/s)"
+            self.score_label.setText(f"{self.title}  {score}" if self.title else score)
 
         if self.camera_label.styleSheet() == "background-color: black;":
-            self.camera_label.setStyleSheet("")  
-
-        # Draw the target using QPainter
-        painter = QPainter()
-        pixmap = QPixmap.fromImage(qimg)
-        painter.begin(pixmap)
-        pen = QPen(QColor("red"))
-        pen.setWidth(4)
-        painter.setPen(pen)
-        painter.setBrush(QColor(255, 0, 0, 128))  # semi-transparent red
-        painter.drawEllipse(self.target_x, self.target_y, self.target_radius, self.target_radius)
-        painter.end()
-
-        # 4) Display on camera_label
-        self.camera_label.setPixmap(pixmap)
-
-    def is_hit(self, recognized_tech, keypoints, frame):
+            self.camera_label.setStyleSheet("")
+
+        # Wrap the rendered frame in a QPixmap (no further conversion) and draw the targets with QPainter
+        display = station_frame.rgb
+        with tracing.span("practice.qpainter"):
+            painter = QPainter()
+            pixmap = QPixmap.fromImage(FrameRenderer.to_qimage(display))
+            painter.begin(pixmap)
+            # The targets are placed in camera pixels; the pixmap is the scaled-down frame
+            frame_w, frame_h = station_frame.frame_size
+            painter.scale(display.shape[1] / frame_w, display.shape[0] / frame_h)
+            pen = QPen(QColor("red"))
+            pen.setWidth(4)
+            painter.setPen(pen)
+            painter.setBrush(QColor(255, 0, 0, 128))  # semi-transparent red
+            # Drawn as the area that counts as a hit: centre (x, y), radius
+            for x, y, radius in station_frame.targets:
+                painter.drawEllipse(QPointF(x, y), radius, radius)
+            painter.end()
+
+        # Display on camera_label
+        with tracing.span("practice.setPixmap"):
+            self.camera_label.setPixmap(pixmap)
+
+    def display_size(self):
         """
-        Checks if the user hits the target using the correct hand for the recognized technique.
+        Room for the camera image (w, h): the view's area below the score (and latency).
+        The label itself sizes to its pixmap (it is centred, not stretched), so it can't be the target.
         """
+        labels = self.score_label.height() + (self.latency_label.height() if self.latency_label.isVisible() else 0)
+        return self.width(), max(1, self.height() - labels)
 
-        if recognized_tech not in self.technique_hand_map:
-            # If the technique wasn't mapped, default to 'right_wrist' or return False
-            return False
-
-        required_hand = self.technique_hand_map[recognized_tech]
 
-        # 2. Verify the keypoints have that hand
-        if required_hand not in keypoints:
-            return False
-
-        # 3. Convert normalized [0..1] coordinates to the frame size
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame_h, frame_w, ch = frame_rgb.shape
-        # frame_w, frame_h = 1500, 1000 # default values
-        rx_norm, ry_norm = keypoints[required_hand]
+class PracticeWindow(QMainWindow):
+    """
+    A window that shows live camera feed, randomly placed targets,
+    and a score for hitting a target with the correct technique.
 
-        hand_x = int(rx_norm * frame_w)
-        hand_y = int(ry_norm * frame_h)
+    Several sources (cameras or recordings) can be practised on at once, one bag station each:
+    every station has its own capture thread, worker, pose model and score, and a shared
+    CoreScheduler splits the cores between their pose inference, lowering every station's
+    frame rate alike when the machine can't keep up.
+    """
+    def __init__(self, selected_techniques=None, template_path=None, threshold=0.5, motion_template_path=None,
+                 motion_gate=True, landmark_filter=True, num_targets=1, source=0, feedback=None,
+                 latency=True, latency_json=None, sources=None, scheduler=None, parent=None):
+        """
+        Args:
+            source: camera index, or a video file / image directory / .frames store replayed as a camera
+            feedback: SerialManager for hardware feedback on every hit, or None; with several
+                sources, a list with one (or None) per source
+            latency: True to measure each station's latency (a LatencyMonitor is also accepted
+                for a single source), None to not measure it
+            latency_json: where to export the stations' scores and latency histograms on close
+            sources: several sources, one station each; replaces `source`
+            scheduler: CoreScheduler shared by the stations; default one for this machine's cores
+        """
+        super().__init__(parent)
+        # For hardware arduino feedback, pass feedback=SerialManager(...) or uncomment these lines (needs pyserial)
+        # Sending is queued to a background thread, so it never stalls the camera timer
+        # from src.hw_arduino import SerialManager
+        # feedback = SerialManager(
+        #     port="/dev/cu.usbmodem1101", # Put your port here ("loop://" to test without a board)
+        #     baud_rate=500000,
+        #     timeout=0.1
+        # )
 
-        # print("INFO: Recognized technique:", recognized_tech)
-        # print("INFO: Hand location:", hand_x, hand_y)
-        # print("INFO: Target location:", self.target_x, self.target_y)
+        self.setWindowTitle("Practice Mode")
+        self.setGeometry(200, 100, 600, 400)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
 
-        # 4. Check if that hand location lies within the target circle
-        dist_sq = (hand_x - self.target_x) ** 2 + (hand_y - self.target_y) ** 2
-        radius_sq = self.target_radius ** 2
-        # If within circle => "hit"
-        return dist_sq <= radius_sq, required_hand
+        sources = list(sources) if sources else [source]
+        feedbacks = list(feedback) if isinstance(feedback, (list, tuple)) else [feedback] + [None] * (len(sources) - 1)
+        self.feedbacks = [f for f in feedbacks if f is not None]
+        self.latency_json = latency_json
+        self.scheduler = scheduler or CoreScheduler()
 
+        # Create central widget and layout: a grid of station views, as square as it gets
+        central_widget = QWidget(self)
+        self.setCentralWidget(central_widget)
+        layout = QGridLayout(central_widget)
+        columns = math.ceil(math.sqrt(len(sources)))
+
+        # Pose detection, recognition, hit testing and scoring run on one worker per station;
+        # this window only shows the results
+        self.stations, self.views, self.workers = [], [], []
+        for i, station_source in enumerate(sources):
+            title = f"Station {i + 1}" if len(sources) > 1 else ""
+            station_latency = (latency if len(sources) == 1 else True) if latency is not None else None
+            station = PracticeStation(
+                station_source, name=title or "Station 1", scheduler=self.scheduler,
+                latency=station_latency, replay_options={'loop': True},
+                selected_techniques=selected_techniques, template_path=template_path, threshold=threshold,
+                motion_template_path=motion_template_path,
+                # Each station needs its own gate and filter state
+                motion_gate=motion_gate if i == 0 or not motion_gate else copy.deepcopy(motion_gate),
+                landmark_filter=landmark_filter if i == 0 or not landmark_filter else copy.deepcopy(landmark_filter),
+                num_targets=num_targets, feedback=feedbacks[i] if i < len(feedbacks) else None)
+            view = StationView(title, central_widget)
+            view.latency_label.setVisible(station.latency is not None)
+            layout.addWidget(view, i // columns, i % columns)
+            worker = PracticeWorker(station, parent=self)
+            worker.frame_ready.connect(lambda station_frame, i=i: self.show_frame(i, station_frame))
+            self.stations.append(station)
+            self.views.append(view)
+            self.workers.append(worker)
+
+        for worker, view in zip(self.workers, self.views):
+            worker.set_display_size(*view.display_size())
+            worker.start()
+
+        # Latency and frame rates, refreshed once a second
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_stats)
+        self.stats_timer.start(1000)
+
+    def show_frame(self, i, station_frame):
+        """Show a frame from station i's worker."""
+        self.views[i].show_frame(station_frame)
+        self.workers[i].frame_consumed()
+        latency = self.stations[i].latency
+        if latency is not None:
+            latency.mark("display", station_frame.capture_time)
+
+    def update_stats(self):
+        stats = self.scheduler.stats()
+        for station, view in zip(self.stations, self.views):
+            station_stats = stats['stations'].get(station.name)
+            fps = f"{station_stats['fps']:.0f} FPS  " if station_stats else ""
+            if station.latency is not None:
+                view.latency_label.setText(fps + station.latency.text(("pose", "score", "feedback_ack", "display")))
+            else:
+                view.latency_label.setText(fps)
+        if stats['overloaded']:
+            self.statusBar().showMessage(f"Overloaded: stations run below {self.scheduler.min_fps:.0f} FPS, "
+                                         f"fewer stations (or more cores) would help")
+        else:
+            self.statusBar().clearMessage()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        for worker, view in zip(self.workers, self.views):
+            worker.set_display_size(*view.display_size())
 
     def closeEvent(self, event):
         """Cleanup resources when window is closed."""
-        if self.cap and self.cap.isOpened():
-            self.cap.release()
-        self.pose.close()
+        self.stats_timer.stop()
+        scheduler_stats = self.scheduler.stats()
+        for worker in self.workers:
+            worker.stop()
+        for station in self.stations:
+            print(f"{station.name}: score {station.score}, {station.frames} frames, {station.dropped} camera frames dropped")
+        serial_stats = []
+        for feedback in self.feedbacks:
+            feedback.flush(0.5)
+            serial_stats.append(feedback.latency_stats())
+            print("Arduino latency:", serial_stats[-1])
+            feedback.close()
+        if self.latency_json:
+            with open(self.latency_json, 'w') as f:
+                json.dump({'stations': {station.name: station.report() for station in self.stations},
+                           'scheduler': scheduler_stats, 'serial': serial_stats}, f, indent=4)
+            print(f"Scores and latency histograms saved to {self.latency_json}")
         super().closeEvent(event)
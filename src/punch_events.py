@@ -0,0 +1,200 @@
+import bisect
+import numpy as np
+from typing import Dict, Iterable, Optional, Tuple
+
+# (technique, start_frame, end_frame, best_distance), frames inclusive
+PunchEvent = Tuple[str, int, int, float]
+
+
+class PunchEventDetector:
+    """
+    Turns per-frame technique labels into punch events, O(1) per frame.
+
+    A punch is a run of frames with the same technique. With the defaults every maximal run of
+    identical labels is one punch, which is how analyze_all has always counted.
+        hysteresis: frames of another label or no label a punch may contain without ending,
+            so a single misclassified frame doesn't split one punch into two
+        min_duration: frames a run needs to have that technique before it counts
+    """
+    def __init__(self, min_duration: int = 1, hysteresis: int = 0):
+        self.min_duration = min_duration
+        self.hysteresis = hysteresis
+        self.reset()
+
+    def reset(self):
+        self._active = None  # [technique, start, last, hits, best_distance] of the current run
+        self._pending = None  # the same for a different technique seen while the current run is missing
+        self._misses = 0  # frames since the current run last had its technique
+        self._pending_misses = 0
+
+    @property
+    def current(self) -> Optional[str]:
+        """Technique of the punch in progress, once it has reached min_duration."""
+        if self._active is not None and self._active[3] >= self.min_duration:
+            return self._active[0]
+        return None
+
+    def update(self, frame: int, label: Optional[str], distance: float = float('inf')) -> Optional[PunchEvent]:
+        """
+        Feed the label of the next frame (None = no technique).
+        Returns: the punch that ended before this frame, if any.
+        """
+        label = label.upper() if label else None
+        active = self._active
+        if active is not None and label == active[0]:
+            active[2] = frame
+            active[3] += 1
+            active[4] = min(active[4], distance)
+            self._misses = 0
+            self._pending = None
+            return None
+
+        if active is None:
+            if label:
+                self._active = [label, frame, frame, 1, distance]
+            return None
+
+        # The current run is missing in this frame
+        self._misses += 1
+        pending = self._pending
+        if label and pending is not None and pending[0] == label:
+            pending[2] = frame
+            pending[3] += 1
+            pending[4] = min(pending[4], distance)
+            self._pending_misses = 0
+        elif label:
+            self._pending = [label, frame, frame, 1, distance]
+            self._pending_misses = 0
+        elif pending is not None:
+            self._pending_misses += 1
+        if self._misses <= self.hysteresis:
+            return None
+
+        # Current run is over; a pending run still within the hysteresis takes its place
+        event = self._close(active)
+        if self._pending is not None and self._pending_misses <= self.hysteresis:
+            self._active, self._misses = self._pending, self._pending_misses
+        else:
+            self._active, self._misses = None, 0
+        self._pending = None
+        return event
+
+    def finish(self) -> Optional[PunchEvent]:
+        """End of stream: close the punch in progress."""
+        event = self._close(self._active) if self._active is not None else None
+        self.reset()
+        return event
+
+    def _close(self, run) -> Optional[PunchEvent]:
+        technique, start, last, hits, best_distance = run
+        if hits < self.min_duration:
+            return None
+        return technique, start, last, float(best_distance)
+
+
+class PunchTimeline:
+    """
+    Punch events stored run-length style: one row per punch instead of one entry per frame,
+    in numpy columns (technique id, start, end, best distance) plus the technique names.
+    """
+    def __init__(self, num_frames: int = 0, first_frame: int = 1):
+        self.num_frames = num_frames  # frames analyzed, for to_dict()
+        self.first_frame = first_frame  # number of the first frame
+        self.techniques = []  # id -> name
+        self._technique_ids = {}
+        self._size = 0
+        self._technique = np.zeros(16, dtype=np.int16)
+        self._start = np.zeros(16, dtype=np.int32)
+        self._end = np.zeros(16, dtype=np.int32)
+        self._distance = np.zeros(16, dtype=np.float32)
+
+    @classmethod
+    def from_labels(cls, labels: Dict[int, Optional[str]], min_duration: int = 1, hysteresis: int = 0):
+        """From an analyze_all style {frame: label} dict (frames numbered consecutively)."""
+        frames = sorted(labels)
+        timeline = cls(len(frames), frames[0] if frames else 1)
+        timeline.extend(iter_events(((frame, labels[frame], float('inf')) for frame in frames),
+                                    min_duration, hysteresis))
+        return timeline
+
+    def append(self, event: PunchEvent):
+        technique, start, end, distance = event
+        if self._size == len(self._start):
+            for name in ('_technique', '_start', '_end', '_distance'):
+                column = getattr(self, name)
+                setattr(self, name, np.concatenate([column, np.zeros_like(column)]))
+        technique_id = self._technique_ids.get(technique)
+        if technique_id is None:
+            technique_id = self._technique_ids[technique] = len(self.techniques)
+            self.techniques.append(technique)
+        i = self._size
+        self._technique[i], self._start[i], self._end[i], self._distance[i] = technique_id, start, end, distance
+        self._size += 1
+        self.num_frames = max(self.num_frames, end - self.first_frame + 1)
+
+    def extend(self, events: Iterable[PunchEvent]):
+        for event in events:
+            self.append(event)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+    def __getitem__(self, i: int) -> PunchEvent:
+        if not -self._size <= i < self._size:
+            raise IndexError(i)
+        i %= self._size
+        return (self.techniques[self._technique[i]], int(self._start[i]), int(self._end[i]), float(self._distance[i]))
+
+    def __repr__(self):
+        return f"PunchTimeline({list(self)})"
+
+    def event_at(self, frame: int) -> Optional[PunchEvent]:
+        """The punch covering `frame`, if any (events are appended in order and don't overlap)."""
+        i = bisect.bisect_right(self._start[:self._size], frame) - 1
+        if i >= 0 and frame <= self._end[i]:
+            return self[i]
+        return None
+
+    def counts(self) -> Dict[str, int]:
+        """{technique: punches}"""
+        counts = np.bincount(self._technique[:self._size], minlength=len(self.techniques))
+        return {name: int(count) for name, count in zip(self.techniques, counts)}
+
+    def to_dict(self) -> Dict[int, Optional[str]]:
+        """
+        The per-frame form analyze_all returns: every frame of a punch carries the technique,
+        lowercase except the punch's last frame, other frames None.
+        """
+        labels = dict.fromkeys(range(self.first_frame, self.first_frame + self.num_frames))
+        for technique, start, end, _ in self:
+            for frame in range(start, end):
+                labels[frame] = technique.lower()
+            labels[end] = technique.upper()
+        return labels
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Columns trimmed to the events, e.g. for np.savez."""
+        return {
+            'techniques': np.array(self.techniques),
+            'technique': self._technique[:self._size].copy(),
+            'start': self._start[:self._size].copy(),
+            'end': self._end[:self._size].copy(),
+            'distance': self._distance[:self._size].copy(),
+        }
+
+
+def iter_events(labels: Iterable[Tuple[int, Optional[str], float]], min_duration: int = 1,
+                hysteresis: int = 0) -> Iterable[PunchEvent]:
+    """Run a (frame, label, distance) stream through a PunchEventDetector, yielding its events."""
+    detector = PunchEventDetector(min_duration, hysteresis)
+    for frame, label, distance in labels:
+        event = detector.update(frame, label, distance)
+        if event:
+            yield event
+    event = detector.finish()
+    if event:
+        yield event
@@ -0,0 +1,218 @@
+"""
+Columnar on-disk store for analysed sessions: per-frame landmarks, matched labels, distances
+and timestamps, so dashboards can load a whole session without re-running the pipeline.
+
+A session is a directory with one raw, append-only file per column plus meta.json:
+    frame_indices.bin  int64   (F,)        frame number in the video
+    timestamps.bin     float64 (F,)        seconds
+    landmarks.bin      float32 (F, 33, 4)  x, y, z, visibility as in PoseFrame
+    mask.bin           bool    (F, 33)     which landmarks were detected
+    label_ids.bin      int16   (F,)        index into meta['labels'], -1 = no match
+    distances.bin      float32 (F,)        distance of the match (inf if none)
+Columns are appended independently (keypoints as they are extracted, labels once they are
+final); a session's length is that of its shortest column, and meta.json, rewritten atomically
+whenever buffered rows are written out, records how many rows of each column are complete, so
+a crash mid-write never exposes half a row and loses at most the rows still buffered. Reads
+are np.memmap views, so opening a session costs milliseconds regardless of its length.
+export_npz()/load_npz() give a single-file copy for sharing.
+"""
+import os
+import json
+import numpy as np
+from typing import Dict, Iterable, List, Optional
+from src.pose_frame import NUM_LANDMARKS, NUM_CHANNELS
+
+SESSION_VERSION = 1
+
+# name -> (dtype, shape of one row)
+COLUMNS = {
+    'frame_indices': (np.int64, ()),
+    'timestamps': (np.float64, ()),
+    'landmarks': (np.float32, (NUM_LANDMARKS, NUM_CHANNELS)),
+    'mask': (np.bool_, (NUM_LANDMARKS,)),
+    'label_ids': (np.int16, ()),
+    'distances': (np.float32, ()),
+}
+
+
+class SessionWriter:
+    """
+    Appends columns to a session directory. Opening an existing session continues it:
+    anything past the rows recorded in meta.json (an interrupted write) is cut off first.
+    """
+    def __init__(self, path: str, metadata: Dict = None, flush_rows: int = 4096):
+        """
+        Args:
+            path: session directory (created if needed)
+            metadata: free-form JSON-able info kept in meta.json, e.g. video path and interval
+            flush_rows: rows buffered per column before they are written out and committed in meta.json
+        """
+        self.path = path
+        self.flush_rows = flush_rows
+        os.makedirs(path, exist_ok=True)
+        meta = _read_meta(path)
+        self.labels = meta['labels'] if meta else []
+        self._label_ids = {name: i for i, name in enumerate(self.labels)}
+        self.metadata = dict(meta['metadata']) if meta else {}
+        self.metadata.update(metadata or {})
+        self.rows = {name: (meta['rows'].get(name, 0) if meta else 0) for name in COLUMNS}
+        self._pending = {name: [] for name in COLUMNS}
+        self._pending_rows = {name: 0 for name in COLUMNS}
+
+        self._files = {}
+        for name, (dtype, shape) in COLUMNS.items():
+            file_path = os.path.join(path, f'{name}.bin')
+            f = open(file_path, 'r+b' if os.path.exists(file_path) else 'w+b')
+            f.truncate(self.rows[name] * _row_bytes(dtype, shape))
+            f.seek(0, os.SEEK_END)
+            self._files[name] = f
+        self._write_meta()
+
+    def label_id(self, name: Optional[str]) -> int:
+        """Id stored in label_ids for a technique name; -1 for None."""
+        if not name:
+            return -1
+        label_id = self._label_ids.get(name)
+        if label_id is None:
+            label_id = self._label_ids[name] = len(self.labels)
+            self.labels.append(name)
+        return label_id
+
+    def append(self, **columns):
+        """
+        Append rows to one or more columns, e.g.
+            writer.append(frame_indices=..., timestamps=..., landmarks=..., mask=...)
+            writer.append(label_ids=..., distances=...)
+        Each value holds one or more rows of that column.
+        """
+        written = []
+        for name, values in columns.items():
+            dtype, shape = COLUMNS[name]
+            array = np.asarray(values, dtype=dtype).reshape((-1,) + shape)
+            self._pending[name].append(array)
+            self._pending_rows[name] += len(array)
+            if self._pending_rows[name] >= self.flush_rows:
+                self._write_column(name)
+                written.append(name)
+        if written:
+            self._commit(written)
+
+    def append_labels(self, names: Iterable[Optional[str]], distances: Iterable[float]):
+        """append() for label names instead of ids."""
+        self.append(label_ids=[self.label_id(name) for name in names], distances=list(distances))
+
+    def flush(self):
+        """Write out buffered rows and commit them in meta.json."""
+        for name in COLUMNS:
+            self._write_column(name)
+        self._commit(COLUMNS)
+
+    def close(self):
+        if self._files:
+            self.flush()
+            for f in self._files.values():
+                f.close()
+            self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _write_column(self, name: str):
+        if not self._pending[name]:
+            return
+        data = np.concatenate(self._pending[name])
+        self._files[name].write(np.ascontiguousarray(data).tobytes())
+        self.rows[name] += len(data)
+        self._pending[name] = []
+        self._pending_rows[name] = 0
+
+    def _commit(self, names: Iterable[str]):
+        # Rows must be on disk before meta.json counts them
+        for name in names:
+            self._files[name].flush()
+            os.fsync(self._files[name].fileno())
+        self._write_meta()
+
+    def _write_meta(self):
+        meta = {
+            'version': SESSION_VERSION,
+            'labels': self.labels,
+            'rows': self.rows,
+            'metadata': self.metadata,
+        }
+        tmp_path = os.path.join(self.path, f'meta.json.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, indent=4)
+        os.replace(tmp_path, os.path.join(self.path, 'meta.json'))
+
+
+class Session:
+    """A loaded session: column arrays (memory-mapped when read from a directory) and label names."""
+    def __init__(self, columns: Dict[str, np.ndarray], labels: List[str], metadata: Dict = None):
+        self.columns = columns
+        self.labels = labels
+        self.metadata = metadata or {}
+
+    def __len__(self):
+        return min((len(column) for column in self.columns.values()), default=0)
+
+    def __getattr__(self, name):
+        columns = self.__dict__.get('columns', {})
+        if name in columns:
+            return columns[name][:len(self)]
+        raise AttributeError(name)
+
+    def label_names(self) -> List[Optional[str]]:
+        """Per-frame technique names (None where nothing matched)."""
+        names = self.labels + [None]  # -1 indexes the None
+        return [names[label_id] for label_id in self.label_ids.tolist()]
+
+
+def load_session(path: str) -> Session:
+    """Open a session directory with memory-mapped columns. Nothing is read until it is used."""
+    meta = _read_meta(path)
+    if meta is None:
+        raise ValueError(f"Error: {path} is not a session directory")
+    columns = {}
+    for name, (dtype, shape) in COLUMNS.items():
+        rows = meta['rows'].get(name, 0)
+        file_path = os.path.join(path, f'{name}.bin')
+        if rows == 0 or not os.path.exists(file_path):
+            columns[name] = np.zeros((0,) + shape, dtype=dtype)
+        else:
+            columns[name] = np.memmap(file_path, dtype=dtype, mode='r', shape=(rows,) + shape)
+    return Session(columns, list(meta['labels']), meta['metadata'])
+
+
+def export_npz(path: str, npz_path: str, compressed: bool = True):
+    """Copy a session directory into one .npz file."""
+    session = load_session(path)
+    save = np.savez_compressed if compressed else np.savez
+    save(npz_path, **{name: np.asarray(getattr(session, name)) for name in COLUMNS},
+         labels=np.array(session.labels), metadata=np.array(json.dumps(session.metadata)))
+
+
+def load_npz(npz_path: str) -> Session:
+    """Load a session exported by export_npz (read into memory; open the directory for memory-mapped reads)."""
+    with np.load(npz_path) as data:
+        columns = {name: data[name] for name in COLUMNS}
+        return Session(columns, data['labels'].tolist(), json.loads(str(data['metadata'])))
+
+
+def _row_bytes(dtype, shape) -> int:
+    return int(np.dtype(dtype).itemsize * np.prod(shape, dtype=np.int64))
+
+
+def _read_meta(path: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != SESSION_VERSION:
+        return None
+    return meta
@@ -0,0 +1,169 @@
+"""
+Opt-in per-stage tracing for the analysis, playback and practice loops.
+
+    from src import tracing
+    with tracing.span("pose.process"):
+        results = pose.process(image_rgb)
+
+Spans go into a fixed-size ring buffer (the oldest are overwritten) and can be exported as
+Chrome trace-event JSON (open in chrome://tracing or https://ui.perfetto.dev) or summarised as
+per-stage p50/p95/p99 latencies.
+Tracing is off by default; span() then returns a shared no-op context manager.
+Set BOXING_TRACE=<path.json> to enable it for a whole run and export on exit.
+"""
+import os
+import json
+import atexit
+import threading
+import time
+import numpy as np
+from typing import Dict, Optional
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'start')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.record(self.name, self.start, time.perf_counter_ns())
+        return False
+
+
+class Tracer:
+    """Ring buffer of (stage, thread, start, duration) spans."""
+    def __init__(self, capacity: int = 1 << 16):
+        self.capacity = capacity
+        self.enabled = False
+        self._stage_ids = {}  # name -> id
+        self._stage_names = []
+        # Preallocated plain lists: a slot store is much cheaper than writing into numpy arrays
+        self._stage = [0] * capacity
+        self._thread = [0] * capacity
+        self._start = [0] * capacity
+        self._duration = [0] * capacity
+        self._count = 0  # spans ever recorded; slot = count % capacity
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+
+    def span(self, name: str):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name: str, start_ns: int, end_ns: int):
+        with self._lock:
+            stage = self._stage_ids.get(name)
+            if stage is None:
+                stage = self._stage_ids[name] = len(self._stage_names)
+                self._stage_names.append(name)
+            slot = self._count % self.capacity
+            self._stage[slot] = stage
+            self._thread[slot] = threading.get_ident()
+            self._start[slot] = start_ns
+            self._duration[slot] = end_ns - start_ns
+            self._count += 1
+
+    def clear(self):
+        with self._lock:
+            self._count = 0
+
+    def _snapshot(self):
+        with self._lock:
+            n = min(self._count, self.capacity)
+            order = (np.arange(n) + self._count - n) % self.capacity  # oldest first
+            columns = [np.array(column, dtype=np.int64)[order] for column in (self._stage, self._thread, self._start, self._duration)]
+            return (*columns, list(self._stage_names))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per stage: count, mean and p50/p95/p99/max latency in ms over the spans still in the buffer."""
+        stage, _, _, duration, names = self._snapshot()
+        result = {}
+        for stage_id, name in enumerate(names):
+            ms = duration[stage == stage_id] / 1e6
+            if len(ms) == 0:
+                continue
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            result[name] = {'count': int(len(ms)), 'mean_ms': float(ms.mean()), 'p50_ms': float(p50),
+                            'p95_ms': float(p95), 'p99_ms': float(p99), 'max_ms': float(ms.max())}
+        return result
+
+    def chrome_trace(self) -> Dict:
+        stage, thread, start, duration, names = self._snapshot()
+        thread_ids = {tid: i for i, tid in enumerate(dict.fromkeys(thread.tolist()))}
+        events = [{'name': names[s], 'ph': 'X', 'pid': os.getpid(), 'tid': thread_ids[t],
+                   'ts': (b - self._origin) / 1000.0, 'dur': d / 1000.0}
+                  for s, t, b, d in zip(stage.tolist(), thread.tolist(), start.tolist(), duration.tolist())]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path: str):
+        """Write the buffer as Chrome trace-event JSON, plus `<path>.summary.json` with per-stage percentiles."""
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+        with open(f"{os.path.splitext(path)[0]}.summary.json", 'w') as f:
+            json.dump(self.summary(), f, indent=4)
+
+
+tracer = Tracer()
+
+
+def span(name: str):
+    """Context manager timing one stage; free when tracing is disabled."""
+    if not tracer.enabled:
+        return _NULL_SPAN
+    return _Span(tracer, name)
+
+
+def enable(capacity: Optional[int] = None):
+    global tracer
+    if capacity and capacity != tracer.capacity:
+        tracer = Tracer(capacity)
+    tracer.enabled = True
+
+
+def disable():
+    tracer.enabled = False
+
+
+def summary() -> Dict[str, Dict[str, float]]:
+    return tracer.summary()
+
+
+def export_chrome_trace(path: str):
+    tracer.export_chrome_trace(path)
+
+
+def print_summary():
+    for name, stats in sorted(summary().items(), key=lambda item: -item[1]['mean_ms']):
+        print(f"{name:32s} n={stats['count']:6d}  p50={stats['p50_ms']:8.3f}ms  "
+              f"p95={stats['p95_ms']:8.3f}ms  p99={stats['p99_ms']:8.3f}ms")
+
+
+def _export_on_exit(path):
+    export_chrome_trace(path)
+    print_summary()
+    print(f"Trace saved to {path}")
+
+
+if os.environ.get('BOXING_TRACE'):
+    enable()
+    atexit.register(_export_on_exit, os.environ['BOXING_TRACE'])
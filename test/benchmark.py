@@ -0,0 +1,293 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from src.keypoint_templates import BoxingPoseTemplate, TemplateManager
+from src.normalization import normalize_keypoints, keypoints_list_to_array
+from src.pose_frame import PoseFrame, LANDMARK_NAMES
+from src.pose_matching import PoseMatcher
+
+TEMPLATE_PATH = "data/templates"
+FRAMES_PATH = "data/frames_img"
+
+
+# ---------- synthetic data ----------
+
+def load_base_poses(template_path=TEMPLATE_PATH):
+    """The bundled templates, used as seeds for synthetic poses."""
+    manager = TemplateManager()
+    manager.load_templates(template_path)
+    return [template.keypoints for template in manager.templates.values()]
+
+
+def synthetic_pose(base, rng, noise=0.02, num_landmarks=len(LANDMARK_NAMES)):
+    """A jittered copy of `base` keeping only the first `num_landmarks` landmarks."""
+    names = LANDMARK_NAMES[:num_landmarks]
+    return {name: (np.asarray(base[name]) + rng.normal(0, noise, 2)).tolist() for name in names if name in base}
+
+
+def synthetic_templates(count, bases, rng):
+    manager = TemplateManager()
+    for i in range(count):
+        manager.add_template(BoxingPoseTemplate(f"pose_{i}", synthetic_pose(bases[i % len(bases)], rng, noise=0.05)))
+    return manager
+
+
+def synthetic_frames(count, bases, rng, num_landmarks=len(LANDMARK_NAMES)):
+    return [synthetic_pose(bases[i % len(bases)], rng, num_landmarks=num_landmarks) for i in range(count)]
+
+
+# ---------- timing ----------
+
+def measure(fn, items=1, repeat=5, min_time=0.2):
+    """
+    Run fn() at least `repeat` times and until `min_time` seconds have passed.
+    Returns: latency stats in ms per call and per item, and items/s throughput.
+    """
+    fn()  # warm-up
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < repeat or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples = np.array(samples) * 1000.0
+    return {
+        "runs": len(samples),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "per_item_us": float(samples.mean() * 1000.0 / items),
+        "items_per_s": float(items * 1000.0 / samples.mean()),
+    }
+
+
+# ---------- benchmarks ----------
+
+def bench_normalize(bases, rng, args):
+    results = []
+    for num_landmarks in args.landmarks:
+        kps = synthetic_pose(bases[0], rng, num_landmarks=num_landmarks)
+        frame = PoseFrame.from_dict(kps)
+        results.append({"name": "normalize_keypoints.dict", "params": {"landmarks": num_landmarks}, **measure(lambda: normalize_keypoints(kps))})
+        results.append({"name": "normalize_keypoints.pose_frame", "params": {"landmarks": num_landmarks}, **measure(lambda: normalize_keypoints(frame))})
+    return results
+
+
+def bench_compute_distance(bases, rng, args):
+    matcher = PoseMatcher()
+    results = []
+    for num_landmarks in args.landmarks:
+        a = normalize_keypoints(synthetic_pose(bases[0], rng, num_landmarks=num_landmarks))
+        b = normalize_keypoints(synthetic_pose(bases[1], rng, num_landmarks=num_landmarks))
+        results.append({"name": "compute_distance", "params": {"landmarks": num_landmarks}, **measure(lambda: matcher.compute_distance(a, b))})
+    return results
+
+
+def bench_match_pose(bases, rng, args):
+    matcher = PoseMatcher(threshold=0.5)
+    results = []
+    for num_templates in args.templates:
+        manager = synthetic_templates(num_templates, bases, rng)
+        manager.compile()
+        for num_landmarks in args.landmarks:
+            kps = synthetic_pose(bases[0], rng, num_landmarks=num_landmarks)
+            frame = PoseFrame.from_dict(kps)
+            params = {"templates": num_templates, "landmarks": num_landmarks}
+            results.append({"name": "match_pose.dict", "params": params, **measure(lambda: matcher.match_pose(kps, manager))})
+            results.append({"name": "match_pose.pose_frame", "params": params, **measure(lambda: matcher.match_pose(frame, manager))})
+    return results
+
+
+def bench_match_batch(bases, rng, args):
+    matcher = PoseMatcher(threshold=0.5)
+    results = []
+    for num_templates in args.templates:
+        manager = synthetic_templates(num_templates, bases, rng)
+        manager.compile()
+        for num_frames in args.frames:
+            points, mask = keypoints_list_to_array(synthetic_frames(num_frames, bases, rng))
+            params = {"templates": num_templates, "frames": num_frames}
+            results.append({"name": "match_batch", "params": params,
+                            **measure(lambda: matcher.match_batch(points, mask, manager), items=num_frames, repeat=3)})
+    return results
+
+
+def bench_analyze_stream(bases, rng, args):
+    """analyze_all's matching stage (iter_matches) fed by a synthetic keypoint stream instead of MediaPipe."""
+    from src.analyzer import iter_matches
+    matcher = PoseMatcher(threshold=0.5)
+    manager = TemplateManager()
+    manager.load_templates(args.template_path)
+    results = []
+    for num_frames in args.frames:
+        frames = [PoseFrame.from_dict(kps) for kps in synthetic_frames(num_frames, bases, rng)]
+        stream = lambda: [(i, i / 30.0, kps) for i, kps in enumerate(frames)]
+        run = lambda: sum(1 for _ in iter_matches(stream(), manager, matcher))
+        results.append({"name": "analyze.iter_matches", "params": {"frames": num_frames},
+                        **measure(run, items=num_frames, repeat=3)})
+    return results
+
+
+def bench_hit_testing(bases, rng, args):
+    """PracticeWindow's per-frame hit test: two wrists' swept paths against many targets on a 1920x1080 frame."""
+    from src.hit_testing import HitTester
+    results = []
+    for num_targets in (1, 16, 256, 4096):
+        tester = HitTester(cell_size=300)
+        for _ in range(num_targets):
+            tester.add_target(rng.uniform(0, 1920), rng.uniform(0, 1080), 60)
+        # Wrists wandering ~80 px per frame, as in a fast combination at 30 fps
+        steps = np.cumsum(rng.normal(0, 80, (2, 1000, 2)), axis=1) % (1920, 1080)
+        def run():
+            tester.reset_hands()
+            for k in range(steps.shape[1]):
+                tester.update_hands({'left_wrist': tuple(steps[0, k]), 'right_wrist': tuple(steps[1, k])}, k / 30.0)
+        results.append({"name": "hit_testing.update_hands", "params": {"targets": num_targets},
+                        **measure(run, items=steps.shape[1], repeat=3)})
+    return results
+
+
+def bench_mediapipe(args):
+    """KeypointExtractor and the full analyze_all on a video assembled from the bundled frames."""
+    import cv2
+    from src.analyzer import analyze_all
+    from src.keypoint_extractor import KeypointExtractor
+
+    names = sorted(name for name in os.listdir(args.frames_path) if name.endswith(".jpg"))
+    images = [cv2.imread(os.path.join(args.frames_path, name)) for name in names]
+    h, w = images[0].shape[:2]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = os.path.join(tmp, "bench.avi")
+        writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (w, h))
+        for image in images:
+            writer.write(image)
+        writer.release()
+
+        for interval in (1, 5):
+            def extract():
+                extractor = KeypointExtractor(video_path, interval)
+                return sum(1 for _ in extractor.iter_keypoints())
+            sampled = extract()
+            results.append({"name": "keypoint_extractor.iter_keypoints", "params": {"frames": len(images), "interval": interval},
+                            **measure(extract, items=sampled, repeat=1, min_time=0)})
+            results.append({"name": "analyze_all", "params": {"frames": len(images), "interval": interval},
+                            **measure(lambda: analyze_all(video_path, args.template_path, interval, None), items=sampled, repeat=1, min_time=0)})
+    return results
+
+
+HEAVY_MODULES = ("cv2", "mediapipe", "matplotlib", "PyQt5")
+
+
+def bench_import_time(args):
+    """Cold-start cost of the core modules, each in a fresh interpreter, and which heavy dependencies they pull in."""
+    results = []
+    for module in ("src.normalization", "src.keypoint_templates", "src.pose_matching", "src.motion_matching",
+                   "src.analyzer", "src.batch_cli", "src.keypoint_extractor"):
+        code = (f"import sys, time; t = time.perf_counter(); import {module}; d = time.perf_counter() - t; "
+                f"print(d, ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+        samples, heavy = [], ""
+        for _ in range(3):
+            out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+            if out.returncode != 0:
+                break
+            seconds, _, heavy = out.stdout.strip().partition(" ")
+            samples.append(float(seconds) * 1000.0)
+        if samples:
+            results.append({"name": "import", "params": {"module": module}, "runs": len(samples),
+                            "mean_ms": float(np.mean(samples)), "p50_ms": float(np.median(samples)),
+                            "heavy_imports": heavy.split(",") if heavy else []})
+        else:
+            results.append({"name": "import", "params": {"module": module}, "error": out.stderr.strip().splitlines()[-1]})
+    return results
+
+
+# ---------- reporting ----------
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, baseline_path):
+    """Print mean latency ratios against a previous JSON report (>1.0 = slower now)."""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    key = lambda r: (r["name"], json.dumps(r.get("params", {}), sort_keys=True))
+    old = {key(r): r for r in baseline["results"] if "mean_ms" in r}
+    print(f"\nCompared with {baseline_path} ({baseline['meta'].get('commit')}):")
+    for result in current["results"]:
+        before = old.get(key(result))
+        if before and "mean_ms" in result:
+            ratio = result["mean_ms"] / before["mean_ms"] if before["mean_ms"] else float("inf")
+            flag = "  <-- slower" if ratio > 1.2 else ""
+            print(f"  {result['name']:38s} {json.dumps(result['params']):45s} {ratio:6.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark normalization, matching and extraction hot paths.")
+    parser.add_argument("--no-mediapipe", action="store_true", help="Skip benchmarks that need MediaPipe/OpenCV.")
+    parser.add_argument("--templates", type=int, nargs="+", default=[4, 64, 1024, 4096], help="Template counts to sweep.")
+    parser.add_argument("--frames", type=int, nargs="+", default=[100, 1000, 10000], help="Frame counts to sweep.")
+    parser.add_argument("--landmarks", type=int, nargs="+", default=[8, 17, 33], help="Landmark counts to sweep.")
+    parser.add_argument("--template_path", type=str, default=TEMPLATE_PATH)
+    parser.add_argument("--frames_path", type=str, default=FRAMES_PATH)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output_json", type=str, default="bench_output.json", help="Where to write the report.")
+    parser.add_argument("--compare", type=str, default=None, help="Earlier report to compare against.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    bases = load_base_poses(args.template_path)
+
+    suites = [bench_normalize, bench_compute_distance, bench_match_pose, bench_match_batch, bench_analyze_stream,
+              bench_hit_testing]
+    results = []
+    for suite in suites:
+        print(f"Running {suite.__name__}...")
+        results.extend(suite(bases, rng, args))
+    print("Running bench_import_time...")
+    results.extend(bench_import_time(args))
+    if not args.no_mediapipe:
+        print("Running bench_mediapipe...")
+        results.extend(bench_mediapipe(args))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "mediapipe": not args.no_mediapipe,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.output_json, "w") as f:
+        json.dump(report, f, indent=4)
+
+    for result in results:
+        if "mean_ms" in result:
+            print(f"{result['name']:38s} {json.dumps(result['params']):45s} {result['mean_ms']:10.3f} ms")
+    print(f"Results saved to {args.output_json}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
+
+# python -m test.benchmark --no-mediapipe --output_json bench_output.json
+# python -m test.benchmark --compare bench_output.json
@@ -0,0 +1,106 @@
+import argparse
+import json
+import sys
+import threading
+
+from src.core_scheduler import CoreScheduler
+from src.latency import LatencyMonitor
+from src.practice_session import PracticeStation
+
+TEMPLATE_PATH = "data/templates"
+FRAMES_PATH = "data/frames_img"
+
+
+def parse_budget(text):
+    """'score=100' -> ('score', 100.0)"""
+    stage, _, ms = text.partition("=")
+    return stage, float(ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run practice mode headless on recordings (one station each) and check their capture-to-stage latency budgets.")
+    parser.add_argument("sources", nargs="*", default=[FRAMES_PATH], help="Video files, image directories or .frames stores played as cameras.")
+    parser.add_argument("--fps", type=float, default=30.0, help="Rate the recordings are 'captured' at.")
+    parser.add_argument("--frames", type=int, default=300, help="Frames to run per station (the recordings loop).")
+    parser.add_argument("--template_path", type=str, default=TEMPLATE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--no-motion-gate", action="store_true")
+    parser.add_argument("--no-landmark-filter", action="store_true")
+    parser.add_argument("--slots", type=int, default=None, help="Pose inferences run at once (default half the cores).")
+    parser.add_argument("--min_fps", type=float, default=10.0, help="Frame rate under which a station counts as degraded.")
+    parser.add_argument("--serial", type=str, default=None, help="Send the first station's hit feedback to this port, e.g. loop://")
+    parser.add_argument("--budget", type=parse_budget, action="append", default=None,
+                        help="stage=ms, repeatable (default hit_test=100).")
+    parser.add_argument("--percentile", type=float, default=95)
+    parser.add_argument("--output_json", type=str, default=None, help="Where to write the scores and latency histograms.")
+    args = parser.parse_args()
+    budgets = dict(args.budget or [("hit_test", 100.0)])
+
+    feedback = None
+    if args.serial:
+        from src.hw_arduino import SerialManager
+        feedback = SerialManager(port=args.serial, ack='echo' if args.serial.startswith('loop://') else 'line')
+
+    scheduler = CoreScheduler(args.slots, target_fps=args.fps, min_fps=args.min_fps)
+    stations = [PracticeStation(source, name=f"Station {i + 1}", scheduler=scheduler, latency=LatencyMonitor(window=args.frames),
+                                replay_options={'fps': args.fps, 'loop': True},
+                                selected_techniques=["HOOK", "JAB", "CROSS", "UPPERCUT"], template_path=args.template_path,
+                                threshold=args.threshold, motion_gate=not args.no_motion_gate,
+                                landmark_filter=not args.no_landmark_filter, feedback=feedback if i == 0 else None)
+                for i, source in enumerate(args.sources)]
+    scheduler_stats = {}
+
+    def sample_scheduler():
+        # The stations leave the scheduler when they finish; keep what it said while they all ran
+        while not done.wait(1.0):
+            scheduler_stats.update(scheduler.stats())
+
+    done = threading.Event()
+    threads = [threading.Thread(target=station.run, kwargs={'max_frames': args.frames}, name=station.name)
+               for station in stations]
+    sampler = threading.Thread(target=sample_scheduler, daemon=True)
+    sampler.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    if feedback is not None:
+        feedback.flush(1.0)
+        feedback.close()
+
+    print(f"{len(stations)} station(s), {scheduler.slots} inference slot(s), {args.frames} frames each at {args.fps:.0f} FPS")
+    all_violations = {}
+    for station in stations:
+        fps = scheduler_stats.get('stations', {}).get(station.name, {}).get('fps', 0.0)
+        print(f"{station.name} ({station.source}): score {station.score}, {fps:.1f} FPS, "
+              f"{station.dropped} camera frames dropped (the pipeline fell behind)")
+        for stage, stats in station.latency.summary().items():
+            print(f"  {stage:14s} n={stats['count']:5d}  p50={stats['p50_ms']:7.1f}ms  p95={stats['p95_ms']:7.1f}ms  max={stats['max_ms']:7.1f}ms")
+        violations = station.latency.check_budgets(budgets, args.percentile)
+        for stage, violation in violations.items():
+            actual = f"{violation['actual_ms']:.1f}ms" if violation['actual_ms'] != float('inf') else "no samples"
+            print(f"  OVER BUDGET: {stage} p{args.percentile:g} {actual} > {violation['budget_ms']:.1f}ms")
+        if violations:
+            all_violations[station.name] = violations
+    if scheduler_stats.get('overloaded'):
+        print(f"Overloaded: some stations ran below {args.min_fps:.0f} FPS")
+
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump({'stations': {station.name: station.report() for station in stations}, 'scheduler': scheduler_stats,
+                       'budgets': budgets, 'violations': all_violations,
+                       'serial': [feedback.latency_stats()] if feedback else []}, f, indent=4)
+        print(f"Scores and latency histograms saved to {args.output_json}")
+
+    if not all_violations:
+        print(f"All p{args.percentile:g} latencies within budget: {json.dumps(budgets)}")
+    return 1 if all_violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# python -m test.latency_budget data/frames_img --budget pose=60 --budget hit_test=80 --output_json latency.json
+# python -m test.latency_budget session.mp4 --serial loop:// --budget feedback_ack=120
+# python -m test.latency_budget bag1.mp4 bag2.mp4 bag3.mp4 bag4.mp4 --slots 2   (several stations on one machine)
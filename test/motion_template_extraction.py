@@ -0,0 +1,51 @@
+import argparse
+import os
+from src.keypoint_extractor import KeypointExtractor
+from src.motion_matching import MotionTemplate
+
+def extract_motion_template(video_path: str, name: str, start_frame: int, end_frame: int,
+                            frame_interval: int, output_json: str) -> None:
+    """
+    Record frames [start_frame, end_frame) of a video, sampled every `frame_interval` frames,
+    as a motion template for motion_matching.MotionMatcher.
+
+    Format example:
+    {
+       "name": "jab",
+       "frames": [{"nose": [0.3, 0.4], ...}, {"nose": [0.31, 0.4], ...}, ...]
+    }
+
+    Use the same frame_interval as the analysis that will match against the template.
+    """
+    extractor = KeypointExtractor(video_path, frame_interval, max_frames=end_frame)
+    frames = [keypoints for _, _, keypoints in extractor.iter_keypoints(start_frame=start_frame)]
+    extractor.pose.close()
+
+    missing = sum(1 for keypoints in frames if not keypoints)
+    if missing:
+        print(f"Warning: no pose detected in {missing} of {len(frames)} frames")
+
+    MotionTemplate(name, frames).to_file(output_json)
+    print(f"Motion template with {len(frames)} frames saved to {output_json}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Record a range of video frames as a motion template (JSON)."
+    )
+    parser.add_argument("video_path", type=str, help="Path to the input video.")
+    parser.add_argument("--name", type=str, required=True, help="Technique name, e.g. jab.")
+    parser.add_argument("--start", type=int, required=True, help="First frame of the motion.")
+    parser.add_argument("--end", type=int, required=True, help="Frame after the last frame of the motion.")
+    parser.add_argument("--interval", type=int, default=10, help="Sampling interval (default: 10, as in BoxingApp).")
+    parser.add_argument("--output_json", type=str, default=None,
+                        help="Output path (default: data/motion_templates/<name>.json).")
+    args = parser.parse_args()
+
+    output_json = args.output_json or os.path.join("data", "motion_templates", f"{args.name}.json")
+    os.makedirs(os.path.dirname(output_json) or ".", exist_ok=True)
+    extract_motion_template(args.video_path, args.name, args.start, args.end, args.interval, output_json)
+
+if __name__ == "__main__":
+    main()
+
+# python -m test.motion_template_extraction data/videos/test1.mp4 --name jab --start 120 --end 180
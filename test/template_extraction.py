@@ -3,6 +3,7 @@ import mediapipe as mp
 import json
 import argparse
 import os
+from src.pose_frame import PoseFrame
 
 def extract_keypoints_from_image(image_path: str, output_json: str) -> None:
     """
@@ -36,12 +37,7 @@ def extract_keypoints_from_image(image_path: str, output_json: str) -> None:
     results = pose.process(image_rgb)
     
     # Prepare a dictionary to store the keypoints
-    keypoints = {}
-
-    if results.pose_landmarks:
-        for idx, landmark in enumerate(results.pose_landmarks.landmark):
-            landmark_name = mp_pose.PoseLandmark(idx).name.lower()
-            keypoints[landmark_name] = [landmark.x, landmark.y]
+    keypoints = PoseFrame.from_results(results).to_dict()
 
     # Write keypoints to a JSON file
     with open(output_json, 'w') as f: